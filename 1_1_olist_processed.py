@@ -47,8 +47,6 @@
 import os
 import numpy as np
 import pandas as pd
-import openpyxl
-import matplotlib.pyplot as plt
 
 import warnings
 warnings.filterwarnings('ignore')
@@ -236,6 +234,22 @@ orders = pd.read_csv(
 # %%
 orders.info()
 
+# %% [markdown]
+# Los tipos que esperamos de cada archivo (códigos postales como texto, fechas, llaves únicas de `order_id` y `customer_id`, y que cada orden tenga su cliente y cada artículo su orden) están declarados en el módulo `olist_schema.py`. Validarlos justo después de leer los archivos muestra cualquier problema con su conteo y una muestra de valores, en lugar de descubrirlo más tarde dentro de un `merge` o como NaN silenciosos de `errors='coerce'`. Un reporte vacío indica que los archivos cumplen el esquema:
+
+# %%
+from olist_schema import validate_sources
+
+_, schema_report = validate_sources({
+    'customers': customers,
+    'geolocations': geolocations,
+    'items': items,
+    'payments': payments,
+    'orders': orders,
+    'states_abbreviations': states_abbreviations,
+    })
+schema_report
+
 # %% [markdown]
 # Por lo tanto es necesario convertir las columnas al formato de fecha `datetime` (Ver: https://towardsdatascience.com/working-with-datetime-in-pandas-dataframe-663f7af6c587).
 # 
@@ -328,12 +342,14 @@ orders['delta_days'].describe()
 # 
 # Esencialmente, el operador `where` de Numpy permite definir variables siguiendo reglas lógicas de manera condicional, similar al `if ... else ...` de Python:
 
+# %% [markdown]
+# Para no repetir los umbrales en cada script, la regla anterior vive en el módulo `olist_classify.py`: en lugar de dos `np.where` anidados (que crean dos arreglos de texto), ubica cada valor entre los umbrales `(0, 3)` con `np.searchsorted` y guarda el resultado como una variable categórica. Las órdenes sin fecha de entrega quedan sin clasificar (NaN).
+
 # %%
+from olist_classify import classify_delay
+
 # Define 
-orders['delay_status']  = np.where(
-    orders['delta_days'] > 3, 'long_delay',
-    np.where(orders['delta_days'] <= 0, 'on_time','short_delay')
-    )
+orders['delay_status'] = classify_delay(orders['delta_days'])
 
 # %% [markdown]
 # Para ver el efecto de lo anterior podemos extraer un muestra con la función `.sample`
@@ -442,13 +458,51 @@ orders_totals
 # %% [markdown]
 # ### 4.4 Clientes + geolocalización + nombre del estado donde viven + Órdenes + total de artículos y precios
 
+# %% [markdown]
+# Si `customer_id` se repitiera en `customers_geolocation_estado`, el `merge` duplicaría en silencio las órdenes de esos clientes (y su `total_sales` se sumaría dos veces en las tablas del Tema 2). Con `checked_merge` del módulo `olist_joins.py` declaramos la relación esperada: `'m:1'` significa que a cada orden le corresponde a lo más un cliente. La función revisa que la llave no se repita en la tabla derecha antes de unir y, si se repite, se detiene mostrando las llaves repetidas:
+
 # %%
-results = orders_totals.merge(
+from olist_joins import checked_merge
+
+results = checked_merge(
+    orders_totals,
     customers_geolocation_estado,
+    'm:1',
     on=['customer_id'],
     how='left'
     )
 
+# %% [markdown]
+# La tabla `results` guarda los enteros y reales en 64 bits, los periodos como objetos `Period` y los estados y ciudades como texto repetido en cada renglón. El módulo `olist_compact.py` convierte cada columna al tipo más pequeño que la representa (enteros de 8 o 16 bits, `float32`, categorías y periodos como número de mes), valida que no se pierdan valores ni precisión y reporta la memoria ahorrada por columna:
+
+# %%
+from olist_compact import compact
+
+compact_results, compaction = compact(results)
+print(f"Memoria: {compaction['bytes_before'].sum() / 1e6:.1f} MB -> "
+      f"{compaction['bytes_after'].sum() / 1e6:.1f} MB")
+compaction[['dtype_before', 'dtype_after', 'saved_bytes', 'max_error', 'status']]
+
+# %% [markdown]
+# ### 4.5 Clientes distintos por estado, mes y tipo de entrega
+#
+# Para saber cuántos clientes distintos (`customer_unique_id`) compran en cada estado y mes sin hacer un `nunique` sobre toda la tabla, aprovechamos la consolidación para construir sketches HyperLogLog (módulo `olist_hll.py`) por `geolocation_state`, `year_month` y `delay_status`. Cada celda ocupa el mismo espacio sin importar cuántos clientes tenga y las celdas se pueden combinar para cualquier agregación:
+
+# %%
+from olist_hll import COLUMNS as HLL_COLUMNS, FILE_DISTINCT_CUSTOMERS, DistinctCounter
+from olist_io import as_loaded
+
+# Con los tipos de `load_processed` (meses como enteros, `delay_status` como
+# texto), igual que los sketches que escriben la consolidación y el pipeline
+distinct_customers = DistinctCounter.from_frame(as_loaded(results[HLL_COLUMNS]))
+
+# Clientes distintos (aproximados) por estado
+distinct_customers.rollup(['geolocation_state']).estimate().round()
+
+# %%
+# Guardamos los sketches para los análisis posteriores
+distinct_customers.save(FILE_DISTINCT_CUSTOMERS)
+
 # %% [markdown]
 # ### 5. Entregables
 # 
@@ -491,6 +545,15 @@ results = orders_totals.merge(
 # 
 # B. Entregar la tabla generada en el inciso A en formato `.csv`, nombrando al archivo como `oilst_processed.csv`.
 
+# %% [markdown]
+# Los pasos de lectura, conversión de fechas y uniones de esta sección también están reunidos en el módulo `olist_consolidate.py`, que solo usa pandas. Para regenerar el archivo consolidado sin ejecutar las celdas de exploración ni importar librerías de gráficas:
+#
+# ```
+# python olist_cli.py consolidate --data-path "C:\Users\Natalia\Recursos DN_COM_58"
+# ```
+#
+# Si la consolidación se vuelve lenta, cada paso (lecturas, `to_datetime`, `drop_duplicates`, cada `merge` y `to_csv`) se puede medir sin tocar el código definiendo la variable de entorno `OLIST_PROFILE` con una carpeta de salida (y opcionalmente `OLIST_PROFILE_MODE=cprofile,memory`). El módulo `olist_profile.py` escribe ahí `trace.json` (tiempos, CPU, memoria y filas de entrada y salida de cada paso; se abre en chrome://tracing) y `stages.folded` (para un flamegraph).
+
 # %% [markdown]
 # Finalmente escribiremos el resultado en un archivo separado por comas `.csv`:
 
@@ -575,6 +638,9 @@ Tabla_Pearson.corr()
 # Ahora graficamos
 
 # %%
+# matplotlib se importa solo aquí, donde se usa por primera vez
+import matplotlib.pyplot as plt
+
 plt.matshow(Tabla_Pearson.corr())
 
 # %% [markdown]
@@ -21,9 +21,6 @@
 import os
 import numpy as np
 import pandas as pd
-import openpyxl
-
-import matplotlib.pyplot as plt
 
 import warnings
 warnings.filterwarnings('ignore')
@@ -443,15 +440,14 @@ delivered.pivot_table(
     fill_value=0
     )
 
+# %% [markdown]
+# Las tablas entregables de este tema (esta y la de tamaño de canasta más abajo) viven en el módulo `olist_tables.py`, que solo usa pandas. Así se pueden regenerar con `python olist_cli.py tables` sin importar las librerías de gráficas:
+
 # %%
 # Ahora generamos el archivo en formato .csv
-prop_sales = delivered.pivot_table(
-    index='delay_status',
-    columns = 'quarter',
-    values= 'total_sales',
-    aggfunc= 'sum',
-    fill_value=0
-    )
+from olist_tables import prop_sales_by_quarter
+
+prop_sales = prop_sales_by_quarter(oilst)
 
 # Guardar la tabla dinámica en un archivo CSV
 prop_sales.to_csv('prop_sales_delay_status_by_quarte.csv')
@@ -487,6 +483,32 @@ delivered.pivot_table(
 # 
 # A mayor número de ventas, mayor probabilidad de retraso, esto habla mucho de la logística de la empresa.
 
+# %% [markdown]
+# **Intervalos de confianza bootstrap**
+#
+# Las proporciones anteriores son valores puntuales. Para saber qué tanto podrían variar si tuviéramos otra muestra de órdenes, usamos el módulo `olist_bootstrap.py`, que remuestrea las órdenes dentro de cada grupo (con pesos multinomiales y en paralelo) y reporta el intervalo de confianza al 95% de cada proporción:
+
+# %%
+from olist_bootstrap import bootstrap_shares
+
+# Proporción de órdenes por tipo de entrega
+bootstrap_shares(delivered).round(4)
+
+# %%
+# Proporción de ventas por tipo de entrega en cada trimestre
+bootstrap_shares(
+    delivered,
+    by='quarter',
+    value='total_sales'
+    ).round(4)
+
+# %%
+# Proporción de órdenes por tipo de entrega en cada estado
+bootstrap_shares(
+    delivered,
+    by='geolocation_state'
+    ).round(4)
+
 # %% [markdown]
 # **Tablas de contingencia en Pandas**
 # 
@@ -530,11 +552,9 @@ pd.crosstab(
 
 # %%
 # Ahora generamos el archivo en formato .csv
-count_orders = pd.crosstab(
-     oilst['total_products'],
-     oilst['delay_status'],
-     margins = True
- ).sort_values(['long_delay']).tail(10)
+from olist_tables import count_orders_basket_size
+
+count_orders = count_orders_basket_size(oilst)
 
 # Guardar la tabla dinámica en un archivo CSV
 count_orders.to_csv('count_orders_basket_size_by_delay_status.csv')
@@ -557,6 +577,9 @@ count_orders.to_csv('count_orders_basket_size_by_delay_status.csv')
 # En Python, la librería Matplotlib permite construir el histograma de frecuencias de una manera sencilla con la función `.hist`:
 
 # %%
+# matplotlib se importa solo a partir de aquí, donde se usa por primera vez
+import matplotlib.pyplot as plt
+
 # figura y eje de la figura
 fig, ax = plt.subplots(figsize=(10, 5))
 
@@ -706,22 +729,24 @@ print(
 # En el caso de la variable `delta_days`, la **función de distribución acumulativa empírica** se puede visualizar mediante la función `ecdfplot`. En el **eje X** se tiene el valor de la variable en estudio y en el **eje Y** se encuentra la proporción de casos que corresponden a valores menores o iguales a los del **eje X** .
 
 # %% [markdown]
-# En Python, se puede construir la función **función de distribución acumulativa empírica** usando las utilidades de Matplotlib `.hist` (https://www.google.com/search?client=safari&rls=en&q=hist+matplotlib&ie=UTF-8&oe=UTF-8) junto con sus parámetros `cumulative=True`, `histtype='step'` y ` density=True`
+# En Python, se puede construir la función **función de distribución acumulativa empírica** ordenando los valores de la variable: la proporción de casos menores o iguales a un valor `x` es la posición de `x` dentro de la lista ordenada dividida entre el total de casos.
+#
+# Para no ordenar la columna cada vez que se grafica, el módulo `olist_ecdf.py` guarda los valores de `delta_days` ya ordenados de las órdenes de 2018 (`year > 2017`), para cada `delay_status` y para cada estado. Después, los abre con memoria mapeada y grafica una versión submuestreada de la curva escalonada con `ax.step`:
 
 # %%
-fig, ax = plt.subplots(figsize=(15, 6))
+from olist_ecdf import open_ecdf_store
 
-n_bins = 300
+# Ordena y guarda los valores de delta_days por segmento solo si faltan o si
+# los datos cambiaron; después los abre con memoria mapeada. Las órdenes sin
+# entregar no tienen delta_days y no entran en los valores ordenados
+ecdf_store = open_ecdf_store(oilst.query("year > 2017"), 'olist_ecdf_2018')
 
-# plot the cumulative histogram
-n, bins, patches = ax.hist(
-    oilst.query("year > 2017")['delta_days'],
-    n_bins,
-    density=True,
-    histtype='step',
-    cumulative=True,
-    label='Empirical'
-    )
+# %%
+fig, ax = plt.subplots(figsize=(15, 6))
+
+# curva escalonada de la ECDF (1000 puntos)
+x, y = ecdf_store['delivered'].step()
+ax.step(x, y, where='post', label='Empirical')
 
 # tidy up the figure
 ax.grid(True)
@@ -758,6 +783,16 @@ kde = scipy.stats.gaussian_kde(
 # en cero dias antes de lo estimado
 print("Probabilidad: ",kde.integrate_box_1d(-30, 0)*100)
 
+# %% [markdown]
+# La probabilidad también se puede calcular directamente sobre la función de distribución acumulativa empírica, con búsqueda binaria en los valores ordenados:
+
+# %%
+# Proporción de órdenes de 2018 entregadas entre un mes y cero días antes de lo estimado
+print("Probabilidad empírica: ", ecdf_store['delivered'].prob(-30, 0)*100)
+
+# Mediana y percentil 90 de delta_days para las órdenes con retraso prolongado
+ecdf_store['delay_status=long_delay'].quantile([0.5, 0.9])
+
 # %% [markdown]
 # Del mismo modo, se puede calcular la probabilidad de recibir el pedio con retrazo moderado (entre cero dias de lo estimado y hasta en menos de 3):
 
@@ -222,14 +222,20 @@ plt.savefig('3_a_histogram_sales_short_long_delays.png')
 # Dicha herramienta es una manera de resumir datos y entender cómo se distribuyen los valores en un conjunto de datos, pues esencialmente, para una lista ordenada de números, nos permite entender cuántos de los valores son menores o iguales a un número específico y con ello entender de manera aproximada cuantos de los casos ocurren en la realidad y en que proporción, aproximando la probabilidad de un fenómeno.
 # 
 # En el caso de la variable `delta_days`, la **función de distribución acumulativa empírica** se puede visualizar mediante la función `ecdfplot`. En el **eje X** se tiene el valor de la variable en estudio y en el **eje Y** se encuentra la proporción de casos que corresponden a valores menores o iguales a los del **eje X** .
+#
+# Como `ecdfplot` ordena la columna cada vez que se llama, usaremos los valores ya ordenados que guarda el módulo `olist_ecdf.py` (por segmento y con memoria mapeada) y graficaremos la curva escalonada submuestreada con `plt.step`:
 
 # %%
-sns.ecdfplot(
-    data=delivered,
-    x="delta_days"
-    ).set(
-        title='Fig. 3 Función cumulativa de probabilidad de la diferencia \n entre el tiempo de estimado entrega y real de los pedidos'
-        )
+from olist_ecdf import open_ecdf_store
+
+ecdf_store = open_ecdf_store(delivered, 'olist_ecdf')
+
+x, y = ecdf_store['delivered'].step()
+
+plt.step(x, y, where='post')
+plt.xlabel('delta_days')
+plt.ylabel('Proportion')
+plt.title('Fig. 3 Función cumulativa de probabilidad de la diferencia \n entre el tiempo de estimado entrega y real de los pedidos')
 
 
 # %% [markdown]
@@ -300,15 +306,24 @@ print("Bigote superior: ", bigote_superior)
 # 
 # 
 
+# %% [markdown]
+# Los conteos por mes se obtienen de las series diarias del módulo `olist_timeseries.py`, que guarda los conteos de órdenes por día y tipo de entrega en arreglos. Así no hace falta repetir el `groupby` sobre todas las órdenes cada vez que se grafica, y se guardan en `olist_daily_metrics.npz` para que en las siguientes ejecuciones solo se agreguen las órdenes nuevas:
+
 # %%
+from olist_timeseries import FILE_DAILY_METRICS, update_daily_metrics
+from olist_periods import format_months
+
+# Las series se guardan junto a los datos; solo se agregan los días nuevos
+daily_metrics = update_daily_metrics(
+    delivered, os.path.join(DATA_PATH, FILE_DAILY_METRICS))
+
 # Contamos la cantidad de envios con retrasos prolongados
-orders_by_year = delivered.groupby(
-    ['delay_status','year_month'])['order_id'].agg('count').reset_index().rename(
-        columns={'year_month': 'period', 'order_id':'long_delays'}
-        )
+orders_by_year = daily_metrics.monthly().rename(
+    columns={'year_month': 'period', 'orders':'long_delays'}
+    )
 
 # Convertimos la fecha a texto
-orders_by_year['period'] = orders_by_year['period'].astype(str)
+orders_by_year['period'] = format_months(orders_by_year['period'])
 
 # %%
 # Especifica el tamaño de la figura
@@ -320,6 +335,25 @@ sns.lineplot(
     y='long_delays',
     ).tick_params(axis='x', labelrotation=30)
 
+# %% [markdown]
+# Con las mismas series diarias podemos ver la tasa de retrasos prolongados en ventanas móviles de 7, 30 y 90 días:
+
+# %%
+rolling_metrics = daily_metrics.rolling_windows()
+
+plt.figure(figsize = (12,6))
+
+for window in ['7d', '30d', '90d']:
+    plt.plot(
+        rolling_metrics.index,
+        rolling_metrics[(window, 'long_delay_rate')],
+        label=window
+        )
+
+plt.ylabel('Proporción de órdenes con retraso prolongado')
+plt.title('Tasa de retrasos prolongados en ventanas móviles')
+plt.legend()
+
 # %% [markdown]
 # ¿Existe alguna tendecia desde el Octubre de 2017 hasta marzo de 2018?
 # 
@@ -369,16 +403,39 @@ delivered.groupby(['delay_status'])['order_id'].agg('count')
 # Seaborn nos permite construir diagramas de dispersión con la función `.relplot`. En la parte inferior, se muestra el diagrama de dispersión entre las ventas de las órdenes y sus tiempos de entrego con respecto a lo estimado.
 # 
 
+# %% [markdown]
+# Con cientos de miles de órdenes, dibujar un punto por orden tarda mucho y los puntos se enciman. Por eso los diagramas de dispersión siguientes usan una muestra de a lo más 20,000 órdenes, estratificada por `delay_status`, que conserva los mínimos, los máximos y los valores atípicos de cada grupo (`stratified_sample` del módulo `olist_scatter.py`):
+
+# %%
+from olist_scatter import stratified_sample, draw_density, draw_pair_density
+
+scatter_columns = [
+    "total_sales",
+    "total_products",
+    "delta_days",
+    "distance_distribution_center"
+    ]
+delivered_sample = stratified_sample(
+    delivered, by="delay_status", columns=scatter_columns)
+
 # %%
 # Create a visualization
 sns.relplot(
-    data=delivered,
+    data=delivered_sample,
     x="delta_days",
     y="total_sales",
 ).set(
     title='Fig. 7 Diagrama de dispersión entre el \n precio de las órdenes y delta_days'
         )
 
+# %% [markdown]
+# La misma relación con todas las órdenes se puede ver como un histograma 2D, donde el color indica cuántas órdenes caen en cada celda (en escala logarítmica):
+
+# %%
+fig, ax = plt.subplots()
+draw_density(ax, delivered, "delta_days", "total_sales")
+ax.set_title('Fig. 7 Densidad de órdenes por \n precio de las órdenes y delta_days')
+
 # %% [markdown]
 # No se aprecia claramente algún efecto de correlación lineal positiva o negativa entre ambas. Es decir, no se puede concluir que el tiempo de entrega se afecte por el precio total de las órdenes.
 
@@ -392,7 +449,7 @@ sns.relplot(
 # %%
 # Create a visualization
 sns.relplot(
-    data=delivered.query("delay_status == 'long_delay'"),
+    data=delivered_sample.query("delay_status == 'long_delay'"),
     x="delta_days",
     y="distance_distribution_center",
 ).set(
@@ -420,16 +477,25 @@ sns.relplot(
 # 
 # Para ello, se pueden aprovechar las funciones `boxplot` o `.catplot` como en el ejemplo siguiente:
 
+# %% [markdown]
+# Los diagramas de caja solo necesitan los cuartiles y los bigotes de cada grupo. En lugar de pasar todas las órdenes a `sns.boxplot`, los calculamos una vez con `box_stats` del módulo `olist_boxplot.py` y dibujamos con `draw_boxplot`, que usa `Axes.bxp` de matplotlib:
+
 # %%
+from olist_boxplot import box_stats, draw_boxplot
+from olist_classify import DELAY_STATUS
+
 # Usamos la variable showfliers = False para omitir
 # los valores atipicos del grafico
 
-sns.boxplot(
-    data=delivered,
+fig, ax = plt.subplots()
+draw_boxplot(
+    ax,
+    box_stats(delivered, ['delay_status'], 'total_sales', max_outliers=0),
     x="delay_status",
-    y="total_sales",
+    order=DELAY_STATUS,
     showfliers = False
     ).set(
+        ylabel='total_sales',
         title='Fig. 8 Diagramas de caja de la variable delay_status \n vs el valor monetario de las órdenes'
         )
 
@@ -437,12 +503,15 @@ sns.boxplot(
 # Usamos la variable showfliers = False para omitir
 # los valores atipicos del grafico
 
-sns.boxplot(
-    data=delivered,
+fig, ax = plt.subplots()
+draw_boxplot(
+    ax,
+    box_stats(delivered, ['delay_status'], 'distance_distribution_center', max_outliers=0),
     x="delay_status",
-    y="distance_distribution_center",
+    order=DELAY_STATUS,
     showfliers = False
     ).set(
+        ylabel='distance_distribution_center',
         title='Fig. 10 Diagramas de caja de la variable delay_status \n vs la distacia al dentro de distribución más cercano'
         )
 
@@ -460,18 +529,25 @@ sns.boxplot(
 # %% [markdown]
 # Ahora vamos a construir una visualización los diferentes diagramas de cajas de la `delta_days` a lo largo de los estados de Brasil. Dicha visualización deberá segmentarse o aperturarse de forma que permita revisar en una misma figura como varian los diagramas de caja también para órdenes que tuvieron diferentes valores del campo `delay_status` a lo largo de los estados brasileños:
 
+# %%
+# Cuartiles y bigotes de delta_days por estado y delay_status (se calculan
+# una sola vez para las dos figuras siguientes)
+state_box_stats = box_stats(
+    delivered, ['geolocation_state', 'delay_status'], 'delta_days', max_outliers=0)
+
 # %%
 # Configura el tamaño de la figura
-plt.figure(figsize=(12, 8))
+fig, ax = plt.subplots(figsize=(12, 8))
 
-# Crea el diagrama de caja utilizando Seaborn
-sns.boxplot(
+# Crea el diagrama de caja a partir de los cuartiles por estado y delay_status
+draw_boxplot(
+    ax,
+    state_box_stats,
     x='geolocation_state',
-    y='delta_days',
     hue='delay_status',
     showfliers = False,
-    data=delivered,
     order=delivered['geolocation_state'].value_counts().index,  # Ordena los estados por la cantidad de datos
+    hue_order=DELAY_STATUS,
     palette='Set2'  
 )
 
@@ -495,16 +571,17 @@ plt.show()
 # Para guardar la imagen
 
 # Configura el tamaño de la figura
-plt.figure(figsize=(12, 8))
+fig, ax = plt.subplots(figsize=(12, 8))
 
-# Crea el diagrama de caja utilizando Seaborn
-sns.boxplot(
+# Crea el diagrama de caja a partir de los cuartiles por estado y delay_status
+draw_boxplot(
+    ax,
+    state_box_stats,
     x='geolocation_state',
-    y='delta_days',
     hue='delay_status',
     showfliers = False,
-    data=delivered,
     order=delivered['geolocation_state'].value_counts().index,  # Ordena los estados por la cantidad de datos
+    hue_order=DELAY_STATUS,
     palette='Set2'  
 )
 
@@ -615,10 +692,10 @@ plt.savefig('3_b_correlation_matrix_complete_orders.png')
 
 # %%
 # Nota: la ejecucion de este diagrama puede tardar
-# Dado que crea muchos graficos distintos
+# Dado que crea muchos graficos distintos (por eso usamos la muestra)
 
 sns.pairplot(
-    data=delivered.filter(
+    data=delivered_sample.filter(
         [
             "delay_status",
             "total_sales", 
@@ -630,6 +707,12 @@ sns.pairplot(
     hue="delay_status"
     )
 
+# %% [markdown]
+# Con todas las órdenes, `draw_pair_density` construye el mismo arreglo de gráficas con histogramas 2D fuera de la diagonal e histogramas por `delay_status` en la diagonal:
+
+# %%
+draw_pair_density(delivered, scatter_columns, hue="delay_status")
+
 # %% [markdown]
 # **Pregunta:**
 # 
@@ -688,7 +771,7 @@ sns.lineplot(
 
 # %%
 sns.relplot(
-    data=delivered,
+    data=delivered_sample,
     x="delta_days",
     y="distance_distribution_center",
     row="delay_status",
@@ -49,10 +49,14 @@ FILE_GEODATA = 'brasil_geodata.json'
 FILE_CONSOLIDATED_DATA = 'oilst_processed.csv'
 FILE_REGIONS = 'brasil_regions.csv'
 
+# %% [markdown]
+# Para que los mapas no incrusten la geometría completa en cada HTML, la leemos con `load_geojson` del módulo `olist_geo.py`, que simplifica las fronteras (Douglas-Peucker, conservando iguales las fronteras compartidas entre estados), redondea las coordenadas y guarda el resultado en caché para las siguientes ejecuciones:
+
 # %%
-# Cargar archivo datos geográficos de Brasil
-with open(os.path.join(DATA_PATH, FILE_GEODATA), 'r') as f:
-    geojson = json.load(f)
+from olist_geo import load_geojson
+
+# Cargar archivo datos geográficos de Brasil (simplificado)
+geojson = load_geojson(os.path.join(DATA_PATH, FILE_GEODATA))
 
 
 # %%
@@ -78,7 +82,10 @@ oilst = pd.read_csv(
 
 # %%
 # Agregamos la columna de región para los estadios de Brasil
-oilst = oilst.merge(regions[['abbreviation', 'region']], on='abbreviation', how='left')
+# (cada abreviación debe aparecer una sola vez en `regions`: olist_joins)
+from olist_joins import checked_merge
+
+oilst = checked_merge(oilst, regions[['abbreviation', 'region']], 'm:1', on='abbreviation', how='left')
 
 # %%
 oilst.info()
@@ -112,17 +119,20 @@ delivered = oilst.query("order_status == 'delivered'")
 # 
 # Para comenzar, podemos explorar nuevamente la cantidad de ordenes en función de si llegaron en tiempo al domicilio del cliente.
 # 
-# En este caso, primero calcularemos los valores agregados de las ordenes por dicho estatus.
+# En este caso, primero calcularemos los valores agregados de las ordenes por dicho estatus. Los conteos se toman de un cubo de agregados (órdenes, ventas y `delta_days` por día, estado y `delay_status`, módulo `olist_cube.py`), del que también salen las gráficas de esta sección: las tablas y las gráficas usan el mismo agregado.
 
 # %%
+from olist_cube import OrderCube
+from olist_interactive import time_series, write_chart
+from olist_periods import format_months, month_index
+
+cube = OrderCube.from_frame(delivered)
+
 # Calcula la cantidad de ordenes en el tiempo
-orders_time = delivered.groupby(['year_month']).\
-    aggregate({'order_id':'count',}).\
-        reset_index().\
-            rename(columns={'order_id':'orders',})
+orders_time = cube.rollup('M', by=[])
 
 # Crea una variable temporal en texto para graficar
-orders_time['period'] =  orders_time['year_month'].astype(str)
+orders_time['period'] = orders_time['period'].dt.strftime('%Y-%m')
 
 # %% [markdown]
 # Visualmente ello construye la siguiente tabla:
@@ -131,14 +141,16 @@ orders_time['period'] =  orders_time['year_month'].astype(str)
 orders_time.tail()
 
 # %% [markdown]
-# Para realizar un gráfico de barras interactivo, basta usar la función `.bar` (https://plotly.com/python/bar-charts/), cuya sintaxis es análoga a la de Seaborn
+# Para realizar un gráfico de barras interactivo, basta usar la función `.bar` (https://plotly.com/python/bar-charts/), cuya sintaxis es análoga a la de Seaborn.
+# 
+# Para que las gráficas se mantengan ágiles aun con varios años de datos diarios, las construimos desde el cubo con la función `time_series` del módulo `olist_interactive.py`. Ésta pasa los datos como arreglos tipados, usa WebGL (`scattergl`) en líneas y áreas, e incluye las series por día, mes y trimestre: al guardarla con `write_chart`, el HTML cambia de frecuencia según el nivel de zoom.
 
 # %%
 # Crea la visualizacion
-fig = px.bar(
-    orders_time,
-    x="period",
-    y="orders",
+fig = time_series(
+    cube,
+    "orders",
+    kind='bar',
     title='Fig.1 Número de órdenes de Oilst'
 )
 
@@ -156,13 +168,10 @@ fig.show()
 
 # %%
 # Calcula la cantidad de ordenes en el tiempo
-orders_time_delay_status = delivered.groupby(['year_month','delay_status']).\
-    aggregate({'order_id':'count',}).\
-        reset_index().\
-            rename(columns={'order_id':'orders',})
+orders_time_delay_status = cube.rollup('M')
 
 # Crea una variable temporal en texto para graficar
-orders_time_delay_status['period'] =  orders_time_delay_status['year_month'].astype(str)
+orders_time_delay_status['period'] = orders_time_delay_status['period'].dt.strftime('%Y-%m')
 
 # %% [markdown]
 # Esto nos arroja la tabla:
@@ -175,11 +184,11 @@ orders_time_delay_status
 
 # %%
 # Crea la visualizacion
-fig = px.bar(
-    orders_time_delay_status,
-    x="period",
-    y="orders",
-    color='delay_status',
+fig = time_series(
+    cube,
+    "orders",
+    by='delay_status',
+    kind='bar',
     title='Fig.2 Número de órdenes de Oilst por tipo de entrega'
 )
 
@@ -204,18 +213,17 @@ fig.show()
 # Si existe una realción pero no es muy fuerte, tampoco es lineal, solo a mayor número de pedidos, mayor probabbilidad de retrasos. Es un asunto que se puede explicar desde el punto de vista de estadìstica y probabilidad.
 
 # %%
-# Agrupar las órdenes con retraso prolongado
-delayed_orders = delivered[delivered['delay_status'] == 'long_delay'].groupby(['year_month', 'geolocation_state']).size().reset_index(name='count')
+# Órdenes con retraso prolongado (del cubo, por mes o por trimestre según el zoom)
+long_delay_cube = cube.select(statuses=['long_delay'])
 
 # Visualización interactiva con Plotly
-fig = px.bar(
-    delayed_orders,
-    x='year_month',
-    y='count',
-    color='geolocation_state',
+fig = time_series(
+    long_delay_cube,
+    'orders',
+    by='geolocation_state',
+    kind='bar',
     title='Órdenas con Retraso prolongado por cada mes, año y región',
-    labels={'year_month': 'Mes y Año', 'count': 'Cantidad de Órdenes'},
-    hover_name='geolocation_state'
+    labels={'period': 'Mes y Año', 'orders': 'Cantidad de Órdenes'}
 )
 
 # Personaliza la visualización
@@ -228,8 +236,10 @@ fig.update_layout(
     xaxis_tickangle=-45  # No cabían los nombres, entonces los giré un poquito
 )
 
-# Guarda la visualización en un archivo HTML
-fig.write_html('3_d_evolution_delayed_orders_by_region.html')
+# Guarda la visualización en un archivo HTML (usando un plotly.min.js
+# compartido en lugar de incrustar la librería en cada archivo)
+write_chart(fig, '3_d_evolution_delayed_orders_by_region.html')
+fig_delayed_orders = fig
 
 # %% [markdown]
 # ### 4.2 Análisis en el tiempo de las ventas de acuerdo a si se entregaron o no a tiempo.
@@ -239,19 +249,22 @@ fig.write_html('3_d_evolution_delayed_orders_by_region.html')
 # Nuevamente calcularemos los valores agregados de las órdenes por dicho estatus.
 
 # %%
-sales_time = delivered.groupby(['quarter', 'delay_status'])['total_sales'].sum().reset_index()
+sales_time = cube.rollup('Q', by=['delay_status'])[['period', 'delay_status', 'total_sales']]
 
-sales_time['quarter'] = sales_time['quarter'].astype('str')
+sales_time['quarter'] = format_months(month_index(sales_time['period'], 'Q'), 'Q')
 
 # %% [markdown]
 # En este caso, aprovecharemos para introdución las gráficas de áreas de Plotly, que esencialmente se trata de series de tiempo con sobreados que permite entender la magnitun de una cantidad en el tiempo como el área bajo un curva.
 
 # %%
-fig = px.area(
-    sales_time,
-    x="quarter",
-    y="total_sales",
-    color="delay_status",
+# Áreas apiladas con WebGL: trimestres en la vista completa y meses o días
+# al hacer zoom (a lo más 12 periodos visibles)
+fig = time_series(
+    cube,
+    "total_sales",
+    by="delay_status",
+    kind='area',
+    max_points=12,
     title='Fig.3 Total de ventas de órdenes de Oilst por tipo de entrega'
     )
 fig.show()
@@ -342,8 +355,17 @@ oilst[
 # %% [markdown]
 # Para aquellas ordenes con retrazos prolongados, las distribuciones tiempos de retrazo por región pueden visualar con diagramas de caja:
 
+# %% [markdown]
+# `px.box` y `px.violin` incrustan en la figura el valor de cada orden. Con el módulo `olist_boxplot.py` calculamos antes, por grupo, los cuartiles, los bigotes y una muestra acotada de valores atípicos (`box_stats`), y la densidad de cada violín en una malla fija de puntos (`violin_stats`); así el tamaño de las figuras no depende del número de órdenes:
+
+# %%
+from olist_boxplot import box_stats, violin_stats, plot_box, plot_violin
+
+long_delay = delivered.query("delay_status == 'long_delay'")
+region_box_stats = box_stats(long_delay, ['region'], 'delta_days')
+
 # %%
-fig = px.box(delivered.query("delay_status == 'long_delay'"),
+fig = plot_box(region_box_stats,
     x="region",
     y="delta_days",
     title="Fig. 5 Distribución de los tiempos de entrega de órdenes con retrazo, por región"
@@ -353,13 +375,11 @@ fig.show()
 
 
 # %%
-fig = px.violin(delivered.query(
-    "delay_status == 'long_delay'"
-),
+fig = plot_violin(
+    violin_stats(long_delay, ['region'], 'delta_days'),
+    region_box_stats,
     x="region",
     y="delta_days",
-    color="region",
-    box=True, points="all",
     title="Fig. 6 Gráfico de violín de los tiempos de entrega de órdenes con retrazo, por región"
 )
 
@@ -371,9 +391,7 @@ fig.show()
 # Para complementarla, se puede segmentar aun más la visualización a nivel estado:
 
 # %%
-fig = px.box(delivered.query(
-    "delay_status == 'long_delay'"
-),
+fig = plot_box(box_stats(long_delay, ['state_name', 'region'], 'delta_days'),
     x="state_name",
     y="delta_days",
     color="region",
@@ -507,12 +525,40 @@ fig.update_layout(
 # Mostrar figura
 #fig.show()
 
-# Guardar la figura interactiva como un archivo HTML
-fig.write_html('3_e_map_long_delays_by_state.html')
+# Guardar la figura interactiva como un archivo HTML (usando un
+# plotly.min.js compartido en lugar de incrustar la librería)
+from olist_report import write_report
+
+write_report(fig, '3_e_map_long_delays_by_state.html')
+fig_long_delays_map = fig
 
 # Mostrar figura
 fig.show()
 
+# %% [markdown]
+# Los dos entregables interactivos también se pueden reunir en una sola página (un tablero) que comparte el mismo `plotly.min.js`:
+
+# %%
+from olist_interactive import write_charts
+
+# Igual que write_dashboard de olist_report, pero con el cambio de
+# frecuencia al hacer zoom en la gráfica de barras
+write_charts(
+    [fig_delayed_orders, fig_long_delays_map],
+    'olist_dashboard.html',
+    title='Oilst: órdenes con retraso prolongado'
+    )
+
+# %% [markdown]
+# Para explorar los datos con filtros (rango de fechas, región, estado y tipo de entrega) sin volver a ejecutar este script, `olist_dashboard.py` levanta un tablero local que carga una sola vez el cubo de agregados y la geometría, y responde cada consulta desde el cubo (con caché y `ETag`). No requiere conexión a internet y, sin los datos reales, puede usar datos sintéticos:
+#
+# ```
+# python olist_dashboard.py --data-path "C:\Users\Natalia\Recursos DN_COM_58"
+# python olist_dashboard.py --synthetic 100000
+# ```
+#
+# y después abrir http://127.0.0.1:8050/ en el navegador.
+
 # %% [markdown]
 # ## 5. Entregables
 # 
@@ -43,21 +43,12 @@ DATA_PATH="C:\\Users\\Natalia\\Recursos DN_COM_58"
 FILE_CONSOLIDATED_DATA = 'oilst_processed.csv'
 
 # %% [markdown]
-# Recordemos que algunas de las columnas que contienen fechas deben ser convertidas al formato correspondiente, lo cual se puede llevar a cabo de forma automática usando el parámetro de `parse_dates`:
+# Recordemos que algunas de las columnas que contienen fechas deben ser convertidas al formato correspondiente. `load_processed` (módulo `olist_io.py`) lee el archivo con las fechas ya convertidas y, si la consolidación publicó `oilst_processed.arrow`, abre ese archivo con mapeo de memoria: no interpreta texto y, si se ejecutan varios scripts a la vez, todos comparten la misma copia de los datos en memoria:
 
 # %%
-columns_dates=[
-    'order_purchase_timestamp',
-    'order_approved_at',
-    'order_delivered_carrier_date',
-    'order_delivered_customer_date',
-    'order_estimated_delivery_date'
-    ]
-
-oilst = pd.read_csv(
-    os.path.join(DATA_PATH, FILE_CONSOLIDATED_DATA),
-    parse_dates=columns_dates
-    )
+from olist_io import load_processed
+
+oilst = load_processed(DATA_PATH, period_text=True)
 
 # %% [markdown]
 # La información general de esta tabla la podemos obtener, como ya sabemos, a través del comando `.info`
@@ -43,21 +43,12 @@ DATA_PATH="C:\\Users\\Natalia\\Recursos DN_COM_58"
 FILE_CONSOLIDATED_DATA = 'oilst_processed.csv'
 
 # %% [markdown]
-# Recordemos que algunas de las columnas que contienen fechas deben ser convertidas al formato correspondiente, lo cual se puede llevar a cabo de forma automática usando el parámetro de `parse_dates`:
+# Recordemos que algunas de las columnas que contienen fechas deben ser convertidas al formato correspondiente. `load_processed` (módulo `olist_io.py`) lee el archivo con las fechas ya convertidas y, si la consolidación publicó `oilst_processed.arrow`, abre ese archivo con mapeo de memoria: no interpreta texto y, si se ejecutan varios scripts a la vez, todos comparten la misma copia de los datos en memoria:
 
 # %%
-columns_dates=[
-    'order_purchase_timestamp',
-    'order_approved_at',
-    'order_delivered_carrier_date',
-    'order_delivered_customer_date',
-    'order_estimated_delivery_date'
-    ]
+from olist_io import load_processed
 
-oilst = pd.read_csv(
-    os.path.join(DATA_PATH, FILE_CONSOLIDATED_DATA),
-    parse_dates=columns_dates
-    )
+oilst = load_processed(DATA_PATH, period_text=True)
 
 # %% [markdown]
 # La información general de esta tabla la podemos obtener, como ya sabemos, a través del comando `.info`
@@ -312,16 +303,39 @@ delivered.groupby(['delay_status'])['order_id'].agg('count')
 # Seaborn nos permite construir diagramas de dispersión con la función `.relplot`. En la parte inferior, se muestra el diagrama de dispersión entre las ventas de las órdenes y sus tiempos de entrego con respecto a lo estimado.
 # 
 
+# %% [markdown]
+# Con cientos de miles de órdenes, dibujar un punto por orden tarda mucho y los puntos se enciman. Por eso los diagramas de dispersión siguientes usan una muestra de a lo más 20,000 órdenes, estratificada por `delay_status`, que conserva los mínimos, los máximos y los valores atípicos de cada grupo (`stratified_sample` del módulo `olist_scatter.py`):
+
+# %%
+from olist_scatter import stratified_sample, draw_density, draw_pair_density
+
+scatter_columns = [
+    "total_sales",
+    "total_products",
+    "delta_days",
+    "distance_distribution_center"
+    ]
+delivered_sample = stratified_sample(
+    delivered, by="delay_status", columns=scatter_columns)
+
 # %%
 # Create a visualization
 sns.relplot(
-    data=delivered,
+    data=delivered_sample,
     x="delta_days",
     y="total_sales",
 ).set(
     title='Fig. 7 Diagrama de dispersión entre el \n precio de las órdenes y delta_days'
         )
 
+# %% [markdown]
+# La misma relación con todas las órdenes se puede ver como un histograma 2D, donde el color indica cuántas órdenes caen en cada celda (en escala logarítmica):
+
+# %%
+fig, ax = plt.subplots()
+draw_density(ax, delivered, "delta_days", "total_sales")
+ax.set_title('Fig. 7 Densidad de órdenes por \n precio de las órdenes y delta_days')
+
 # %% [markdown]
 # No se aprecia claramente algún efecto de correlación lineal positiva o negativa entre ambas. Es decir, no se puede concluir que el tiempo de entrega se afecte por el precio total de las órdenes.
 
@@ -335,7 +349,7 @@ sns.relplot(
 # %%
 # Create a visualization
 sns.relplot(
-    data=delivered.query("delay_status == 'long_delay'"),
+    data=delivered_sample.query("delay_status == 'long_delay'"),
     x="delta_days",
     y="distance_distribution_center",
 ).set(
@@ -43,21 +43,12 @@ DATA_PATH="C:\\Users\\Natalia\\Recursos DN_COM_58"
 FILE_CONSOLIDATED_DATA = 'oilst_processed.csv'
 
 # %% [markdown]
-# Recordemos que algunas de las columnas que contienen fechas deben ser convertidas al formato correspondiente, lo cual se puede llevar a cabo de forma automática usando el parámetro de `parse_dates`:
+# Recordemos que algunas de las columnas que contienen fechas deben ser convertidas al formato correspondiente. `load_processed` (módulo `olist_io.py`) lee el archivo con las fechas ya convertidas y, si la consolidación publicó `oilst_processed.arrow`, abre ese archivo con mapeo de memoria: no interpreta texto y, si se ejecutan varios scripts a la vez, todos comparten la misma copia de los datos en memoria:
 
 # %%
-columns_dates=[
-    'order_purchase_timestamp',
-    'order_approved_at',
-    'order_delivered_carrier_date',
-    'order_delivered_customer_date',
-    'order_estimated_delivery_date'
-    ]
+from olist_io import load_processed
 
-oilst = pd.read_csv(
-    os.path.join(DATA_PATH, FILE_CONSOLIDATED_DATA),
-    parse_dates=columns_dates
-    )
+oilst = load_processed(DATA_PATH, period_text=True)
 
 # %% [markdown]
 # La información general de esta tabla la podemos obtener, como ya sabemos, a través del comando `.info`
@@ -369,16 +360,39 @@ delivered.groupby(['delay_status'])['order_id'].agg('count')
 # Seaborn nos permite construir diagramas de dispersión con la función `.relplot`. En la parte inferior, se muestra el diagrama de dispersión entre las ventas de las órdenes y sus tiempos de entrego con respecto a lo estimado.
 # 
 
+# %% [markdown]
+# Con cientos de miles de órdenes, dibujar un punto por orden tarda mucho y los puntos se enciman. Por eso los diagramas de dispersión siguientes usan una muestra de a lo más 20,000 órdenes, estratificada por `delay_status`, que conserva los mínimos, los máximos y los valores atípicos de cada grupo (`stratified_sample` del módulo `olist_scatter.py`):
+
+# %%
+from olist_scatter import stratified_sample, draw_density, draw_pair_density
+
+scatter_columns = [
+    "total_sales",
+    "total_products",
+    "delta_days",
+    "distance_distribution_center"
+    ]
+delivered_sample = stratified_sample(
+    delivered, by="delay_status", columns=scatter_columns)
+
 # %%
 # Create a visualization
 sns.relplot(
-    data=delivered,
+    data=delivered_sample,
     x="delta_days",
     y="total_sales",
 ).set(
     title='Fig. 7 Diagrama de dispersión entre el \n precio de las órdenes y delta_days'
         )
 
+# %% [markdown]
+# La misma relación con todas las órdenes se puede ver como un histograma 2D, donde el color indica cuántas órdenes caen en cada celda (en escala logarítmica):
+
+# %%
+fig, ax = plt.subplots()
+draw_density(ax, delivered, "delta_days", "total_sales")
+ax.set_title('Fig. 7 Densidad de órdenes por \n precio de las órdenes y delta_days')
+
 # %% [markdown]
 # No se aprecia claramente algún efecto de correlación lineal positiva o negativa entre ambas. Es decir, no se puede concluir que el tiempo de entrega se afecte por el precio total de las órdenes.
 
@@ -392,7 +406,7 @@ sns.relplot(
 # %%
 # Create a visualization
 sns.relplot(
-    data=delivered.query("delay_status == 'long_delay'"),
+    data=delivered_sample.query("delay_status == 'long_delay'"),
     x="delta_days",
     y="distance_distribution_center",
 ).set(
@@ -420,16 +434,25 @@ sns.relplot(
 # 
 # Para ello, se pueden aprovechar las funciones `boxplot` o `.catplot` como en el ejemplo siguiente:
 
+# %% [markdown]
+# Los diagramas de caja solo necesitan los cuartiles y los bigotes de cada grupo. En lugar de pasar todas las órdenes a `sns.boxplot`, los calculamos una vez con `box_stats` del módulo `olist_boxplot.py` y dibujamos con `draw_boxplot`, que usa `Axes.bxp` de matplotlib:
+
 # %%
+from olist_boxplot import box_stats, draw_boxplot
+from olist_classify import DELAY_STATUS
+
 # Usamos la variable showfliers = False para omitir
 # los valores atipicos del grafico
 
-sns.boxplot(
-    data=delivered,
+fig, ax = plt.subplots()
+draw_boxplot(
+    ax,
+    box_stats(delivered, ['delay_status'], 'total_sales', max_outliers=0),
     x="delay_status",
-    y="total_sales",
+    order=DELAY_STATUS,
     showfliers = False
     ).set(
+        ylabel='total_sales',
         title='Fig. 8 Diagramas de caja de la variable delay_status \n vs el valor monetario de las órdenes'
         )
 
@@ -437,12 +460,15 @@ sns.boxplot(
 # Usamos la variable showfliers = False para omitir
 # los valores atipicos del grafico
 
-sns.boxplot(
-    data=delivered,
+fig, ax = plt.subplots()
+draw_boxplot(
+    ax,
+    box_stats(delivered, ['delay_status'], 'distance_distribution_center', max_outliers=0),
     x="delay_status",
-    y="distance_distribution_center",
+    order=DELAY_STATUS,
     showfliers = False
     ).set(
+        ylabel='distance_distribution_center',
         title='Fig. 10 Diagramas de caja de la variable delay_status \n vs la distacia al dentro de distribución más cercano'
         )
 
@@ -462,18 +488,25 @@ sns.boxplot(
 # 
 # C. Script que construya una visualización los diferentes diagramas de cajas de la `delta_days` a lo largo de los estados de Brasil. Dicha visualización deberá segmentarse o aperturarse de forma que permita revisar en una misma figura como varian los diagramas de caja también para órdenes que tuvieron diferentes valores del campo `delay_status` a lo largo de los estados brasileños. Dicho script se llamarán `3_c_boxplot_delta_day_by_state_and_delay_type.py` y la figura resultante del mismo se denominará `3_c_boxplot_delta_day_by_state_and_delay_type.png`. Hint: Revisar la documentación de `.catplot`
 
+# %%
+# Cuartiles y bigotes de delta_days por estado y delay_status (se calculan
+# una sola vez para las dos figuras siguientes)
+state_box_stats = box_stats(
+    delivered, ['geolocation_state', 'delay_status'], 'delta_days', max_outliers=0)
+
 # %%
 # Configura el tamaño de la figura
-plt.figure(figsize=(12, 8))
+fig, ax = plt.subplots(figsize=(12, 8))
 
-# Crea el diagrama de caja utilizando Seaborn
-sns.boxplot(
+# Crea el diagrama de caja a partir de los cuartiles por estado y delay_status
+draw_boxplot(
+    ax,
+    state_box_stats,
     x='geolocation_state',
-    y='delta_days',
     hue='delay_status',
     showfliers = False,
-    data=delivered,
     order=delivered['geolocation_state'].value_counts().index,  # Ordena los estados por la cantidad de datos
+    hue_order=DELAY_STATUS,
     palette='Set2'  
 )
 
@@ -497,16 +530,17 @@ plt.show()
 # Para guardar la imagen
 
 # Configura el tamaño de la figura
-plt.figure(figsize=(12, 8))
+fig, ax = plt.subplots(figsize=(12, 8))
 
-# Crea el diagrama de caja utilizando Seaborn
-sns.boxplot(
+# Crea el diagrama de caja a partir de los cuartiles por estado y delay_status
+draw_boxplot(
+    ax,
+    state_box_stats,
     x='geolocation_state',
-    y='delta_days',
     hue='delay_status',
     showfliers = False,
-    data=delivered,
     order=delivered['geolocation_state'].value_counts().index,  # Ordena los estados por la cantidad de datos
+    hue_order=DELAY_STATUS,
     palette='Set2'  
 )
 
@@ -19,7 +19,6 @@
 # %%
 import os
 import json
-import plotly.express as px
 import numpy as np
 import pandas as pd
 
@@ -49,10 +48,14 @@ FILE_GEODATA = 'brasil_geodata.json'
 FILE_CONSOLIDATED_DATA = 'oilst_processed.csv'
 FILE_REGIONS = 'brasil_regions.csv'
 
+# %% [markdown]
+# Para que los mapas no incrusten la geometría completa en cada HTML, la leemos con `load_geojson` del módulo `olist_geo.py`, que simplifica las fronteras (Douglas-Peucker, conservando iguales las fronteras compartidas entre estados), redondea las coordenadas y guarda el resultado en caché para las siguientes ejecuciones:
+
 # %%
-# Cargar archivo datos geográficos de Brasil
-with open(os.path.join(DATA_PATH, FILE_GEODATA), 'r') as f:
-    geojson = json.load(f)
+from olist_geo import load_geojson
+
+# Cargar archivo datos geográficos de Brasil (simplificado)
+geojson = load_geojson(os.path.join(DATA_PATH, FILE_GEODATA))
 
 
 # %%
@@ -61,19 +64,11 @@ regions = pd.read_csv(
 )
 
 # %%
-# cargamos datos de órdenes procesadas
-columns_dates = [
-    'order_purchase_timestamp',
-    'order_approved_at',
-    'order_delivered_carrier_date',
-    'order_delivered_customer_date',
-    'order_estimated_delivery_date'
-]
+# cargamos datos de órdenes procesadas (con las fechas convertidas; si existe
+# oilst_processed.arrow se abre con mapeo de memoria, compartido entre scripts)
+from olist_io import load_processed
 
-oilst = pd.read_csv(
-    os.path.join(DATA_PATH, FILE_CONSOLIDATED_DATA),
-    parse_dates=columns_dates
-)
+oilst = load_processed(DATA_PATH, period_text=True)
 
 
 # %%
@@ -131,14 +126,22 @@ orders_time['period'] =  orders_time['year_month'].astype(str)
 orders_time.tail()
 
 # %% [markdown]
-# Para realizar un gráfico de barras interactivo, basta usar la función `.bar` (https://plotly.com/python/bar-charts/), cuya sintaxis es análoga a la de Seaborn
+# Para realizar un gráfico de barras interactivo, basta usar la función `.bar` (https://plotly.com/python/bar-charts/), cuya sintaxis es análoga a la de Seaborn.
+# 
+# Para que las gráficas se mantengan ágiles aun con varios años de datos diarios, las construimos desde un cubo de agregados (órdenes, ventas y `delta_days` por día, estado y `delay_status`, módulo `olist_cube.py`) con la función `time_series` del módulo `olist_interactive.py`. Ésta pasa los datos como arreglos tipados, usa WebGL (`scattergl`) en líneas y áreas, e incluye las series por día, mes y trimestre: al guardarla con `write_chart`, el HTML cambia de frecuencia según el nivel de zoom.
+
+# %%
+from olist_cube import OrderCube
+from olist_interactive import time_series, write_chart
+
+cube = OrderCube.from_frame(delivered)
 
 # %%
 # Crea la visualizacion
-fig = px.bar(
-    orders_time,
-    x="period",
-    y="orders",
+fig = time_series(
+    cube,
+    "orders",
+    kind='bar',
     title='Fig.1 Número de órdenes de Oilst'
 )
 
@@ -175,11 +178,11 @@ orders_time_delay_status
 
 # %%
 # Crea la visualizacion
-fig = px.bar(
-    orders_time_delay_status,
-    x="period",
-    y="orders",
-    color='delay_status',
+fig = time_series(
+    cube,
+    "orders",
+    by='delay_status',
+    kind='bar',
     title='Fig.2 Número de órdenes de Oilst por tipo de entrega'
 )
 
@@ -211,18 +214,17 @@ fig.show()
 # **Hints:** 1) Primero realize conteo agrupados de las órdenes completadas mediante las variables `delay_status`,`year_month` y `geolocation_state`, 2) después explore la documentación de la utilidad `.bar` de Plotly para construir la visualización.
 
 # %%
-# Agrupar las órdenes con retraso prolongado
-delayed_orders = delivered[delivered['delay_status'] == 'long_delay'].groupby(['year_month', 'geolocation_state']).size().reset_index(name='count')
+# Órdenes con retraso prolongado (del cubo, por mes o por trimestre según el zoom)
+long_delay_cube = cube.select(statuses=['long_delay'])
 
 # Visualización interactiva con Plotly
-fig = px.bar(
-    delayed_orders,
-    x='year_month',
-    y='count',
-    color='geolocation_state',
+fig = time_series(
+    long_delay_cube,
+    'orders',
+    by='geolocation_state',
+    kind='bar',
     title='Órdenas con Retraso prolongado por cada mes, año y región',
-    labels={'year_month': 'Mes y Año', 'count': 'Cantidad de Órdenes'},
-    hover_name='geolocation_state'
+    labels={'period': 'Mes y Año', 'orders': 'Cantidad de Órdenes'}
 )
 
 # Personaliza la visualización
@@ -235,8 +237,9 @@ fig.update_layout(
     xaxis_tickangle=-45  # No cabían los nombres, entonces los giré un poquito
 )
 
-# Guarda la visualización en un archivo HTML
-fig.write_html('3_d_evolution_delayed_orders_by_region.html')
+# Guarda la visualización en un archivo HTML (usando un plotly.min.js
+# compartido en lugar de incrustar la librería en cada archivo)
+write_chart(fig, '3_d_evolution_delayed_orders_by_region.html')
 
 
 
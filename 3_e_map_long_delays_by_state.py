@@ -49,10 +49,14 @@ FILE_GEODATA = 'brasil_geodata.json'
 FILE_CONSOLIDATED_DATA = 'oilst_processed.csv'
 FILE_REGIONS = 'brasil_regions.csv'
 
+# %% [markdown]
+# Para que los mapas no incrusten la geometría completa en cada HTML, la leemos con `load_geojson` del módulo `olist_geo.py`, que simplifica las fronteras (Douglas-Peucker, conservando iguales las fronteras compartidas entre estados), redondea las coordenadas y guarda el resultado en caché para las siguientes ejecuciones:
+
 # %%
-# Cargar archivo datos geográficos de Brasil
-with open(os.path.join(DATA_PATH, FILE_GEODATA), 'r') as f:
-    geojson = json.load(f)
+from olist_geo import load_geojson
+
+# Cargar archivo datos geográficos de Brasil (simplificado)
+geojson = load_geojson(os.path.join(DATA_PATH, FILE_GEODATA))
 
 
 # %%
@@ -61,19 +65,11 @@ regions = pd.read_csv(
 )
 
 # %%
-# cargamos datos de órdenes procesadas
-columns_dates = [
-    'order_purchase_timestamp',
-    'order_approved_at',
-    'order_delivered_carrier_date',
-    'order_delivered_customer_date',
-    'order_estimated_delivery_date'
-]
+# cargamos datos de órdenes procesadas (con las fechas convertidas; si existe
+# oilst_processed.arrow se abre con mapeo de memoria, compartido entre scripts)
+from olist_io import load_processed
 
-oilst = pd.read_csv(
-    os.path.join(DATA_PATH, FILE_CONSOLIDATED_DATA),
-    parse_dates=columns_dates
-)
+oilst = load_processed(DATA_PATH, period_text=True)
 
 
 # %%
@@ -314,8 +310,17 @@ oilst[
 # %% [markdown]
 # Para aquellas ordenes con retrazos prolongados, las distribuciones tiempos de retrazo por región pueden visualar con diagramas de caja:
 
+# %% [markdown]
+# `px.box` y `px.violin` incrustan en la figura el valor de cada orden. Con el módulo `olist_boxplot.py` calculamos antes, por grupo, los cuartiles, los bigotes y una muestra acotada de valores atípicos (`box_stats`), y la densidad de cada violín en una malla fija de puntos (`violin_stats`); así el tamaño de las figuras no depende del número de órdenes:
+
 # %%
-fig = px.box(delivered.query("delay_status == 'long_delay'"),
+from olist_boxplot import box_stats, violin_stats, plot_box, plot_violin
+
+long_delay = delivered.query("delay_status == 'long_delay'")
+region_box_stats = box_stats(long_delay, ['region'], 'delta_days')
+
+# %%
+fig = plot_box(region_box_stats,
     x="region",
     y="delta_days",
     title="Fig. 5 Distribución de los tiempos de entrega de órdenes con retrazo, por región"
@@ -325,13 +330,11 @@ fig.show()
 
 
 # %%
-fig = px.violin(delivered.query(
-    "delay_status == 'long_delay'"
-),
+fig = plot_violin(
+    violin_stats(long_delay, ['region'], 'delta_days'),
+    region_box_stats,
     x="region",
     y="delta_days",
-    color="region",
-    box=True, points="all",
     title="Fig. 6 Gráfico de violín de los tiempos de entrega de órdenes con retrazo, por región"
 )
 
@@ -343,9 +346,7 @@ fig.show()
 # Para complementarla, se puede segmentar aun más la visualización a nivel estado:
 
 # %%
-fig = px.box(delivered.query(
-    "delay_status == 'long_delay'"
-),
+fig = plot_box(box_stats(long_delay, ['state_name', 'region'], 'delta_days'),
     x="state_name",
     y="delta_days",
     color="region",
@@ -488,8 +489,11 @@ fig.update_layout(
 # Mostrar figura
 #fig.show()
 
-# Guardar la figura interactiva como un archivo HTML
-fig.write_html('3_e_map_long_delays_by_state.html')
+# Guardar la figura interactiva como un archivo HTML (usando un
+# plotly.min.js compartido en lugar de incrustar la librería)
+from olist_report import write_report
+
+write_report(fig, '3_e_map_long_delays_by_state.html')
 
 # Mostrar figura
 fig.show()
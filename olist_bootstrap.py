@@ -0,0 +1,186 @@
+"""
+Intervalos de confianza bootstrap para las proporciones de `delay_status`.
+
+Los análisis del Tema 2 reportan solo valores puntuales, por ejemplo
+`delivered['delay_status'].value_counts(normalize=True)` o la proporción de
+ventas con `long_delay` por trimestre de la tabla `prop_sales`. Este módulo
+estima la incertidumbre de esas proporciones remuestreando las órdenes con
+pesos multinomiales (sin construir dataframes remuestreados) y reparte las
+réplicas entre procesos con semillas independientes.
+
+El remuestreo es estratificado: dentro de cada grupo de `by` (trimestre,
+estado, ...) se sortean tantas órdenes como tiene el grupo, igual que si se
+repitiera la tabla dinámica sobre una muestra nueva.
+
+Ejemplo:
+
+    from olist_bootstrap import bootstrap_shares
+
+    # Proporción de órdenes por tipo de entrega
+    bootstrap_shares(delivered)
+
+    # Proporción de ventas por tipo de entrega en cada trimestre
+    bootstrap_shares(delivered, by='quarter', value='total_sales')
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_REPLICATES = 10_000
+
+# Las réplicas se agrupan en bloques de tamaño fijo, cada uno con su propia
+# semilla derivada; así el resultado no depende del número de procesos.
+REPLICATES_PER_TASK = 250
+
+# Arreglos compartidos por cada proceso de trabajo. Se fijan una sola vez en
+# el inicializador del pool para no volver a serializarlos en cada tarea.
+_SHARED = {}
+
+
+def _init_worker(starts, sizes, cell, values, n_cells):
+    # Solo se envían el inicio y el tamaño de cada estrato; el inicio y el
+    # tamaño del estrato de cada renglón se arman aquí, una vez por proceso
+    _SHARED.update(
+        row_start=np.repeat(starts, sizes),
+        row_size=np.repeat(sizes, sizes),
+        cell=cell,
+        values=values,
+        n_cells=n_cells,
+    )
+
+
+def _replicate_values(seed_seq, n_replicates):
+    """Sumas de `values` por celda para un bloque de réplicas."""
+    rng = np.random.default_rng(seed_seq)
+    row_start = _SHARED['row_start']
+    row_size = _SHARED['row_size']
+    cell = _SHARED['cell']
+    values = _SHARED['values']
+    n_cells = _SHARED['n_cells']
+    n_rows = cell.size
+
+    sums = np.empty((n_replicates, n_cells))
+    for r in range(n_replicates):
+        # Cada renglón sortea un renglón de su mismo estrato; el conteo de
+        # veces que sale cada renglón es un vector de pesos multinomiales.
+        picks = row_start + (rng.random(n_rows) * row_size).astype(np.int64)
+        weights = np.bincount(picks, minlength=n_rows)
+        sums[r] = np.bincount(cell, weights=weights * values, minlength=n_cells)
+    return sums
+
+
+def _run_tasks(task, n_replicates, seed, n_jobs, initargs):
+    blocks = [
+        len(block) for block in np.array_split(
+            np.arange(n_replicates),
+            max(1, -(-n_replicates // REPLICATES_PER_TASK))
+            )
+        ]
+    seeds = np.random.SeedSequence(seed).spawn(len(blocks))
+
+    if n_jobs is None:
+        n_jobs = os.cpu_count() or 1
+    n_jobs = min(n_jobs, len(blocks))
+
+    if n_jobs == 1:
+        _init_worker(*initargs)
+        return np.concatenate([task(s, n) for s, n in zip(seeds, blocks)])
+
+    with ProcessPoolExecutor(
+        max_workers=n_jobs,
+        initializer=_init_worker,
+        initargs=initargs
+        ) as pool:
+        return np.concatenate(list(pool.map(task, seeds, blocks)))
+
+
+def bootstrap_shares(
+    frame,
+    by=None,
+    category='delay_status',
+    value=None,
+    n_replicates=DEFAULT_REPLICATES,
+    alpha=0.05,
+    seed=0,
+    n_jobs=None,
+    ):
+    """
+    Proporciones de `category` (por grupo de `by`) con intervalos bootstrap.
+
+    Si `value` es None se estima la proporción de órdenes; si no, la
+    proporción de la suma de `value` (por ejemplo `total_sales`).
+    Regresa un dataframe indexado por (`by`, `category`) con las columnas
+    `share`, `lower` y `upper` (intervalo percentil de nivel 1 - alpha).
+    """
+    columns = [category] + ([by] if by is not None else [])
+    if value is not None:
+        columns.append(value)
+    data = frame[columns].dropna(subset=[category] + ([by] if by else []))
+
+    if by is None:
+        strata = np.zeros(len(data), dtype=np.int64)
+        strata_labels = pd.Index(['all'], name='all')
+    else:
+        strata, strata_labels = pd.factorize(data[by], sort=True)
+        strata_labels = pd.Index(strata_labels, name=by)
+    categories, category_labels = pd.factorize(data[category], sort=True)
+    n_strata = len(strata_labels)
+    n_categories = len(category_labels)
+    n_cells = n_strata * n_categories
+
+    # Se ordenan los renglones por estrato para que cada uno ocupe un bloque
+    # contiguo [inicio, inicio + tamaño)
+    order = np.argsort(strata, kind='stable')
+    strata = strata[order]
+    cell = strata * n_categories + categories[order]
+    sizes = np.bincount(strata, minlength=n_strata)
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+
+    if value is None:
+        observed = np.bincount(cell, minlength=n_cells).astype(float)
+        # Sin columna de valores basta con remuestrear los conteos por
+        # categoría: la suma de pesos multinomiales de los renglones de cada
+        # categoría es a su vez multinomial, así que no hace falta iterar
+        # sobre los renglones.
+        counts = observed.reshape(n_strata, n_categories)
+        probs = counts / np.maximum(sizes, 1)[:, None]
+        rng = np.random.default_rng(seed)
+        replicates = rng.multinomial(
+            sizes, probs, size=(n_replicates, n_strata)
+            ).astype(float)
+    else:
+        values = data[value].to_numpy(dtype=float, na_value=0.0)[order]
+        observed = np.bincount(cell, weights=values, minlength=n_cells)
+        initargs = (
+            starts,
+            sizes,
+            cell,
+            values,
+            n_cells,
+            )
+        replicates = _run_tasks(
+            _replicate_values, n_replicates, seed, n_jobs, initargs
+            ).reshape(n_replicates, n_strata, n_categories)
+
+    observed = observed.reshape(n_strata, n_categories)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        share = observed / observed.sum(axis=1, keepdims=True)
+        shares = replicates / replicates.sum(axis=2, keepdims=True)
+    lower, upper = np.nanquantile(shares, [alpha / 2, 1 - alpha / 2], axis=0)
+
+    index = pd.MultiIndex.from_product(
+        [strata_labels, pd.Index(category_labels, name=category)]
+        )
+    result = pd.DataFrame(
+        {
+            'share': share.ravel(),
+            'lower': lower.ravel(),
+            'upper': upper.ravel(),
+        },
+        index=index
+        )
+    if by is None:
+        result = result.droplevel(0)
+    return result
@@ -0,0 +1,341 @@
+"""
+Diagramas de caja y de violín dibujados a partir de agregados.
+
+`sns.boxplot`, `px.box` y `px.violin` reciben todas las órdenes: Seaborn
+calcula los cuartiles cada vez que dibuja y Plotly incrusta cada valor en el
+HTML (con `points="all"` además dibuja cada punto). Aquí primero se calculan
+por grupo:
+
+* `box_stats`: cuartiles, media, bigotes (1.5 IQR, como `boxplot`) y una
+  muestra acotada de valores atípicos (`max_outliers` por grupo más los dos
+  extremos),
+* `violin_stats`: la densidad KDE gaussiana evaluada en una malla fija de
+  `grid_points` puntos, a partir de un histograma de la misma malla (KDE
+  binned), con ancho de banda de Scott como Seaborn y Plotly,
+
+y después se dibuja solo con esos agregados, de modo que el tamaño de las
+figuras de Plotly ya no depende del número de órdenes:
+
+* `plot_box` / `plot_violin` regresan figuras de Plotly (`go.Box` con
+  cuartiles precalculados y violines como áreas rellenas),
+* `draw_boxplot` dibuja en un eje de matplotlib con `Axes.bxp`.
+
+Ejemplo:
+
+    from olist_boxplot import box_stats, draw_boxplot, plot_box
+
+    stats = box_stats(delivered, ['geolocation_state', 'delay_status'], 'delta_days')
+    draw_boxplot(ax, stats, x='geolocation_state', hue='delay_status')
+
+    fig = plot_box(box_stats(long_delay, ['region'], 'delta_days'), x='region')
+"""
+import numpy as np
+import pandas as pd
+
+MAX_OUTLIERS = 200
+GRID_POINTS = 128
+
+# Colores por defecto de Plotly Express
+PLOTLY_COLORS = [
+    '#636efa', '#EF553B', '#00cc96', '#ab63fa', '#FFA15A',
+    '#19d3f3', '#FF6692', '#B6E880', '#FF97FF', '#FECB52',
+    ]
+
+
+def box_stats(frame, by, value, whis=1.5, max_outliers=MAX_OUTLIERS, seed=0):
+    """
+    Cuartiles, media, bigotes y muestra de atípicos de `value` por grupo de `by`.
+
+    La columna `fliers` contiene, para cada grupo, un arreglo ordenado con
+    hasta `max_outliers` atípicos elegidos al azar más el mínimo y el máximo.
+    """
+    data = frame[by + [value]].dropna().reset_index(drop=True)
+    grouped = data.groupby(by, observed=True)[value]
+    stats = grouped.quantile([0.25, 0.5, 0.75]).unstack()
+    stats.columns = ['q1', 'med', 'q3']
+    stats['mean'] = grouped.mean()
+    stats['n'] = grouped.size()
+    iqr = stats['q3'] - stats['q1']
+
+    bounds = data[by].merge(
+        pd.DataFrame({
+            'low': stats['q1'] - whis * iqr,
+            'high': stats['q3'] + whis * iqr,
+        }).reset_index(),
+        on=by, how='left'
+        )
+    values = data[value].to_numpy()
+    inside = (values >= bounds['low'].to_numpy()) & (values <= bounds['high'].to_numpy())
+    whiskers = data[inside].groupby(by, observed=True)[value].agg(['min', 'max'])
+    stats['whislo'] = whiskers['min']
+    stats['whishi'] = whiskers['max']
+
+    fliers = pd.Series(
+        [np.empty(0)] * len(stats), index=stats.index, dtype=object)
+    outliers = data[~inside]
+    if max_outliers and len(outliers):
+        rng = np.random.default_rng(seed)
+        shuffled = outliers.iloc[rng.permutation(len(outliers))]
+        rank = shuffled.groupby(by, observed=True).cumcount().to_numpy()
+        extremes = outliers.groupby(by, observed=True)[value].agg(['idxmin', 'idxmax'])
+        keep = (rank < max_outliers) | shuffled.index.isin(extremes.to_numpy().ravel())
+        sample = shuffled[keep].groupby(by, observed=True)[value].apply(
+            lambda s: np.sort(s.to_numpy()))
+        fliers.loc[sample.index] = sample
+    stats['fliers'] = fliers
+    return stats
+
+
+def _binned_kde(values, grid_points, cut):
+    """Densidad KDE gaussiana en una malla, a partir del histograma en la malla."""
+    n = len(values)
+    std = values.std(ddof=1) if n > 1 else 0.0
+    bandwidth = std * n ** (-1 / 5) if std > 0 else 1.0
+    low = values.min() - cut * bandwidth
+    high = values.max() + cut * bandwidth
+    grid = np.linspace(low, high, grid_points)
+    step = grid[1] - grid[0]
+
+    # Histograma con un bin centrado en cada punto de la malla
+    counts = np.bincount(
+        np.clip(np.rint((values - low) / step).astype(np.int64), 0, grid_points - 1),
+        minlength=grid_points
+        ).astype(np.float64)
+
+    # Convolución con el núcleo gaussiano muestreado en la misma malla; el
+    # núcleo no puede ser más largo que la malla o `mode='same'` regresaría
+    # más puntos que `grid`
+    radius = min(int(np.ceil(4 * bandwidth / step)), (grid_points - 1) // 2)
+    offsets = np.arange(-radius, radius + 1) * step
+    kernel = np.exp(-0.5 * (offsets / bandwidth) ** 2)
+    density = np.convolve(counts, kernel, mode='same')
+    density /= density.sum() * step
+    return grid, density
+
+
+def violin_stats(frame, by, value, grid_points=GRID_POINTS, cut=2):
+    """
+    Densidad de `value` por grupo de `by` evaluada en `grid_points` puntos.
+
+    Regresa un dataframe con las columnas `grid` y `density` (arreglos).
+    """
+    data = frame[by + [value]].dropna()
+    rows = {}
+    for key, values in data.groupby(by, observed=True)[value]:
+        values = values.to_numpy(dtype=np.float64)
+        rows[key] = _binned_kde(values, grid_points, cut)
+    index = pd.MultiIndex.from_tuples(list(rows), names=by)
+    if len(by) == 1:
+        index = index.get_level_values(0)
+    return pd.DataFrame(
+        {'grid': [grid for grid, _ in rows.values()],
+         'density': [density for _, density in rows.values()]},
+        index=index
+        )
+
+
+def _levels(stats, name, order):
+    levels = stats.index.get_level_values(name).unique()
+    if order is None:
+        return list(levels)
+    return [level for level in order if level in levels]
+
+
+def _group(stats, x, hue, level, hue_level):
+    """Filas de `stats` de un grupo (`x` = level, `hue` = hue_level)."""
+    if hue is None:
+        return stats.loc[level] if level in stats.index else None
+    key = (level, hue_level) if stats.index.names[0] == x else (hue_level, level)
+    return stats.loc[key] if key in stats.index else None
+
+
+def plot_box(stats, x, color=None, order=None, color_order=None, title=None,
+             labels=None, y=None, showfliers=True):
+    """Figura de Plotly con un `go.Box` precalculado por cada nivel de `color`."""
+    import plotly.graph_objects as go
+
+    labels = labels or {}
+    categories = _levels(stats, x, order)
+    groups = _levels(stats, color, color_order) if color else [None]
+
+    fig = go.Figure()
+    for i, group in enumerate(groups):
+        rows = [
+            (category, _group(stats, x, color, category, group))
+            for category in categories
+            ]
+        rows = [(category, row) for category, row in rows if row is not None]
+        if not rows:
+            continue
+        name = str(group) if color else (labels.get(y, y) or '')
+        line = PLOTLY_COLORS[i % len(PLOTLY_COLORS)]
+        fig.add_trace(go.Box(
+            x=[category for category, _ in rows],
+            q1=[row['q1'] for _, row in rows],
+            median=[row['med'] for _, row in rows],
+            q3=[row['q3'] for _, row in rows],
+            lowerfence=[row['whislo'] for _, row in rows],
+            upperfence=[row['whishi'] for _, row in rows],
+            mean=[row['mean'] for _, row in rows],
+            name=name,
+            legendgroup=name,
+            offsetgroup=name,
+            marker_color=line,
+            boxpoints=False,
+            showlegend=bool(color),
+            ))
+        if showfliers:
+            fliers_x = [category for category, row in rows for _ in row['fliers']]
+            fliers_y = np.concatenate([row['fliers'] for _, row in rows])
+            fig.add_trace(go.Scatter(
+                x=fliers_x,
+                y=fliers_y,
+                mode='markers',
+                name=name,
+                legendgroup=name,
+                offsetgroup=name,
+                marker=dict(color=line, size=4, opacity=0.6),
+                showlegend=False,
+                hoverinfo='x+y',
+                ))
+
+    fig.update_layout(
+        title=title,
+        xaxis_title=labels.get(x, x),
+        yaxis_title=labels.get(y, y),
+        legend_title=labels.get(color, color) if color else None,
+        boxmode='group' if color else 'overlay',
+        scattermode='group' if color else 'overlay',
+        )
+    return fig
+
+
+def plot_violin(violins, stats, x, order=None, title=None, labels=None, y=None,
+                width=0.8, showfliers=True):
+    """
+    Figura de Plotly con un violín (área rellena) por nivel de `x`, con su
+    diagrama de caja precalculado dentro y la muestra de atípicos.
+    """
+    import plotly.graph_objects as go
+
+    labels = labels or {}
+    categories = _levels(violins, x, order)
+
+    fig = go.Figure()
+    for i, category in enumerate(categories):
+        grid = violins.loc[category, 'grid']
+        density = violins.loc[category, 'density']
+        # Todos los violines con el mismo ancho máximo (scalemode='width')
+        half = density / density.max() * width / 2
+        color = PLOTLY_COLORS[i % len(PLOTLY_COLORS)]
+        name = str(category)
+        # float32 basta para dibujar y reduce a la mitad los arreglos tipados
+        fig.add_trace(go.Scatter(
+            x=np.concatenate([i + half, (i - half)[::-1]]).astype(np.float32),
+            y=np.concatenate([grid, grid[::-1]]).astype(np.float32),
+            fill='toself',
+            mode='lines',
+            line=dict(color=color, width=1),
+            name=name,
+            legendgroup=name,
+            hoverinfo='skip',
+            ))
+        row = stats.loc[category]
+        fig.add_trace(go.Box(
+            x=[i],
+            q1=[row['q1']],
+            median=[row['med']],
+            q3=[row['q3']],
+            lowerfence=[row['whislo']],
+            upperfence=[row['whishi']],
+            name=name,
+            legendgroup=name,
+            marker_color=color,
+            fillcolor='white',
+            width=width / 8,
+            boxpoints=False,
+            showlegend=False,
+            ))
+        if showfliers and len(row['fliers']):
+            fig.add_trace(go.Scatter(
+                x=np.full(len(row['fliers']), i),
+                y=row['fliers'],
+                mode='markers',
+                name=name,
+                legendgroup=name,
+                marker=dict(color=color, size=4, opacity=0.6),
+                showlegend=False,
+                ))
+
+    fig.update_layout(
+        title=title,
+        xaxis=dict(
+            title=labels.get(x, x),
+            tickmode='array',
+            tickvals=list(range(len(categories))),
+            ticktext=[str(category) for category in categories],
+            ),
+        yaxis_title=labels.get(y, y),
+        legend_title=labels.get(x, x),
+        )
+    return fig
+
+
+def draw_boxplot(ax, stats, x, hue=None, order=None, hue_order=None,
+                 palette='Set2', showfliers=False, width=0.8):
+    """Diagramas de caja en `ax` (como `sns.boxplot`) a partir de `box_stats`."""
+    import matplotlib.pyplot as plt
+
+    categories = _levels(stats, x, order)
+    groups = _levels(stats, hue, hue_order) if hue else [None]
+    colors = plt.get_cmap(palette).colors
+    box_width = width / len(groups)
+
+    for j, group in enumerate(groups):
+        boxes, positions = [], []
+        for i, category in enumerate(categories):
+            row = _group(stats, x, hue, category, group)
+            if row is None:
+                continue
+            boxes.append({
+                'q1': row['q1'], 'med': row['med'], 'q3': row['q3'],
+                'whislo': row['whislo'], 'whishi': row['whishi'],
+                'fliers': row['fliers'] if showfliers else [],
+            })
+            positions.append(i + (j - (len(groups) - 1) / 2) * box_width)
+        if not boxes:
+            continue
+        artists = ax.bxp(
+            boxes, positions=positions, widths=box_width * 0.9,
+            showfliers=showfliers, patch_artist=True,
+            medianprops={'color': 'black'}
+            )
+        color = colors[(j if hue else 0) % len(colors)]
+        for box in artists['boxes']:
+            box.set_facecolor(color)
+        if hue:
+            artists['boxes'][0].set_label(group)
+
+    ax.set_xticks(range(len(categories)))
+    ax.set_xticklabels(categories)
+    ax.set_xlabel(x)
+    if hue:
+        ax.legend(title=hue)
+    return ax
+
+
+if __name__ == '__main__':
+    # Pocas órdenes o un grupo constante: la densidad tiene un valor por
+    # punto de la malla e integra 1
+    frame = pd.DataFrame({
+        'group': ['one'] + ['two'] * 2 + ['five'] * 5 + ['constant'] * 50,
+        'value': [3.0, 1.0, 4.0, 1.0, 5.0, 9.0, 2.0, 6.0] + [7.0] * 50,
+        })
+    for grid_points in (GRID_POINTS, 2, 3, 5):
+        violins = violin_stats(frame, ['group'], 'value', grid_points=grid_points)
+        for group, row in violins.iterrows():
+            assert len(row['grid']) == len(row['density']) == grid_points, group
+            assert np.isfinite(row['density']).all(), group
+            step = row['grid'][1] - row['grid'][0]
+            assert np.isclose(row['density'].sum() * step, 1), group
+    print('violin_stats: densidades con', GRID_POINTS, 'puntos por grupo')
@@ -0,0 +1,117 @@
+"""
+Clasificación de `delta_days` en niveles de retraso (`delay_status`).
+
+La versión original usa dos `np.where` anidados con los umbrales 0 y 3 días
+fijos en el código, lo que crea dos arreglos de texto intermedios. Aquí los
+umbrales son un vector configurable y cada valor se ubica con
+`np.searchsorted`: el código del nivel es el número de umbrales menores que
+el valor. Los códigos se escriben por bloques en un solo arreglo de enteros
+pequeños (`int8`) que se usa directamente como los códigos de un
+`pd.Categorical`, sin crear textos.
+
+Con los umbrales por defecto:
+
+* `delta_days <= 0` -> `on_time`
+* `0 < delta_days <= 3` -> `short_delay`
+* `delta_days > 3` -> `long_delay`
+
+Los valores faltantes (órdenes sin fecha de entrega) quedan como NaN en
+lugar de caer en `short_delay`.
+
+Ejemplo:
+
+    from olist_classify import classify_delay, classify_delay_by_group
+
+    orders['delay_status'] = classify_delay(orders['delta_days'])
+
+    # Umbrales distintos por región
+    classify_delay_by_group(
+        oilst['delta_days'], oilst['region'],
+        {'north': (2, 7), 'southeast': (0, 3)}
+        )
+"""
+import numpy as np
+import pandas as pd
+
+DELAY_THRESHOLDS = (0, 3)
+DELAY_STATUS = ('on_time', 'short_delay', 'long_delay')
+
+# Tamaño de los bloques: limita la memoria temporal (los índices de
+# `searchsorted` son de 64 bits) sin importar el número de renglones
+CHUNK_SIZE = 1 << 20
+
+
+def _check_tiers(thresholds, labels):
+    thresholds = np.asarray(thresholds, dtype=np.float64)
+    if thresholds.ndim != 1 or np.any(np.diff(thresholds) <= 0):
+        raise ValueError(
+            f"Los umbrales deben ser crecientes: {thresholds.tolist()}")
+    if len(labels) != len(thresholds) + 1:
+        raise ValueError(
+            f"Se esperaban {len(thresholds) + 1} etiquetas para "
+            f"{len(thresholds)} umbrales, se recibieron {len(labels)}")
+    return thresholds
+
+
+def _code_dtype(n_labels):
+    return np.int8 if n_labels <= np.iinfo(np.int8).max else np.int16
+
+
+def classify_delay(delta_days, thresholds=DELAY_THRESHOLDS, labels=DELAY_STATUS):
+    """
+    Clasifica `delta_days` en los niveles `labels` separados por `thresholds`.
+
+    Regresa un `pd.Categorical` ordenado; un valor igual a un umbral queda en
+    el nivel inferior.
+    """
+    thresholds = _check_tiers(thresholds, labels)
+    values = np.asarray(delta_days, dtype=np.float64)
+    codes = np.empty(len(values), dtype=_code_dtype(len(labels)))
+
+    for start in range(0, len(values), CHUNK_SIZE):
+        chunk = values[start:start + CHUNK_SIZE]
+        block = codes[start:start + CHUNK_SIZE]
+        block[:] = np.searchsorted(thresholds, chunk, side='left')
+        block[np.isnan(chunk)] = -1
+
+    return pd.Categorical.from_codes(
+        codes, categories=list(labels), ordered=True)
+
+
+def classify_delay_by_group(
+    delta_days,
+    groups,
+    thresholds_by_group,
+    default=DELAY_THRESHOLDS,
+    labels=DELAY_STATUS
+    ):
+    """
+    Clasifica `delta_days` con umbrales distintos por grupo (por ejemplo, un
+    SLA por región de `brasil_regions.csv`).
+
+    `thresholds_by_group` asocia cada grupo con sus umbrales; los grupos que
+    no aparecen usan `default`.
+    """
+    names = list(thresholds_by_group)
+    table = np.array(
+        [_check_tiers(thresholds_by_group[name], labels) for name in names]
+        + [_check_tiers(default, labels)]
+        )
+    group_codes = pd.Categorical(groups, categories=names).codes.astype(np.intp)
+    # Los grupos desconocidos (código -1) apuntan al último renglón: `default`
+    group_codes[group_codes < 0] = len(names)
+
+    values = np.asarray(delta_days, dtype=np.float64)
+    codes = np.zeros(len(values), dtype=_code_dtype(len(labels)))
+
+    for start in range(0, len(values), CHUNK_SIZE):
+        chunk = values[start:start + CHUNK_SIZE]
+        block = codes[start:start + CHUNK_SIZE]
+        chunk_thresholds = table[group_codes[start:start + CHUNK_SIZE]]
+        # Número de umbrales menores al valor, igual que searchsorted 'left'
+        for level in range(table.shape[1]):
+            block += chunk > chunk_thresholds[:, level]
+        block[np.isnan(chunk)] = -1
+
+    return pd.Categorical.from_codes(
+        codes, categories=list(labels), ordered=True)
@@ -0,0 +1,251 @@
+"""
+Programa único para las etapas del proyecto, con importaciones bajo demanda.
+
+Cada script exportado de los notebooks importa al inicio matplotlib,
+seaborn, plotly, scipy y openpyxl, aunque la etapa solo calcule tablas; la
+importación en frío de todo eso tarda varios segundos. Aquí cada
+subcomando importa sus módulos dentro de la función que lo ejecuta, y los
+módulos `olist_*` cargan las librerías de gráficas solo al dibujar:
+
+    consolidate    archivos de Olist -> oilst_processed.csv
+    export         oilst_processed.csv comprimido con gzip o zstd
+                   (`olist_export.py`)
+    verify         revisa oilst_processed.csv contra su manifiesto
+                   (`olist_manifest.py`)
+    risk           riesgo de `long_delay` de las órdenes abiertas
+                   (`olist_risk.py`, requiere scikit-learn)
+    stream         `delay_status` provisional y final a partir de eventos
+                   de las órdenes (`olist_stream.py`)
+    tables         tablas .csv del Tema 2 (solo pandas)
+    figures        figuras PNG/HTML (`olist_render.py`)
+    dashboard      tablero local (`olist_dashboard.py`)
+    pipeline       todas las etapas, solo las desactualizadas
+                   (`olist_pipeline.py`)
+    validate       valida los archivos de entrada contra su esquema
+                   (`olist_schema.py`)
+    check-imports  mide con `python -X importtime` lo que importa cada
+                   subcomando y falla si uno de solo cálculo carga una
+                   librería de gráficas o scipy, o si supera `--max-ms`
+
+Uso:
+
+    python olist_cli.py tables [--data-path RUTA] [tabla ...]
+    python olist_cli.py figures [opciones de olist_render.py]
+    python olist_cli.py pipeline [opciones de olist_pipeline.py]
+    python olist_cli.py validate [--data-path RUTA]
+    python olist_cli.py export [opciones de olist_export.py]
+    python olist_cli.py verify [--data-path RUTA] [--full]
+    python olist_cli.py risk [opciones de olist_risk.py]
+    python olist_cli.py stream [opciones de olist_stream.py]
+    python olist_cli.py check-imports [--max-ms 1500]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+
+# Módulo que carga cada subcomando
+COMMAND_MODULES = {
+    'cli': 'olist_cli',
+    'consolidate': 'olist_consolidate',
+    'tables': 'olist_tables',
+    'figures': 'olist_render',
+    'dashboard': 'olist_dashboard',
+    'pipeline': 'olist_pipeline',
+    'validate': 'olist_schema',
+    'export': 'olist_export',
+    'verify': 'olist_manifest',
+    'risk': 'olist_risk',
+    'stream': 'olist_stream',
+}
+
+# Subcomandos que solo calculan y librerías que no deben importar
+COMPUTE_COMMANDS = ('cli', 'consolidate', 'tables', 'pipeline', 'validate', 'export',
+                    'verify', 'risk', 'stream')
+HEAVY_PACKAGES = ('matplotlib', 'seaborn', 'plotly', 'scipy', 'openpyxl', 'sklearn')
+
+# Tiempo máximo de importación por subcomando (milisegundos)
+DEFAULT_MAX_MS = 1500
+
+
+def import_profile(module):
+    """
+    Importa `module` en un proceso nuevo con `-X importtime`.
+
+    Regresa `(cumulative_ms, packages)`: el tiempo acumulado de la
+    importación y el conjunto de paquetes de primer nivel que se cargaron.
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=BASE_PATH, capture_output=True, text=True, check=True)
+    cumulative = 0.0
+    packages = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+        _, total, name = line[len('import time:'):].split('|')
+        packages.add(name.strip().split('.')[0])
+        if name.strip() == module:
+            cumulative = int(total) / 1000
+    return cumulative, packages
+
+
+def check_imports(max_ms=DEFAULT_MAX_MS, commands=None):
+    """Tabla con el tiempo de importación de cada subcomando y sus problemas."""
+    rows = []
+    for command in commands or COMMAND_MODULES:
+        module = COMMAND_MODULES[command]
+        cumulative, packages = import_profile(module)
+        heavy = sorted(packages.intersection(HEAVY_PACKAGES))
+        problems = []
+        if command in COMPUTE_COMMANDS and heavy:
+            problems.append('importa ' + ', '.join(heavy))
+        if cumulative > max_ms:
+            problems.append(f'más de {max_ms} ms')
+        rows.append((command, module, cumulative, ', '.join(heavy), '; '.join(problems)))
+    return rows
+
+
+def _consolidate(args):
+    from olist_consolidate import write_processed
+
+    print(f"Archivo consolidado: {write_processed(args.data_path, args.output_path)}")
+
+
+def _tables(args):
+    from olist_io import load_processed
+    from olist_tables import TABLES, table_columns, write_tables
+
+    unknown = set(args.tables) - set(TABLES)
+    if unknown:
+        raise SystemExit(f"tablas desconocidas: {', '.join(sorted(unknown))}")
+    oilst = load_processed(args.data_path, columns=table_columns(args.tables))
+    for path in write_tables(oilst, args.tables, args.output_path).values():
+        print(path)
+
+
+def _figures(args, extra):
+    from olist_render import main
+
+    main(extra)
+
+
+def _dashboard(args, extra):
+    from olist_dashboard import main
+
+    main(extra)
+
+
+def _pipeline(args, extra):
+    from olist_pipeline import main
+
+    main(extra)
+
+
+def _validate(args, extra):
+    from olist_schema import main
+
+    main(extra)
+
+
+def _export(args, extra):
+    from olist_export import main
+
+    main(extra)
+
+
+def _verify(args, extra):
+    from olist_manifest import main
+
+    main(extra)
+
+
+def _risk(args, extra):
+    from olist_risk import main
+
+    main(extra)
+
+
+def _stream(args, extra):
+    from olist_stream import main
+
+    main(extra)
+
+
+def _check_imports(args):
+    rows = check_imports(args.max_ms)
+    width = max(len(command) for command, *_ in rows)
+    for command, module, cumulative, heavy, problems in rows:
+        print(f"{command:<{width}}  {cumulative:8.1f} ms  {module:<18} {heavy or '-'}"
+              + (f"  <- {problems}" if problems else ''))
+    if any(problems for *_, problems in rows):
+        raise SystemExit(1)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    consolidate = commands.add_parser(
+        'consolidate', help='genera oilst_processed.csv')
+    consolidate.add_argument('--data-path', default=None,
+                             help='carpeta con los archivos de Olist')
+    consolidate.add_argument('--output-path', default='.')
+
+    tables = commands.add_parser('tables', help='tablas .csv del Tema 2')
+    tables.add_argument('tables', nargs='*', help='tablas a generar (todas por defecto)')
+    tables.add_argument('--data-path', default=None,
+                        help='carpeta con oilst_processed.csv')
+    tables.add_argument('--output-path', default='.')
+
+    commands.add_parser('figures', add_help=False,
+                        help='figuras PNG/HTML (opciones de olist_render.py)')
+    commands.add_parser('dashboard', add_help=False,
+                        help='tablero local (opciones de olist_dashboard.py)')
+    commands.add_parser('pipeline', add_help=False,
+                        help='etapas desactualizadas (opciones de olist_pipeline.py)')
+    commands.add_parser('validate', add_help=False,
+                        help='valida los archivos de entrada (opciones de olist_schema.py)')
+    commands.add_parser('export', add_help=False,
+                        help='exporta el CSV consolidado (opciones de olist_export.py)')
+    commands.add_parser('verify', add_help=False,
+                        help='revisa el CSV consolidado contra su manifiesto')
+    commands.add_parser('risk', add_help=False,
+                        help='riesgo de long_delay (opciones de olist_risk.py)')
+    commands.add_parser('stream', add_help=False,
+                        help='delay_status de órdenes en camino (opciones de olist_stream.py)')
+
+    check = commands.add_parser(
+        'check-imports', help='mide el tiempo de importación de cada subcomando')
+    check.add_argument('--max-ms', type=float, default=DEFAULT_MAX_MS)
+
+    args, extra = parser.parse_known_args(argv)
+    start = time.perf_counter()
+    delegated = {
+        'figures': _figures,
+        'dashboard': _dashboard,
+        'pipeline': _pipeline,
+        'validate': _validate,
+        'export': _export,
+        'verify': _verify,
+        'risk': _risk,
+        'stream': _stream,
+    }
+    if args.command in delegated:
+        delegated[args.command](args, extra)
+    else:
+        if extra:
+            parser.error(f"argumentos desconocidos: {' '.join(extra)}")
+        {
+            'consolidate': _consolidate,
+            'tables': _tables,
+            'check-imports': _check_imports,
+        }[args.command](args)
+    print(f"Tiempo total: {time.perf_counter() - start:.2f} s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+"""
+Compactación de tipos de la tabla consolidada guiada por un esquema.
+
+`results` (y `oilst_processed.csv` al leerlo) guarda enteros y reales en 64
+bits, los periodos como objetos `Period` o texto y los estados, ciudades y
+estatus como texto repetido en cada fila. `compact` recorre el esquema
+`SCHEMA` (columna -> regla) y, para cada columna:
+
+* `int`: el entero más pequeño que contiene el rango de la columna
+  (`int8` ... `int64`, o `uint*` si no hay negativos; nullable si hay NaN);
+  si la columna es texto, solo cuando los enteros se vuelven a escribir
+  igual (sin ceros a la izquierda),
+* `float`: `float32` si el error máximo no supera la tolerancia de la regla,
+* `money`: `float32` si el error no supera medio centavo y, si no, centavos
+  en `Int64`,
+* `period`: meses desde enero de 1970 en `int16` (para trimestres, el mes
+  en que empieza el trimestre),
+* `category`: categórica si hay pocas categorías respecto al número de filas
+  (así se guardan los códigos postales, que son texto: '01001' no es 1001).
+
+Cada conversión se valida (rango, enteros exactos, error máximo contra la
+tolerancia, periodos que se vuelven a formatear igual); si no pasa, la
+columna se deja como estaba y el reporte indica por qué. El reporte también
+indica la memoria antes y después de cada columna.
+
+Ejemplo:
+
+    from olist_compact import compact
+
+    compacted, report = compact(results)
+    report[['dtype_after', 'saved_bytes', 'status']]
+"""
+import numpy as np
+import pandas as pd
+
+from olist_periods import as_month_index, format_months
+
+# Tolerancias (error absoluto máximo): coordenadas ~1 m, días ~1 s
+SCHEMA = {
+    'total_products': ('int', None),
+    'year': ('int', None),
+    'month': ('int', None),
+    'customer_zip_code_prefix': ('category', None),
+    'geolocation_zip_code_prefix': ('category', None),
+    'total_sales': ('money', 0.005),
+    'distance_distribution_center': ('float', 0.005),
+    'geolocation_lat': ('float', 1e-5),
+    'geolocation_lng': ('float', 1e-5),
+    'delta_days': ('float', 1e-5),
+    'quarter': ('period', 'Q'),
+    'year_month': ('period', 'M'),
+    'order_status': ('category', None),
+    'delay_status': ('category', None),
+    'customer_city': ('category', None),
+    'customer_state': ('category', None),
+    'geolocation_city': ('category', None),
+    'geolocation_state': ('category', None),
+    'abbreviation': ('category', None),
+    'state_name': ('category', None),
+}
+
+# Máxima proporción de valores distintos para convertir a categórica
+MAX_CATEGORY_RATIO = 0.5
+
+_INTEGER_TYPES = [
+    np.uint8, np.int8, np.uint16, np.int16, np.uint32, np.int32, np.int64]
+
+
+class CompactionError(ValueError):
+    """La conversión de una columna no respeta su rango o tolerancia."""
+
+
+def _integer_dtype(low, high, nullable):
+    for candidate in _INTEGER_TYPES:
+        info = np.iinfo(candidate)
+        if info.min <= low and high <= info.max:
+            name = np.dtype(candidate).name
+            # Tipos enteros de pandas que admiten nulos: UInt8, Int16, ...
+            return pd.api.types.pandas_dtype(
+                name.replace('uint', 'UInt').replace('int', 'Int')) \
+                if nullable else np.dtype(candidate)
+    raise CompactionError(f'rango [{low}, {high}] fuera de int64')
+
+
+def _compact_int(values, tolerance):
+    numbers = pd.to_numeric(values, errors='raise').to_numpy(dtype=np.float64)
+    finite = numbers[~np.isnan(numbers)]
+    if len(finite) and not np.array_equal(finite, np.round(finite)):
+        raise CompactionError('valores no enteros')
+    if not pd.api.types.is_numeric_dtype(values.dtype):
+        # Texto: se compara el entero escrito de nuevo, no solo su rango
+        text = values.dropna().astype(str).to_numpy(dtype=object)
+        if not np.array_equal(finite.astype(np.int64).astype(str).astype(object), text):
+            raise CompactionError('el texto no se vuelve a escribir igual como entero')
+        values = pd.Series(numbers, index=values.index, name=values.name)
+    low, high = (finite.min(), finite.max()) if len(finite) else (0, 0)
+    dtype = _integer_dtype(low, high, nullable=len(finite) < len(numbers))
+    return values.astype(dtype), 0.0
+
+
+def _max_error(original, converted):
+    original = np.asarray(original, dtype=np.float64)
+    converted = np.asarray(converted, dtype=np.float64)
+    if np.any(np.isnan(original) != np.isnan(converted)):
+        raise CompactionError('cambian los valores nulos')
+    errors = np.abs(original - converted)
+    return float(np.nanmax(errors)) if np.isfinite(errors).any() else 0.0
+
+
+def _compact_float(values, tolerance):
+    converted = values.astype(np.float32)
+    error = _max_error(values, converted)
+    if error > tolerance:
+        raise CompactionError(f'error {error:.3g} > {tolerance:.3g} con float32')
+    return converted, error
+
+
+def _compact_money(values, tolerance):
+    try:
+        return _compact_float(values, tolerance)
+    except CompactionError:
+        pass
+    # Centavos exactos en enteros de 64 bits
+    numbers = values.to_numpy(dtype=np.float64)
+    cents = np.round(numbers * 100)
+    error = _max_error(numbers, cents / 100)
+    if error > 1e-6:
+        raise CompactionError(f'no son centavos exactos (error {error:.3g})')
+    converted = pd.array(
+        np.where(np.isnan(cents), 0, cents).astype(np.int64), dtype='Int64')
+    converted[np.isnan(cents)] = pd.NA
+    return pd.Series(converted, index=values.index, name=values.name), error
+
+
+def _compact_period(values, freq):
+    if pd.api.types.is_integer_dtype(values.dtype):
+        # Ya son meses desde 1970 (olist_periods): solo se reduce a int16
+        low, high = values.min(), values.max()
+        info = np.iinfo(np.int16)
+        if pd.notna(low) and (low < info.min or high > info.max):
+            raise CompactionError(f'rango [{low}, {high}] fuera de int16')
+        return values.astype('Int16' if values.hasnans else np.int16), 0.0
+    months = as_month_index(values, freq)
+    text = values.astype(str) \
+        if isinstance(values.dtype, pd.PeriodDtype) else values
+    valid = values.notna()
+    if not (format_months(months, freq)[valid] == text[valid]).all():
+        raise CompactionError('los periodos no se vuelven a formatear igual')
+    return months, 0.0
+
+
+def _compact_category(values, tolerance):
+    distinct = values.nunique(dropna=True)
+    if len(values) and distinct / len(values) > MAX_CATEGORY_RATIO:
+        raise CompactionError(f'{distinct} valores distintos')
+    return values.astype('category'), 0.0
+
+
+_RULES = {
+    'int': _compact_int,
+    'float': _compact_float,
+    'money': _compact_money,
+    'period': _compact_period,
+    'category': _compact_category,
+}
+
+
+def compact(frame, schema=None, max_bytes=None):
+    """
+    Copia de `frame` con los tipos compactos de `schema` (por defecto
+    `SCHEMA`) y un reporte por columna.
+
+    Las columnas que no están en el esquema se copian sin cambios. Si se
+    indica `max_bytes` y la tabla compacta lo excede, se lanza
+    `CompactionError`.
+    """
+    schema = SCHEMA if schema is None else schema
+    compacted = {}
+    rows = []
+    for column in frame.columns:
+        values = frame[column]
+        before = values.memory_usage(index=False, deep=True)
+        rule, parameter = schema.get(column, (None, None))
+        status, error = 'sin regla', None
+        if rule is not None:
+            try:
+                values, error = _RULES[rule](values, parameter)
+                status = 'compactada'
+            except (CompactionError, ValueError, TypeError) as problem:
+                status = f'sin cambios: {problem}'
+        compacted[column] = values
+        after = values.memory_usage(index=False, deep=True)
+        rows.append({
+            'column': column,
+            'rule': rule,
+            'dtype_before': str(frame[column].dtype),
+            'dtype_after': str(values.dtype),
+            'bytes_before': before,
+            'bytes_after': after,
+            'saved_bytes': before - after,
+            'max_error': error,
+            'status': status,
+        })
+
+    result = pd.DataFrame(compacted, index=frame.index)
+    report = pd.DataFrame(rows).set_index('column')
+    total = report['bytes_after'].sum()
+    if max_bytes is not None and total > max_bytes:
+        raise CompactionError(
+            f'la tabla compacta ocupa {total:,} bytes (límite {max_bytes:,})')
+    return result, report
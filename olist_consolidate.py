@@ -0,0 +1,182 @@
+"""
+Consolidación de los archivos de Olist en `oilst_processed.csv`.
+
+Reúne en funciones los pasos del notebook `1_1_olist_processed.py` (lectura,
+conversión de fechas, `delta_days`, `delay_status` y las uniones entre
+tablas) para ejecutarlos sin las celdas de exploración. `quarter` y
+`year_month` quedan como enteros de `olist_periods.py`; al escribir el CSV
+(con `olist_export.py`) se vuelven a formatear como texto ('2017Q2',
+'2017-05'). Solo depende de
+pandas y numpy: `openpyxl` lo carga pandas al leer el archivo de clientes.
+
+Cada paso es una etapa de `olist_profile.py`: con `OLIST_PROFILE=carpeta`
+se registran sus tiempos, filas y memoria sin modificar el código.
+
+Ejemplo:
+
+    from olist_consolidate import read_sources, consolidate
+
+    results = consolidate(**read_sources(DATA_PATH))
+    export_csv(format_period_columns(results), 'oilst_processed.csv')
+"""
+import os
+
+import pandas as pd
+
+from olist_classify import classify_delay
+from olist_export import export_csv
+from olist_hll import COLUMNS as HLL_COLUMNS, FILE_DISTINCT_CUSTOMERS, DistinctCounter
+from olist_io import (
+    COLUMNS_DATES, DATA_PATH, FILE_CONSOLIDATED_DATA, load_processed, write_arrow)
+from olist_joins import checked_merge
+from olist_manifest import write_manifest
+from olist_periods import format_period_columns, month_index, quarter_index
+from olist_profile import stage
+from olist_schema import SchemaError, check_keys, report_frame, validate_frame
+
+FILE_CUSTOMERS = 'olist_customers_dataset.xlsx'
+FILE_GEOLOCATIONS = 'olist_geolocation_dataset.csv'
+FILE_ITEMS = 'olist_order_items_dataset.csv'
+FILE_ORDERS = 'olist_orders_dataset.csv'
+FILE_STATES_ABBREVIATIONS = 'states_abbreviations.json'
+
+SOURCES = {
+    'customers': FILE_CUSTOMERS,
+    'geolocations': FILE_GEOLOCATIONS,
+    'items': FILE_ITEMS,
+    'orders': FILE_ORDERS,
+    'states_abbreviations': FILE_STATES_ABBREVIATIONS,
+}
+
+
+def source_paths(data_path=None):
+    """Rutas de los archivos de Olist que lee `read_sources`."""
+    return [
+        os.path.join(data_path or DATA_PATH, filename) for filename in SOURCES.values()]
+
+
+def read_sources(data_path=None, validate=True):
+    """
+    Lee los archivos de Olist; regresa un diccionario nombre -> dataframe.
+
+    Con `validate`, cada archivo se valida contra `olist_schema.SCHEMAS` al
+    leerlo (las fechas quedan convertidas) y, si algo no cumple el esquema,
+    se lanza `SchemaError` con el reporte de todas las violaciones.
+    """
+    data_path = data_path or DATA_PATH
+
+    readers = {
+        'customers': lambda path: pd.read_excel(
+            path, dtype={'customer_zip_code_prefix': 'str'}),
+        'geolocations': lambda path: pd.read_csv(
+            path, dtype={'geolocation_zip_code_prefix': 'str'}),
+        'items': pd.read_csv,
+        'orders': pd.read_csv,
+        'states_abbreviations': pd.read_json,
+    }
+    sources = {}
+    violations = []
+    for name, read in readers.items():
+        with stage(f'read_{name}') as record:
+            sources[name] = record.output(
+                read(os.path.join(data_path, SOURCES[name])))
+        if validate:
+            with stage(f'validate_{name}', sources[name]):
+                sources[name], found = validate_frame(name, sources[name])
+                violations.extend(found)
+    if validate:
+        with stage('check_keys'):
+            violations.extend(check_keys(sources))
+        if violations:
+            raise SchemaError(report_frame(violations))
+    return sources
+
+
+def prepare_orders(orders):
+    """Fechas, periodos de compra, `delta_days` y `delay_status` de las órdenes."""
+    orders = orders.copy()
+    with stage('to_datetime', orders):
+        for column in COLUMNS_DATES:
+            orders[column] = pd.to_datetime(orders[column], errors='coerce')
+
+    with stage('periods', orders):
+        purchase = orders['order_purchase_timestamp'].dt
+        orders['year'] = purchase.year
+        orders['month'] = purchase.month
+        # Meses desde 1970 en int16 (olist_periods), no objetos Period
+        orders['quarter'] = quarter_index(orders['order_purchase_timestamp'])
+        orders['year_month'] = month_index(orders['order_purchase_timestamp'])
+
+    with stage('delay_status', orders):
+        orders['delta_days'] = (
+            orders['order_delivered_customer_date'] -
+            orders['order_estimated_delivery_date']
+            ).dt.total_seconds() / 60 / 60 / 24
+        orders['delay_status'] = classify_delay(orders['delta_days'])
+    return orders
+
+
+def consolidate(customers, geolocations, items, orders, states_abbreviations):
+    """Tabla consolidada: órdenes + totales + clientes + geolocalización + estado."""
+    with stage('items_agg', items) as record:
+        items_agg = record.output(items.groupby(['order_id']).agg(
+            {'order_item_id': 'count', 'price': 'sum'}
+            ).reset_index().rename(
+                columns={'order_item_id': 'total_products', 'price': 'total_sales'}))
+
+    with stage('drop_duplicates', geolocations) as record:
+        unique_geolocations = record.output(geolocations.drop_duplicates(
+            subset=['geolocation_zip_code_prefix']))
+        unique_states = states_abbreviations.drop_duplicates(subset=['state_name'])
+
+    # Cada unión declara su relación (olist_joins): una llave repetida del
+    # lado "1" detiene la consolidación antes de multiplicar las filas
+    with stage('merge_customers', customers) as record:
+        customers_geolocation = checked_merge(
+            customers, unique_geolocations, 'm:1',
+            left_on='customer_zip_code_prefix',
+            right_on='geolocation_zip_code_prefix',
+            how='left'
+            )
+        customers_geolocation_estado = record.output(checked_merge(
+            customers_geolocation, unique_states, 'm:1',
+            left_on='geolocation_state',
+            right_on='abbreviation',
+            how='left'
+            ))
+
+    with stage('prepare_orders', orders) as record:
+        orders = record.output(prepare_orders(orders))
+    with stage('merge_orders', orders) as record:
+        orders_totals = checked_merge(
+            orders, items_agg, '1:1', on='order_id', how='left')
+        return record.output(checked_merge(
+            orders_totals, customers_geolocation_estado, 'm:1',
+            on=['customer_id'], how='left'))
+
+
+def write_processed(data_path=None, output_path='.'):
+    """
+    Lee, consolida y escribe `oilst_processed.csv`, su manifiesto
+    (`olist_manifest.py`), su copia Arrow, `oilst_processed.arrow`, y los
+    sketches de clientes distintos (`olist_hll.py`); regresa la ruta del CSV.
+    """
+    with stage('read_sources'):
+        sources = read_sources(data_path)
+    with stage('consolidate'):
+        results = consolidate(**sources)
+    path = os.path.join(output_path, FILE_CONSOLIDATED_DATA)
+    partitions = []
+    with stage('to_csv', results):
+        export_csv(format_period_columns(results), path, partitions=partitions)
+    with stage('manifest'):
+        manifest = write_manifest(path, results, partitions, source_paths(data_path))
+    with stage('to_arrow', results):
+        write_arrow(results, output_path,
+                    manifest['outputs'][FILE_CONSOLIDATED_DATA]['sha256'])
+    with stage('distinct_customers', results):
+        # Con los tipos de `load_processed`, como la etapa `distinct` del
+        # pipeline: las llaves de ambos sketches coinciden
+        DistinctCounter.from_frame(load_processed(output_path, HLL_COLUMNS)).save(
+            os.path.join(output_path, FILE_DISTINCT_CUSTOMERS))
+    return path
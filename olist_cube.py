@@ -0,0 +1,210 @@
+"""
+Cubo de agregados de órdenes por día, estado y tipo de entrega.
+
+Las gráficas interactivas del Tema 4 se construían con un `groupby` sobre
+todas las órdenes cada vez. El cubo guarda una sola vez, en arreglos densos
+de forma (días, estados, `delay_status`):
+
+* número de órdenes,
+* suma de `total_sales`,
+* suma y conteo de `delta_days` (para promedios).
+
+Cualquier serie por día, mes o trimestre, con o sin desglose por estado o
+tipo de entrega, se obtiene sumando sobre los ejes del cubo (`rollup`), y
+`select` filtra estados, tipos de entrega o fechas sin volver a los datos.
+
+Ejemplo:
+
+    from olist_cube import OrderCube
+
+    cube = OrderCube.from_frame(delivered)
+    cube.rollup('Q', by=['delay_status'])
+    cube.select(statuses=['long_delay']).rollup(None, by=['geolocation_state'])
+"""
+import numpy as np
+import pandas as pd
+
+from olist_classify import DELAY_STATUS
+
+MEASURES = ('orders', 'total_sales', 'delta_sum', 'delta_count')
+DIMENSIONS = ('geolocation_state', 'delay_status')
+
+# Frecuencias de `rollup`: día, mes y trimestre
+FREQUENCIES = ('D', 'M', 'Q')
+
+
+def _period_codes(days, freq):
+    """Número de periodo (desde 1970) de cada día para la frecuencia `freq`."""
+    if freq == 'D':
+        return days.astype(np.int64)
+    months = days.astype('datetime64[M]').astype(np.int64)
+    if freq == 'M':
+        return months
+    if freq == 'Q':
+        return months // 3
+    raise ValueError(f"frecuencia desconocida: {freq!r} (usar {', '.join(FREQUENCIES)})")
+
+
+def period_start(codes, freq):
+    """Fecha de inicio (datetime64[D]) de los periodos de `_period_codes`."""
+    codes = np.asarray(codes, dtype=np.int64)
+    if freq == 'D':
+        return codes.astype('datetime64[D]')
+    months = codes * 3 if freq == 'Q' else codes
+    return months.astype('datetime64[M]').astype('datetime64[D]')
+
+
+class OrderCube:
+    """Órdenes, ventas y `delta_days` por (día, estado, `delay_status`)."""
+
+    def __init__(self, start, states, categories, orders, total_sales,
+                 delta_sum, delta_count):
+        self.start = np.datetime64(start, 'D')
+        self.states = tuple(states)
+        self.categories = tuple(categories)
+        self.orders = orders
+        self.total_sales = total_sales
+        self.delta_sum = delta_sum
+        self.delta_count = delta_count
+
+    @classmethod
+    def from_frame(cls, frame, date='order_purchase_timestamp',
+                   state='geolocation_state', status='delay_status',
+                   sales='total_sales', delta='delta_days',
+                   categories=DELAY_STATUS):
+        days = frame[date].to_numpy().astype('datetime64[D]')
+        valid = ~np.isnat(days)
+        states = np.sort(frame[state].dropna().unique().astype(str))
+        state_codes = pd.Categorical(frame[state], categories=states).codes
+        status_codes = pd.Categorical(frame[status], categories=categories).codes
+        valid &= (state_codes >= 0) & (status_codes >= 0)
+
+        days = days[valid]
+        start = days.min() if len(days) else np.datetime64('1970-01-01', 'D')
+        n_days = int((days.max() - start).astype(np.int64)) + 1 if len(days) else 0
+        shape = (n_days, len(states), len(categories))
+        cell = np.ravel_multi_index(
+            ((days - start).astype(np.int64),
+             state_codes[valid].astype(np.int64),
+             status_codes[valid].astype(np.int64)),
+            shape
+            )
+        size = int(np.prod(shape))
+
+        def accumulate(weights=None):
+            return np.bincount(cell, weights=weights, minlength=size).reshape(shape)
+
+        sales_values = frame[sales].to_numpy(dtype=np.float64)[valid]
+        delta_values = frame[delta].to_numpy(dtype=np.float64)[valid]
+        finite = np.isfinite(delta_values)
+        return cls(
+            start,
+            states,
+            categories,
+            accumulate().astype(np.int64),
+            accumulate(np.nan_to_num(sales_values)),
+            accumulate(np.where(finite, delta_values, 0.0)),
+            accumulate(finite.astype(np.float64)).astype(np.int64),
+            )
+
+    @property
+    def days(self):
+        return self.start + np.arange(self.orders.shape[0])
+
+    def select(self, states=None, statuses=None, start=None, end=None):
+        """Sub-cubo con solo `states`, `statuses` y los días en [start, end]."""
+        first = 0 if start is None else max(
+            0, int((np.datetime64(start, 'D') - self.start).astype(np.int64)))
+        last = self.orders.shape[0] if end is None else max(
+            first, int((np.datetime64(end, 'D') - self.start).astype(np.int64)) + 1)
+        state_index = np.arange(len(self.states)) if states is None else np.array(
+            [self.states.index(state) for state in states if state in self.states],
+            dtype=np.int64)
+        status_index = np.arange(len(self.categories)) if statuses is None else np.array(
+            [self.categories.index(status) for status in statuses
+             if status in self.categories], dtype=np.int64)
+
+        def take(values):
+            return values[first:last][:, state_index][:, :, status_index]
+
+        return OrderCube(
+            self.start + first,
+            [self.states[i] for i in state_index],
+            [self.categories[i] for i in status_index],
+            take(self.orders),
+            take(self.total_sales),
+            take(self.delta_sum),
+            take(self.delta_count),
+            )
+
+    def rollup(self, freq='M', by=('delay_status',)):
+        """
+        Agregados por periodo (`freq` = 'D', 'M', 'Q' o None para todo el
+        rango) y por las dimensiones `by`.
+
+        Regresa un dataframe con `period` (inicio del periodo), las columnas
+        de `by`, `orders`, `total_sales` y `delta_days_mean`, sin las celdas
+        sin órdenes.
+        """
+        by = list(by)
+        unknown = set(by) - set(DIMENSIONS)
+        if unknown:
+            raise ValueError(f"dimensiones desconocidas: {', '.join(sorted(unknown))}")
+        # Ejes del cubo que se suman (1 = estado, 2 = delay_status)
+        axes = tuple(
+            axis for axis, name in enumerate(DIMENSIONS, start=1) if name not in by)
+
+        if freq is None:
+            boundaries = np.array([0], dtype=np.int64)
+            periods = None
+        else:
+            codes = _period_codes(self.days, freq)
+            boundaries = np.flatnonzero(
+                np.diff(codes, prepend=np.iinfo(np.int64).min))
+            periods = period_start(codes[boundaries], freq)
+
+        def reduce(values):
+            if values.shape[0] == 0:
+                return values.sum(axis=axes)[:0]
+            return np.add.reduceat(values, boundaries, axis=0).sum(axis=axes)
+
+        measures = {name: reduce(getattr(self, name)) for name in MEASURES}
+        labels = {
+            'geolocation_state': self.states,
+            'delay_status': self.categories,
+        }
+        shape = measures['orders'].shape
+        index = np.indices(shape).reshape(len(shape), -1)
+
+        frame = {}
+        if periods is not None:
+            frame['period'] = periods[index[0]]
+        kept = [name for name in DIMENSIONS if name in by]
+        for position, name in enumerate(kept, start=1):
+            frame[name] = np.asarray(labels[name], dtype=object)[index[position]]
+        frame['orders'] = measures['orders'].ravel()
+        frame['total_sales'] = measures['total_sales'].ravel()
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frame['delta_days_mean'] = (
+                measures['delta_sum'] / measures['delta_count']).ravel()
+        frame = pd.DataFrame(frame)
+        return frame[frame['orders'] > 0].reset_index(drop=True)
+
+    def save(self, path):
+        np.savez_compressed(
+            path,
+            start=self.start,
+            states=np.array(self.states, dtype=str),
+            categories=np.array(self.categories, dtype=str),
+            **{name: getattr(self, name) for name in MEASURES}
+            )
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as stored:
+            return cls(
+                stored['start'],
+                tuple(str(state) for state in stored['states']),
+                tuple(str(category) for category in stored['categories']),
+                *(stored[name] for name in MEASURES)
+                )
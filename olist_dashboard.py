@@ -0,0 +1,415 @@
+"""
+Tablero interactivo local que responde consultas de gráficas desde agregados.
+
+Cada vista interactiva del Tema 4 era un HTML estático que se regeneraba
+ejecutando todo el script. Este servidor (solo biblioteca estándar más
+Plotly) carga una sola vez el cubo de agregados (`olist_cube.py`) y la
+geometría simplificada (`olist_geo.py`) y responde en JSON las gráficas para
+cualquier combinación de filtros:
+
+    GET /                      página del tablero
+    GET /plotly.min.js         librería de Plotly (sin internet)
+    GET /api/filters           periodos, regiones, estados y tipos de entrega
+    GET /api/geojson           geometría de los estados
+    GET /api/chart/<nombre>    gráfica con los filtros de la consulta:
+                               start, end (AAAA-MM), region, state y
+                               delay_status (se pueden repetir); un
+                               periodo inválido responde 400
+
+Las gráficas son `orders`, `long_delays`, `sales` y `map`. Cada respuesta
+lleva un `ETag` (huella del contenido); si el navegador lo envía en
+`If-None-Match` se responde 304 sin cuerpo. Las últimas respuestas se
+guardan en una caché LRU, así que repetir una consulta no vuelve a tocar el
+cubo.
+
+Uso:
+
+    python olist_dashboard.py [--data-path RUTA | --cube ARCHIVO.npz |
+                               --synthetic N] [--port 8050]
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from olist_cube import OrderCube
+from olist_geo import load_geojson
+from olist_io import BASE_PATH, DATA_PATH, FILE_GEODATA, FILE_REGIONS, load_processed
+
+CACHE_SIZE = 256
+
+COLUMNS = [
+    'order_status',
+    'order_purchase_timestamp',
+    'geolocation_state',
+    'delay_status',
+    'total_sales',
+    'delta_days',
+    ]
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>Oilst</title>
+<script src="plotly.min.js"></script>
+<style>
+body { font-family: sans-serif; margin: 1em; }
+form { display: flex; gap: 1em; align-items: flex-end; flex-wrap: wrap; }
+label { display: flex; flex-direction: column; font-size: 0.9em; }
+.chart { width: 100%; height: 480px; }
+</style>
+</head>
+<body>
+<h2>Oilst: órdenes entregadas</h2>
+<form id="filters">
+  <label>Desde <input type="month" name="start"></label>
+  <label>Hasta <input type="month" name="end"></label>
+  <label>Región <select name="region" multiple size="5"></select></label>
+  <label>Estado <select name="state" multiple size="5"></select></label>
+  <label>Tipo de entrega <select name="delay_status" multiple size="3"></select></label>
+  <button type="button" id="clear">Limpiar</button>
+</form>
+<div id="orders" class="chart"></div>
+<div id="long_delays" class="chart"></div>
+<div id="sales" class="chart"></div>
+<div id="map" class="chart" style="height:700px"></div>
+<script>
+{zoom_script}
+var form = document.getElementById('filters');
+function fill(name, values) {
+  var select = form.elements[name];
+  values.forEach(function (value) {
+    var option = document.createElement('option');
+    option.value = option.textContent = value;
+    select.appendChild(option);
+  });
+}
+function query() {
+  var params = new URLSearchParams();
+  Array.prototype.forEach.call(form.elements, function (element) {
+    if (element.tagName === 'SELECT') {
+      Array.prototype.forEach.call(element.selectedOptions, function (option) {
+        params.append(element.name, option.value);
+      });
+    } else if (element.name && element.value) {
+      params.append(element.name, element.value);
+    }
+  });
+  return params.toString();
+}
+function refresh() {
+  var params = query();
+  ['orders', 'long_delays', 'sales', 'map'].forEach(function (name) {
+    fetch('api/chart/' + name + '?' + params)
+      .then(function (response) { return response.json(); })
+      .then(function (figure) {
+        var gd = document.getElementById(name);
+        Plotly.react(gd, figure.data, figure.layout, {responsive: true})
+          .then(olistZoom);
+      });
+  });
+}
+fetch('api/filters').then(function (response) { return response.json(); })
+  .then(function (filters) {
+    fill('region', filters.regions);
+    fill('state', filters.states);
+    fill('delay_status', filters.delay_status);
+    form.elements.start.value = filters.start;
+    form.elements.end.value = filters.end;
+    form.elements.start.min = form.elements.end.min = filters.start;
+    form.elements.start.max = form.elements.end.max = filters.end;
+    refresh();
+  });
+form.addEventListener('change', refresh);
+document.getElementById('clear').addEventListener('click', function () {
+  form.reset();
+  refresh();
+});
+</script>
+</body>
+</html>
+"""
+
+
+class ResponseCache:
+    """Caché LRU de respuestas (etag, cuerpo) por consulta normalizada."""
+
+    def __init__(self, max_entries=CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, body):
+        etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+        with self._lock:
+            self._entries[key] = (etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return etag, body
+
+
+class QueryError(ValueError):
+    """Filtro de la consulta que no se puede interpretar."""
+
+
+def _month(params, field):
+    """Mes del filtro `field` (AAAA-MM) o None si no viene."""
+    value = params.get(field, [None])[0]
+    if not value:
+        return None
+    try:
+        return np.datetime64(value, 'M')
+    except ValueError:
+        raise QueryError(f'{field}: se esperaba AAAA-MM, se recibió {value!r}') from None
+
+
+class Dashboard:
+    """Cubo, geometría y regiones cargados una vez; arma las gráficas."""
+
+    def __init__(self, cube, geojson, regions):
+        self.cube = cube
+        self.geojson = geojson
+        # estado -> región, solo para los estados del cubo
+        self.regions = {
+            state: region for state, region in regions.items()
+            if state in cube.states
+            }
+        self.cache = ResponseCache()
+        self.charts = {
+            'orders': self._orders,
+            'long_delays': self._long_delays,
+            'sales': self._sales,
+            'map': self._map,
+        }
+
+    def filters(self):
+        days = self.cube.days
+        return {
+            'start': str(days[0].astype('datetime64[M]')) if len(days) else None,
+            'end': str(days[-1].astype('datetime64[M]')) if len(days) else None,
+            'regions': sorted(set(self.regions.values())),
+            'states': list(self.cube.states),
+            'delay_status': list(self.cube.categories),
+        }
+
+    def select(self, params):
+        """Sub-cubo con los filtros de la consulta."""
+        states = set(params.get('state', [])) or None
+        regions = set(params.get('region', []))
+        if regions:
+            in_regions = {
+                state for state, region in self.regions.items() if region in regions}
+            states = in_regions if states is None else states & in_regions
+        if states is not None:
+            states = [state for state in self.cube.states if state in states]
+        statuses = params.get('delay_status') or None
+
+        start = _month(params, 'start')
+        end = _month(params, 'end')
+        if end is not None:
+            # Último día del mes de `end`
+            end = end + 1 - np.timedelta64(1, 'D')
+        return self.cube.select(states=states, statuses=statuses, start=start, end=end)
+
+    def _orders(self, cube):
+        from olist_interactive import time_series
+
+        return time_series(
+            cube, 'orders', by='delay_status', kind='bar',
+            title='Número de órdenes por tipo de entrega')
+
+    def _long_delays(self, cube):
+        from olist_interactive import time_series
+
+        cube = cube.select(statuses=['long_delay'])
+        return time_series(
+            cube, 'orders', by='geolocation_state', kind='bar',
+            title='Órdenes con retraso prolongado por estado',
+            labels={'orders': 'Cantidad de órdenes'})
+
+    def _sales(self, cube):
+        from olist_interactive import time_series
+
+        return time_series(
+            cube, 'total_sales', by='delay_status', kind='area', max_points=12,
+            title='Total de ventas por tipo de entrega')
+
+    def _map(self, cube):
+        import plotly.graph_objects as go
+
+        by_state = cube.rollup(None, by=['geolocation_state'])
+        fig = go.Figure(go.Choropleth(
+            # La geometría se pide aparte (y el navegador la guarda)
+            geojson='api/geojson',
+            featureidkey='properties.UF',
+            locations=by_state['geolocation_state'].to_numpy(dtype=object),
+            z=by_state['orders'].to_numpy(dtype=np.float64),
+            customdata=by_state['delta_days_mean'].to_numpy(dtype=np.float64),
+            colorscale='bluyl',
+            colorbar_title='Órdenes',
+            hovertemplate='%{location}: %{z:,.0f} órdenes<br>'
+                          'delta_days promedio: %{customdata:.1f}<extra></extra>',
+            ))
+        fig.update_geos(
+            showcountries=False, showcoastlines=True, showland=True,
+            fitbounds='locations', visible=True)
+        fig.update_layout(
+            title='Órdenes por estado', margin=dict(l=20, r=20, t=66, b=20))
+        return fig
+
+    def chart(self, name, params):
+        """(etag, cuerpo JSON) de la gráfica `name` con los filtros `params`."""
+        from olist_report import figure_json
+
+        key = (name, tuple(sorted(
+            (field, tuple(sorted(values))) for field, values in params.items())))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+        fig = self.charts[name](self.select(params))
+        data, layout = figure_json(fig)
+        body = f'{{"data": {data}, "layout": {layout}}}'.encode('utf-8')
+        return self.cache.put(key, body)
+
+
+class DashboardHandler(BaseHTTPRequestHandler):
+    dashboard = None
+    static = {}
+
+    def log_request(self, code='-', size='-'):
+        # Sin una línea por petición; `log_message` (errores y tiempos de
+        # las gráficas) sigue escribiendo en la salida de errores
+        pass
+
+    def _send(self, body, content_type, etag=None, status=HTTPStatus.OK):
+        if etag is not None and self.headers.get('If-None-Match') == etag:
+            self.send_response(HTTPStatus.NOT_MODIFIED)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if etag is not None:
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        path = url.path.rstrip('/') or '/'
+        if path in self.static:
+            body, content_type, etag = self.static[path]
+            return self._send(body, content_type, etag)
+        if path.startswith('/api/chart/'):
+            name = path[len('/api/chart/'):]
+            if name not in self.dashboard.charts:
+                return self._send(b'{"error": "unknown chart"}', 'application/json',
+                                  status=HTTPStatus.NOT_FOUND)
+            start = time.perf_counter()
+            try:
+                etag, body = self.dashboard.chart(name, parse_qs(url.query))
+            except QueryError as error:
+                return self._send(json.dumps({'error': str(error)}).encode('utf-8'),
+                                  'application/json', status=HTTPStatus.BAD_REQUEST)
+            self.log_message('%s %.1f ms', self.path, (time.perf_counter() - start) * 1e3)
+            return self._send(body, 'application/json', etag)
+        self._send(b'not found', 'text/plain', status=HTTPStatus.NOT_FOUND)
+
+
+def _static(body, content_type):
+    return body, content_type, '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def make_server(dashboard, host='127.0.0.1', port=8050):
+    """Servidor HTTP del tablero (se inicia con `serve_forever()`)."""
+    from plotly.offline import get_plotlyjs
+    from olist_interactive import ZOOM_SCRIPT
+
+    handler = type('Handler', (DashboardHandler,), {
+        'dashboard': dashboard,
+        'static': {
+            '/': _static(
+                PAGE.replace('{zoom_script}', ZOOM_SCRIPT).encode('utf-8'),
+                'text/html; charset=utf-8'),
+            '/plotly.min.js': _static(
+                get_plotlyjs().encode('utf-8'), 'application/javascript'),
+            '/api/filters': _static(
+                json.dumps(dashboard.filters()).encode('utf-8'), 'application/json'),
+            '/api/geojson': _static(
+                json.dumps(dashboard.geojson, separators=(',', ':')).encode('utf-8'),
+                'application/json'),
+        },
+    })
+    return ThreadingHTTPServer((host, port), handler)
+
+
+def load_dashboard(data_path=None, cube_path=None, synthetic=None):
+    """Tablero con el cubo del archivo consolidado, de `cube_path` o sintético."""
+    data_path = data_path or DATA_PATH
+    if cube_path is not None:
+        cube = OrderCube.load(cube_path)
+    else:
+        if synthetic:
+            from olist_synthetic import generate_processed
+            oilst = generate_processed(synthetic)
+        else:
+            oilst = load_processed(data_path, columns=COLUMNS)
+        cube = OrderCube.from_frame(oilst.query("order_status == 'delivered'"))
+
+    # Sin datos reales se usan la geometría y regiones incluidas en el repositorio
+    base = BASE_PATH if synthetic or not os.path.exists(
+        os.path.join(data_path, FILE_GEODATA)) else data_path
+    geojson = load_geojson(os.path.join(base, FILE_GEODATA))
+    regions = pd.read_csv(os.path.join(base, FILE_REGIONS), encoding='utf-8-sig')
+    return Dashboard(
+        cube, geojson, dict(zip(regions['abbreviation'], regions['region'])))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--data-path', default=None,
+                        help='carpeta con oilst_processed.csv y brasil_geodata.json')
+    source.add_argument('--cube', default=None,
+                        help='cubo guardado con OrderCube.save (.npz)')
+    source.add_argument('--synthetic', type=int, default=None, metavar='N',
+                        help='usa N órdenes sintéticas (sin datos reales)')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8050)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    dashboard = load_dashboard(args.data_path, args.cube, args.synthetic)
+    server = make_server(dashboard, args.host, args.port)
+    print(f"Datos cargados en {time.perf_counter() - start:.2f} s")
+    print(f"Tablero en http://{args.host}:{server.server_port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+"""
+Función de distribución acumulativa empírica (ECDF) de `delta_days`.
+
+Graficar la ECDF con `ax.hist(..., cumulative=True)` o `sns.ecdfplot` ordena
+la columna completa en cada llamada. Aquí la columna se ordena una sola vez
+por segmento (todas las órdenes entregadas, cada `delay_status` y cada
+estado) y se guarda como arreglo `float32` en un archivo `.npy`, que después
+se abre con memoria mapeada. Sobre el arreglo ordenado:
+
+* `P(a < delta_days <= b)` y los cuantiles se responden con búsqueda binaria,
+* la curva escalonada para graficar se toma con un submuestreo de puntos.
+
+`open_ecdf_store` guarda junto a los arreglos una huella de los datos de los
+que salen y solo vuelve a ordenar si falta o si los datos cambiaron. En un
+segmento vacío `cdf`, `prob` y `quantile` regresan NaN.
+
+Ejemplo:
+
+    from olist_ecdf import open_ecdf_store
+
+    store = open_ecdf_store(delivered, 'olist_ecdf')
+    store['delivered'].prob(0, 3)
+    store['delay_status=long_delay'].quantile(0.5)
+    x, y = store['geolocation_state=SP'].step()
+"""
+import hashlib
+import os
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_VALUE = 'delta_days'
+DEFAULT_SEGMENTS = ('delay_status', 'geolocation_state')
+ALL_SEGMENT = 'delivered'
+STEP_POINTS = 1000
+
+# Huella de los datos con los que se construyeron los arreglos
+FILE_FINGERPRINT = 'fingerprint.txt'
+
+
+def segment_name(column=None, value=None):
+    """Nombre del segmento: `delivered` o `<columna>=<valor>`."""
+    if column is None:
+        return ALL_SEGMENT
+    return f'{column}={value}'
+
+
+def _write_sorted(path, name, values):
+    values = np.sort(values[np.isfinite(values)].astype(np.float32))
+    np.save(os.path.join(path, f'{name}.npy'), values)
+
+
+def fingerprint(frame, value=DEFAULT_VALUE, segments=DEFAULT_SEGMENTS):
+    """sha256 de las columnas `value` y `segments` de `frame`."""
+    columns = [value, *segments]
+    sha = hashlib.sha256(repr(columns).encode())
+    sha.update(pd.util.hash_pandas_object(frame[columns], index=False).to_numpy())
+    return sha.hexdigest()
+
+
+def _read_fingerprint(path):
+    try:
+        with open(os.path.join(path, FILE_FINGERPRINT), encoding='utf-8') as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        return None
+
+
+def build_ecdf_store(frame, path, value=DEFAULT_VALUE, segments=DEFAULT_SEGMENTS):
+    """Guarda en `path` los valores ordenados de `value` por segmento."""
+    os.makedirs(path, exist_ok=True)
+    # Sin huella mientras se escribe: una construcción interrumpida se repite
+    for name in os.listdir(path):
+        if name == FILE_FINGERPRINT or name.endswith('.npy'):
+            os.remove(os.path.join(path, name))
+    values = frame[value].to_numpy(dtype=np.float64)
+    _write_sorted(path, segment_name(), values)
+
+    for column in segments:
+        codes = frame[column]
+        for label, positions in codes.groupby(codes).indices.items():
+            _write_sorted(path, segment_name(column, label), values[positions])
+
+    with open(os.path.join(path, FILE_FINGERPRINT), 'w', encoding='utf-8') as f:
+        f.write(fingerprint(frame, value, segments) + '\n')
+
+
+def open_ecdf_store(frame, path, value=DEFAULT_VALUE, segments=DEFAULT_SEGMENTS):
+    """
+    `ECDFStore` de `path`; antes vuelve a construirlo con `frame` solo si
+    falta o si su huella no coincide con la de `frame`.
+    """
+    if _read_fingerprint(path) != fingerprint(frame, value, segments):
+        build_ecdf_store(frame, path, value, segments)
+    return ECDFStore(path)
+
+
+class EmpiricalCDF:
+    """ECDF sobre un arreglo ya ordenado (normalmente de memoria mapeada)."""
+
+    def __init__(self, values):
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    def _empty(self, x):
+        return np.full(np.shape(x), np.nan)[()]
+
+    def cdf(self, x):
+        """Proporción de valores menores o iguales a `x`."""
+        if not len(self.values):
+            return self._empty(x)
+        return np.searchsorted(self.values, x, side='right') / len(self.values)
+
+    def prob(self, a, b):
+        """Proporción de valores en el intervalo (a, b]."""
+        if not len(self.values):
+            return np.nan
+        left, right = np.searchsorted(self.values, [a, b], side='right')
+        return (right - left) / len(self.values)
+
+    def quantile(self, q):
+        """Cuantil empírico: el menor valor x con cdf(x) >= q."""
+        q = np.asarray(q, dtype=np.float64)
+        if not len(self.values):
+            return self._empty(q)
+        position = np.clip(np.ceil(q * len(self.values)).astype(np.int64) - 1,
+                           0, len(self.values) - 1)
+        return self.values[position]
+
+    def step(self, n_points=STEP_POINTS):
+        """
+        Puntos (x, y) de la curva escalonada submuestreada a `n_points`, para
+        graficar con `ax.step(x, y, where='post')`.
+        """
+        n = len(self.values)
+        if not n:
+            return np.empty(0, dtype=self.values.dtype), np.empty(0)
+        positions = np.unique(
+            np.linspace(0, n - 1, min(n_points, n)).astype(np.int64))
+        return np.asarray(self.values[positions]), (positions + 1) / n
+
+
+class ECDFStore:
+    """Segmentos guardados por `build_ecdf_store`, abiertos bajo demanda."""
+
+    def __init__(self, path):
+        self.path = path
+        self._opened = {}
+
+    @property
+    def segments(self):
+        return sorted(
+            name[:-len('.npy')] for name in os.listdir(self.path)
+            if name.endswith('.npy')
+            )
+
+    def __getitem__(self, segment):
+        if segment not in self._opened:
+            self._opened[segment] = EmpiricalCDF(np.load(
+                os.path.join(self.path, f'{segment}.npy'), mmap_mode='r'))
+        return self._opened[segment]
@@ -0,0 +1,337 @@
+"""
+Exportación rápida y reproducible de la tabla consolidada a CSV.
+
+`results.to_csv(...)` formatea celda por celda en un solo hilo; con tablas
+anchas y cinco columnas de fechas es el paso más lento de la consolidación.
+`export_csv` produce el mismo texto que `to_csv(index=False)`, pero:
+
+1. divide la tabla en bloques de `chunk_rows` filas,
+2. formatea cada columna de un bloque de forma vectorizada con pyarrow
+   (fechas con la misma resolución que usaría pandas, reales con su
+   representación más corta, texto entre comillas solo cuando hace falta),
+   une las columnas y las filas en un solo buffer sin pasar por Python,
+3. formatea (y comprime) los bloques en paralelo con hilos, y
+4. los escribe en orden, comprimidos con gzip o zstd si se pide.
+
+Los bloques dependen solo de `chunk_rows` (no de `jobs`), y gzip se
+escribe sin fecha ni nombre de archivo, así que las mismas opciones dan
+siempre los mismos bytes. Con compresión, cada bloque es un miembro gzip
+(o un frame zstd) independiente; `pd.read_csv`, `gzip -d` y `zstd -d` leen
+el archivo completo.
+
+Uso:
+
+    python olist_export.py [--data-path RUTA] [--output ARCHIVO]
+                           [--compression gzip|zstd] [--level N] [--jobs N]
+
+Ejemplo:
+
+    from olist_export import export_csv
+
+    export_csv(results, 'oilst_processed.csv.gz', compression='gzip')
+"""
+import argparse
+import csv
+import hashlib
+import io
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from olist_io import DATA_PATH, FILE_CONSOLIDATED_DATA, load_processed
+
+# Filas por bloque: define los límites de los miembros comprimidos
+CHUNK_ROWS = 250_000
+
+COMPRESSIONS = {
+    None: ('', None),
+    'gzip': ('.gz', 6),
+    'zstd': ('.zst', 3),
+}
+
+# Caracteres que obligan a poner un campo entre comillas (csv.QUOTE_MINIMAL)
+_NEEDS_QUOTES = '[,"\r\n]'
+
+_PER_SECOND = {'s': 1, 'ms': 10**3, 'us': 10**6, 'ns': 10**9}
+
+
+def _datetime_resolution(values):
+    """
+    Resolución con la que pandas escribe una columna de fechas: 'D' (solo la
+    fecha) si todas son a medianoche y, si no, la más gruesa que no pierde
+    ningún valor. pandas la elige con la columna completa, no por bloque.
+    """
+    data = values.to_numpy()
+    unit = np.datetime_data(data.dtype)[0]
+    ticks = data.view(np.int64)[~np.isnat(data)]
+    if np.all(ticks % (86_400 * _PER_SECOND[unit]) == 0):
+        return 'D'
+    for resolution in ('s', 'ms', 'us'):
+        if np.all(ticks % (_PER_SECOND[unit] // _PER_SECOND[resolution]) == 0):
+            return resolution
+    return unit
+
+
+def datetime_resolutions(frame):
+    """Resolución de `_datetime_resolution` de cada columna de fechas de `frame`."""
+    return {
+        column: _datetime_resolution(frame[column])
+        for column in frame.columns
+        if pd.api.types.is_datetime64_dtype(frame[column].dtype)
+    }
+
+
+def _datetime_strings(values, resolution=None):
+    """Fechas como las escribe pandas, con la resolución `resolution`."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if resolution is None:
+        resolution = _datetime_resolution(values)
+    array = pa.array(values.to_numpy(), from_pandas=True)
+    if resolution == 'D':
+        return pc.cast(array.cast(pa.date32()), pa.string())
+    return pc.cast(array.cast(pa.timestamp(resolution)), pa.string())
+
+
+# `repr` de numpy y Python usa notación posicional desde 1e-4 y hasta este
+# límite (exclusivo) según el tipo del real
+_POSITIONAL_LIMIT = {np.dtype(np.float64): 1e16, np.dtype(np.float32): 1e6}
+
+
+def _float_strings(values):
+    """
+    Reales como su `repr` (lo que escribe pandas): los `float32` con los
+    dígitos más cortos de `float32` ('1.1', no '1.100000023841858'), los
+    demás como `float64`. pyarrow usa notación exponencial con otros
+    umbrales, así que esos pocos valores (menores a 1e-4, desde el límite de
+    `_POSITIONAL_LIMIT`, o los que pyarrow escribe con exponente) se
+    formatean con Python.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    dtype = np.dtype(np.float32) if values.dtype == np.float32 else np.dtype(np.float64)
+    data = values.to_numpy(dtype=dtype, na_value=np.nan)
+    strings = pc.cast(pa.array(data, mask=np.isnan(data)), pa.string())
+    # Los umbrales se comparan en float64, como numpy (float32(1e-4) < 1e-4)
+    magnitude = np.abs(data.astype(np.float64))
+    exponent = np.asarray(pc.fill_null(pc.match_substring(strings, 'e'), False)) \
+        | ((magnitude < 1e-4) & (magnitude > 0)) | (magnitude >= _POSITIONAL_LIMIT[dtype])
+    if exponent.any():
+        python = np.full(len(data), None, dtype=object)
+        # `str` de un escalar de numpy: el `repr` más corto de su tipo
+        python[exponent] = [str(value) for value in data[exponent]]
+        strings = pc.if_else(
+            pa.array(exponent), pa.array(python, type=pa.string()), strings)
+    # '3' -> '3.0' y '-0' -> '-0.0' ('inf' no cambia)
+    plain = pc.invert(pc.match_substring_regex(strings, '[.en]'))
+    return pc.if_else(plain, pc.binary_join_element_wise(strings, '.0', ''), strings)
+
+
+def _text_strings(values):
+    """Texto con comillas (y comillas duplicadas) solo donde hace falta."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    array = pa.array(values, from_pandas=True)
+    if isinstance(array, pa.ChunkedArray):
+        # Texto de pandas respaldado por varios bloques de pyarrow
+        array = array.combine_chunks()
+    if pa.types.is_dictionary(array.type):
+        array = array.dictionary_decode()
+    array = pc.cast(array, pa.large_string())
+    quote = pc.fill_null(pc.match_substring_regex(array, _NEEDS_QUOTES), False)
+    if not pc.any(quote).as_py():
+        return array
+    quote_mark = pa.scalar('"', pa.large_string())
+    quoted = pc.binary_join_element_wise(
+        quote_mark, pc.replace_substring(array, '"', '""'), quote_mark,
+        pa.scalar('', pa.large_string()))
+    return pc.if_else(quote, quoted, array)
+
+
+def _column_strings(values, resolution=None):
+    """Columna de pyarrow con el texto de cada celda ('' para los nulos)."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    dtype = values.dtype
+    if pd.api.types.is_datetime64_dtype(dtype):
+        strings = _datetime_strings(values, resolution)
+    elif pd.api.types.is_bool_dtype(dtype):
+        strings = pa.array(
+            np.where(values.isna(), None, np.where(values.fillna(False), 'True', 'False')),
+            type=pa.string())
+    elif pd.api.types.is_float_dtype(dtype):
+        strings = _float_strings(values)
+    elif pd.api.types.is_integer_dtype(dtype):
+        strings = pc.cast(pa.array(values, from_pandas=True), pa.string())
+    else:
+        strings = _text_strings(values)
+    # Todas las columnas como large_string (offsets de 64 bits)
+    return pc.fill_null(pc.cast(strings, pa.large_string()), '')
+
+
+def format_chunk(frame, lineterminator='\n', resolutions=None):
+    """
+    Bytes del CSV (sin encabezado) de las filas de `frame`.
+
+    `resolutions` (de `datetime_resolutions`) fija la resolución de las
+    columnas de fechas; si falta, se elige con las filas de `frame`.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if not len(frame):
+        return b''
+
+    def scalar(text):
+        return pa.scalar(text, pa.large_string())
+
+    resolutions = resolutions or {}
+    columns = [_column_strings(frame[column], resolutions.get(column))
+               for column in frame.columns]
+    lines = pc.binary_join_element_wise(*columns, scalar(','))
+    lines = pc.binary_join_element_wise(lines, scalar(lineterminator), scalar(''))
+    # Las líneas ya están contiguas en el buffer de datos del arreglo
+    _, offsets, data = lines.buffers()
+    offsets = np.frombuffer(offsets, dtype=np.int64, count=len(lines) + 1,
+                            offset=lines.offset * 8)
+    return data.to_pybytes()[offsets[0]:offsets[-1]]
+
+
+def header(frame, lineterminator='\n'):
+    """Encabezado con las reglas de comillas de `csv` (las de pandas)."""
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator=lineterminator).writerow(
+        [str(column) for column in frame.columns])
+    return buffer.getvalue().encode('utf-8')
+
+
+def _compressor(compression, level):
+    if compression is None:
+        return lambda data: data
+    if compression == 'gzip':
+        import gzip
+        # mtime=0 y sin nombre de archivo: bytes reproducibles
+        return lambda data: gzip.compress(data, compresslevel=level, mtime=0)
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError("la compresión 'zstd' requiere el paquete zstandard")
+        return lambda data: zstandard.ZstdCompressor(level=level).compress(data)
+    raise ValueError(
+        f"compresión desconocida {compression!r}; opciones: gzip, zstd")
+
+
+def export_csv(frame, path, compression=None, level=None, jobs=None,
+               chunk_rows=CHUNK_ROWS, lineterminator='\n', partitions=None):
+    """
+    Escribe `frame` en `path` como `frame.to_csv(path, index=False)` (mismos
+    bytes sin compresión); regresa el número de bytes escritos.
+
+    Si se pasa una lista en `partitions`, se le agrega por bloque su
+    posición en el archivo (`offset`, `bytes`), sus filas y el sha256 de sus
+    bytes escritos (`olist_manifest.py`).
+    """
+    level = COMPRESSIONS[compression][1] if level is None else level
+    compress = _compressor(compression, level)
+    # Una sola resolución por columna de fechas para todos los bloques
+    resolutions = datetime_resolutions(frame)
+
+    def block(start):
+        chunk = frame.iloc[start:start + chunk_rows]
+        data = format_chunk(chunk, lineterminator, resolutions)
+        if start == 0:
+            data = header(frame, lineterminator) + data
+        data = compress(data)
+        # El sha256 se calcula en el hilo del bloque, no al escribir
+        digest = hashlib.sha256(data).hexdigest() if partitions is not None else None
+        return data, len(chunk), digest
+
+    starts = range(0, max(len(frame), 1), chunk_rows)
+    written = 0
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as pool, \
+            open(temporary, 'wb') as f:
+        # `map` entrega los bloques en orden aunque terminen en otro
+        for data, rows, digest in pool.map(block, starts):
+            f.write(data)
+            if partitions is not None:
+                partitions.append({
+                    'offset': written, 'bytes': len(data), 'rows': rows,
+                    'sha256': digest})
+            written += len(data)
+    os.replace(temporary, path)
+    return written
+
+
+def compress_partitions(path, partitions, output, compression='gzip', level=None,
+                        jobs=None, reuse=None):
+    """
+    Escribe en `output` la copia comprimida de `path` (un CSV de
+    `export_csv` sin compresión) con un miembro por partición de
+    `partitions` (las del manifiesto, `olist_manifest.py`); son los mismos
+    bytes que daría `export_csv(..., compression=compression)`, sin volver a
+    formatear la tabla.
+
+    `reuse` asocia índices de partición con la posición (`offset`, `bytes`)
+    de su miembro ya comprimido en el `output` actual: esos se copian en
+    lugar de comprimirse otra vez. Regresa la posición de cada miembro.
+    """
+    level = COMPRESSIONS[compression][1] if level is None else level
+    compress = _compressor(compression, level)
+    reuse = reuse or {}
+
+    def member(index):
+        source, position = (output, reuse[index]) if index in reuse \
+            else (path, partitions[index])
+        with open(source, 'rb') as f:
+            f.seek(position['offset'])
+            data = f.read(position['bytes'])
+        if len(data) != position['bytes']:
+            raise ValueError(f'{source}: faltan bytes de la partición {index}')
+        return data if index in reuse else compress(data)
+
+    members = []
+    written = 0
+    temporary = f'{output}.{os.getpid()}.tmp'
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as pool, \
+            open(temporary, 'wb') as f:
+        for data in pool.map(member, range(len(partitions))):
+            f.write(data)
+            members.append({'offset': written, 'bytes': len(data)})
+            written += len(data)
+    os.replace(temporary, output)
+    return members
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--data-path', default=DATA_PATH,
+                        help='carpeta con el archivo consolidado')
+    parser.add_argument('--output', default=None,
+                        help='archivo de salida (por defecto oilst_processed.csv[.gz|.zst])')
+    parser.add_argument('--compression', choices=['gzip', 'zstd'], default=None)
+    parser.add_argument('--level', type=int, default=None, help='nivel de compresión')
+    parser.add_argument('--jobs', type=int, default=None)
+    parser.add_argument('--chunk-rows', type=int, default=CHUNK_ROWS)
+    args = parser.parse_args(argv)
+
+    output = args.output or FILE_CONSOLIDATED_DATA + COMPRESSIONS[args.compression][0]
+    start = time.perf_counter()
+    oilst = load_processed(args.data_path, period_text=True)
+    loaded = time.perf_counter()
+    written = export_csv(oilst, output, args.compression, args.level, args.jobs,
+                         args.chunk_rows)
+    print(f"{output}: {written / 1e6:.1f} MB en {time.perf_counter() - loaded:.2f} s "
+          f"(lectura {loaded - start:.2f} s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+Caché de figuras direccionada por contenido.
+
+La llave de cada figura es la huella sha256 de sus entradas agregadas
+(conteos, cuantiles, matrices, ...) más los parámetros de la gráfica
+(título, tamaño, colores, versión del dibujo). Si la llave ya existe, se
+regresa el PNG/HTML guardado en lugar de volver a dibujar.
+
+Los archivos viven en `.cache/figures/<llave><extensión>`. Cada acierto
+actualiza la fecha de modificación del archivo, y al guardar uno nuevo se
+borran los menos usados recientemente hasta respetar `max_bytes` (LRU por
+tamaño).
+
+Ejemplo:
+
+    from olist_figcache import FigureCache
+
+    cache = FigureCache()
+    cache.fetch(
+        inputs={'stats': stats},
+        spec={'figure': '3_c', 'figsize': (12, 8)},
+        path='3_c_boxplot_delta_day_by_state_and_delay_type.png',
+        render=draw_boxplot
+        )
+"""
+import hashlib
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.path.join(BASE_PATH, '.cache', 'figures')
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+
+def _update(sha, value):
+    if isinstance(value, dict):
+        sha.update(b'{')
+        for key in sorted(value, key=str):
+            sha.update(repr(key).encode('utf-8'))
+            _update(sha, value[key])
+        sha.update(b'}')
+    elif isinstance(value, (list, tuple)):
+        sha.update(b'[')
+        for item in value:
+            _update(sha, item)
+        sha.update(b']')
+    elif isinstance(value, (pd.DataFrame, pd.Series)):
+        frame = value.to_frame() if isinstance(value, pd.Series) else value
+        sha.update(pd.util.hash_pandas_object(frame.index).to_numpy().tobytes())
+        sha.update(repr(frame.index.names).encode('utf-8'))
+        for column in frame.columns:
+            sha.update(repr(str(column)).encode('utf-8'))
+            values = frame[column]
+            if values.dtype == object:
+                # Columnas con arreglos por fila (p. ej. atípicos por grupo)
+                _update(sha, values.tolist())
+            else:
+                sha.update(pd.util.hash_pandas_object(
+                    values, index=False).to_numpy().tobytes())
+    elif isinstance(value, np.ndarray) and value.dtype != object:
+        sha.update(f'{value.dtype}{value.shape}'.encode('utf-8'))
+        sha.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, np.ndarray):
+        _update(sha, value.tolist())
+    elif hasattr(value, '__dict__') and not callable(value):
+        # Objetos de agregados (p. ej. OrderCube): se usan sus atributos
+        sha.update(type(value).__name__.encode('utf-8'))
+        _update(sha, vars(value))
+    else:
+        sha.update(repr(value).encode('utf-8'))
+
+
+def digest(*values):
+    """Huella sha256 de entradas anidadas (dicts, listas, tablas, arreglos)."""
+    sha = hashlib.sha256()
+    for value in values:
+        _update(sha, value)
+    return sha.hexdigest()
+
+
+class FigureCache:
+    """Figuras ya dibujadas, guardadas por la huella de entradas y parámetros."""
+
+    def __init__(self, path=CACHE_PATH, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    def key(self, inputs, spec):
+        return digest(inputs, spec)
+
+    def _entry(self, key, suffix):
+        return os.path.join(self.path, f'{key}{suffix}')
+
+    def get(self, key, suffix):
+        """Ruta del archivo guardado para `key`, o None si no existe."""
+        entry = self._entry(key, suffix)
+        try:
+            # Marca el archivo como usado recientemente
+            os.utime(entry)
+        except FileNotFoundError:
+            return None
+        return entry
+
+    def put(self, key, source):
+        """Guarda una copia de `source` con la llave `key`."""
+        os.makedirs(self.path, exist_ok=True)
+        entry = self._entry(key, os.path.splitext(source)[1])
+        temporary = f'{entry}.{os.getpid()}.tmp'
+        shutil.copyfile(source, temporary)
+        os.replace(temporary, entry)
+        self.evict()
+        return entry
+
+    def evict(self):
+        """Borra los archivos menos usados hasta quedar dentro de `max_bytes`."""
+        entries = []
+        with os.scandir(self.path) as scan:
+            for entry in scan:
+                if entry.is_file() and not entry.name.endswith('.tmp'):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+    def fetch(self, inputs, spec, path, render, force=False):
+        """
+        Escribe la figura en `path`: la copia de la caché si existe y, si no,
+        la dibuja con `render(path)` y la guarda. Regresa True si fue acierto.
+        """
+        key = self.key(inputs, spec)
+        suffix = os.path.splitext(path)[1]
+        cached = None if force else self.get(key, suffix)
+        if cached is not None:
+            shutil.copyfile(cached, path)
+            return True
+        render(path)
+        self.put(key, path)
+        return False
@@ -0,0 +1,190 @@
+"""
+Simplificación y caché de la geometría de `brasil_geodata.json`.
+
+Los mapas de Plotly incrustan el geojson completo (~1.3 MB) en cada HTML.
+Para los mapas a nivel estatal basta con una geometría mucho más ligera:
+
+1. Las fronteras se parten en arcos entre los vértices donde cambia el
+   conjunto de polígonos que las comparten (uniones entre estados). Cada arco
+   se simplifica una sola vez con Douglas-Peucker, de modo que dos estados
+   vecinos reciben exactamente la misma frontera simplificada y no aparecen
+   huecos ni traslapes (se preserva la topología).
+2. Las coordenadas se redondean a `precision` decimales (3 decimales son
+   ~100 m), lo que reduce el tamaño del texto JSON.
+3. El resultado se guarda en `.cache/geo` por archivo de origen, tolerancia
+   y precisión, así que solo se calcula la primera vez.
+
+Ejemplo:
+
+    from olist_geo import load_geojson
+
+    geojson = load_geojson(os.path.join(DATA_PATH, FILE_GEODATA))
+"""
+import hashlib
+import json
+import os
+
+import numpy as np
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+CACHE_PATH = os.path.join(BASE_PATH, '.cache', 'geo')
+
+# Tolerancia en grados (~1 km) y decimales de las coordenadas
+DEFAULT_TOLERANCE = 0.01
+DEFAULT_PRECISION = 3
+
+
+def _douglas_peucker(points, tolerance):
+    """Índices de los puntos que conserva Douglas-Peucker (iterativo)."""
+    n = len(points)
+    if n < 3:
+        return np.arange(n)
+    keep = np.zeros(n, dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, n - 1)]
+    while stack:
+        first, last = stack.pop()
+        if last - first < 2:
+            continue
+        start, end = points[first], points[last]
+        inner = points[first + 1:last]
+        segment = end - start
+        length = segment @ segment
+        if length == 0:
+            # Arco cerrado: distancia al punto de inicio
+            distances = np.hypot(*(inner - start).T)
+        else:
+            t = np.clip((inner - start) @ segment / length, 0, 1)
+            distances = np.hypot(*(inner - start - t[:, None] * segment).T)
+        farthest = int(np.argmax(distances))
+        if distances[farthest] > tolerance:
+            index = first + 1 + farthest
+            keep[index] = True
+            stack.append((first, index))
+            stack.append((index, last))
+    return np.flatnonzero(keep)
+
+
+def _rings(geometry):
+    """Anillos (listas de coordenadas) de un Polygon o MultiPolygon."""
+    if geometry['type'] == 'Polygon':
+        return [ring for ring in geometry['coordinates']]
+    return [ring for polygon in geometry['coordinates'] for ring in polygon]
+
+
+def _replace_rings(geometry, rings):
+    rings = iter(rings)
+    if geometry['type'] == 'Polygon':
+        coordinates = [next(rings) for _ in geometry['coordinates']]
+    else:
+        coordinates = [
+            [next(rings) for _ in polygon] for polygon in geometry['coordinates']
+            ]
+    return {'type': geometry['type'], 'coordinates': coordinates}
+
+
+def simplify_geojson(geojson, tolerance=DEFAULT_TOLERANCE,
+                     precision=DEFAULT_PRECISION):
+    """Regresa una copia simplificada del geojson preservando fronteras comunes."""
+    features = geojson['features']
+    rings = [
+        [tuple(point) for point in ring[:-1]]
+        for feature in features for ring in _rings(feature['geometry'])
+        ]
+
+    # Anillos que pasan por cada vértice
+    owners = {}
+    for ring_id, ring in enumerate(rings):
+        for point in ring:
+            owners.setdefault(point, set()).add(ring_id)
+
+    arc_cache = {}
+
+    def simplify_arc(arc):
+        # La llave es la misma sin importar el sentido en que se recorre el
+        # arco, así los dos anillos que lo comparten obtienen el mismo resultado
+        reverse = arc[::-1] < arc
+        key = tuple(arc[::-1] if reverse else arc)
+        if key not in arc_cache:
+            points = np.array(key)
+            arc_cache[key] = [key[i] for i in _douglas_peucker(points, tolerance)]
+        simplified = arc_cache[key]
+        return simplified[::-1] if reverse else simplified
+
+    simplified_rings = []
+    for ring in rings:
+        n = len(ring)
+        fixed = [
+            i for i in range(n)
+            if owners[ring[i]] != owners[ring[i - 1]]
+            or owners[ring[i]] != owners[ring[(i + 1) % n]]
+            or len(owners[ring[i]]) > 2
+            ]
+        if not fixed:
+            # Anillo sin uniones: se fija el vértice menor, que es el mismo
+            # para cualquier otro anillo que recorra exactamente esta frontera
+            fixed = [min(range(n), key=ring.__getitem__)]
+
+        points = []
+        for start, end in zip(fixed, fixed[1:] + [fixed[0] + n]):
+            arc = [ring[i % n] for i in range(start, end + 1)]
+            points.extend(simplify_arc(arc)[:-1])
+
+        quantized = [
+            [round(x, precision), round(y, precision)] for x, y in points
+            ]
+        # El redondeo puede dejar vértices consecutivos repetidos
+        quantized = [
+            point for i, point in enumerate(quantized)
+            if i == 0 or point != quantized[i - 1]
+            ]
+        if len(quantized) > 1 and quantized[-1] == quantized[0]:
+            quantized.pop()
+        if len(quantized) < 3:
+            # Islas muy pequeñas: se conserva el anillo original redondeado
+            quantized = [
+                [round(x, precision), round(y, precision)] for x, y in ring
+                ]
+        simplified_rings.append(quantized + [quantized[0]])
+
+    rings_iter = iter(simplified_rings)
+    simplified_features = []
+    for feature in features:
+        n_rings = len(_rings(feature['geometry']))
+        feature = dict(feature)
+        feature['geometry'] = _replace_rings(
+            feature['geometry'], [next(rings_iter) for _ in range(n_rings)])
+        simplified_features.append(feature)
+
+    return {**geojson, 'features': simplified_features}
+
+
+def load_geojson(path, tolerance=DEFAULT_TOLERANCE, precision=DEFAULT_PRECISION,
+                 cache_path=CACHE_PATH):
+    """
+    Lee el geojson de `path` ya simplificado, usando la caché si existe.
+
+    Con `tolerance=None` se regresa el archivo original sin simplificar.
+    """
+    with open(path, 'rb') as f:
+        content = f.read()
+    if tolerance is None:
+        return json.loads(content)
+
+    digest = hashlib.sha256(content).hexdigest()[:16]
+    name = os.path.splitext(os.path.basename(path))[0]
+    cached = os.path.join(
+        cache_path, f'{name}_{digest}_t{tolerance:g}_p{precision}.json')
+    if os.path.exists(cached):
+        with open(cached, 'r') as f:
+            return json.load(f)
+
+    geojson = simplify_geojson(json.loads(content), tolerance, precision)
+    os.makedirs(cache_path, exist_ok=True)
+    # Se escribe en un archivo temporal y se renombra para que otro proceso
+    # nunca lea un archivo a medio escribir
+    temporary = f'{cached}.{os.getpid()}.tmp'
+    with open(temporary, 'w') as f:
+        json.dump(geojson, f, separators=(',', ':'))
+    os.replace(temporary, cached)
+    return geojson
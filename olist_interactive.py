@@ -0,0 +1,196 @@
+"""
+Gráficas interactivas de series de tiempo construidas desde `OrderCube`.
+
+Las gráficas de barras y áreas del Tema 4 salían de `px.bar`/`px.area`
+sobre un `groupby` hecho al momento y se serializaban como listas JSON. Aquí
+las trazas se construyen directamente con los arreglos de
+`OrderCube.rollup`:
+
+* las fechas se pasan como milisegundos desde 1970 y las medidas como
+  arreglos de numpy, que Plotly guarda como arreglos tipados en base64 (y
+  `olist_report.write_report` también),
+* las líneas y áreas usan `go.Scattergl` (WebGL), que se mantiene fluido
+  aun con series diarias de varios años,
+* cada gráfica incluye las trazas de varias frecuencias (día, mes,
+  trimestre) y solo muestra una: al hacer zoom, `ZOOM_SCRIPT` elige la
+  frecuencia más fina que deja a lo más `max_points` periodos visibles
+  (re-agregación según el nivel de zoom).
+
+Ejemplo:
+
+    from olist_cube import OrderCube
+    from olist_interactive import time_series, write_chart
+
+    cube = OrderCube.from_frame(delivered)
+    fig = time_series(cube, 'orders', by='delay_status', kind='bar')
+    write_chart(fig, 'orders_by_delay_status.html')
+"""
+import numpy as np
+
+# Días aproximados de cada frecuencia (para estimar periodos visibles)
+PERIOD_DAYS = {'D': 1.0, 'M': 30.44, 'Q': 91.31}
+
+DEFAULT_LEVELS = {
+    'bar': ('M', 'Q'),
+    'line': ('D', 'M', 'Q'),
+    'area': ('D', 'M', 'Q'),
+}
+DEFAULT_MAX_POINTS = {'bar': 40, 'line': 400, 'area': 400}
+
+# Colores por defecto de Plotly Express
+PLOTLY_COLORS = [
+    '#636efa', '#EF553B', '#00cc96', '#ab63fa', '#FFA15A',
+    '#19d3f3', '#FF6692', '#B6E880', '#FF97FF', '#FECB52',
+    ]
+
+# Al cambiar el rango del eje x, muestra solo las trazas de la frecuencia
+# adecuada. La configuración viene en `layout.meta.zoom` de cada figura;
+# `olistZoom(gd)` se puede volver a llamar tras `Plotly.react`.
+ZOOM_SCRIPT = """
+function olistZoom(gd) {
+  if (gd._olistZoom) { return; }
+  gd._olistZoom = true;
+  gd.on('plotly_relayout', function (event) {
+    var zoom = gd.layout.meta && gd.layout.meta.zoom;
+    if (!zoom) { return; }
+    var range = zoom.range;
+    if (event['xaxis.range[0]'] !== undefined) {
+      range = [Date.parse(event['xaxis.range[0]']), Date.parse(event['xaxis.range[1]'])];
+    } else if (event['xaxis.range']) {
+      range = event['xaxis.range'].map(function (value) { return Date.parse(value); });
+    } else if (!event['xaxis.autorange']) {
+      return;
+    }
+    var span = (range[1] - range[0]) / 86400000;
+    var level = zoom.levels[zoom.levels.length - 1];
+    for (var i = 0; i < zoom.levels.length; i++) {
+      if (span / zoom.days[i] <= zoom.max_points) { level = zoom.levels[i]; break; }
+    }
+    var visible = gd.data.map(function (trace) { return trace.meta === level; });
+    var changed = gd.data.some(function (trace, i) {
+      return (trace.visible !== false) !== visible[i];
+    });
+    if (changed) { Plotly.restyle(gd, {visible: visible}); }
+  });
+}
+document.querySelectorAll('.js-plotly-plot').forEach(olistZoom);
+"""
+
+
+def _level_for(span_days, levels, max_points):
+    for level in levels:
+        if span_days / PERIOD_DAYS[level] <= max_points:
+            return level
+    return levels[-1]
+
+
+def _milliseconds(dates):
+    return dates.astype('datetime64[ms]').astype(np.int64).astype(np.float64)
+
+
+def _series(cube, measure, by, freq, groups, normalize):
+    """Arreglos (x, {grupo: y}) de `measure` por periodo, alineados en x."""
+    frame = cube.rollup(freq, by=[by] if by else [])
+    periods = np.unique(frame['period'].to_numpy())
+    positions = np.searchsorted(periods, frame['period'].to_numpy())
+    values = {}
+    for group in groups:
+        mask = np.ones(len(frame), dtype=bool) if by is None \
+            else (frame[by] == group).to_numpy()
+        y = np.zeros(len(periods), dtype=np.float64)
+        y[positions[mask]] = frame[measure].to_numpy(dtype=np.float64)[mask]
+        values[group] = y
+    if normalize:
+        total = np.sum(list(values.values()), axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            values = {group: y / total * 100.0 for group, y in values.items()}
+    return _milliseconds(periods), values
+
+
+def time_series(cube, measure='orders', by=None, kind='bar', levels=None,
+                max_points=None, normalize=False, groups=None, title=None,
+                labels=None):
+    """
+    Figura de Plotly con la serie de `measure` (`orders`, `total_sales` o
+    `delta_days_mean`) del cubo, desglosada por `by` (`delay_status`,
+    `geolocation_state` o None).
+
+    `kind` es 'bar' (barras apiladas), 'line' o 'area' (áreas apiladas con
+    WebGL). `levels` son las frecuencias entre las que se cambia con el zoom.
+    """
+    import plotly.graph_objects as go
+
+    labels = labels or {}
+    levels = tuple(levels or DEFAULT_LEVELS[kind])
+    max_points = max_points or DEFAULT_MAX_POINTS[kind]
+    if groups is None:
+        groups = [None] if by is None else list(
+            cube.categories if by == 'delay_status' else cube.states)
+
+    span = (cube.orders.shape[0] or 1)
+    initial = _level_for(span, levels, max_points)
+
+    traces = []
+    for level in levels:
+        x, values = _series(cube, measure, by, level, groups, normalize)
+        stack = np.zeros_like(x)
+        for i, group in enumerate(groups):
+            y = values[group]
+            name = labels.get(measure, measure) if group is None else str(group)
+            common = dict(
+                name=name,
+                legendgroup=name,
+                meta=level,
+                visible=level == initial,
+                )
+            color = PLOTLY_COLORS[i % len(PLOTLY_COLORS)]
+            if kind == 'bar':
+                traces.append(go.Bar(
+                    x=x, y=y, marker_color=color, **common))
+            elif kind == 'line':
+                traces.append(go.Scattergl(
+                    x=x, y=y, mode='lines', line=dict(color=color), **common))
+            else:
+                # Scattergl no tiene `stackgroup`: se apila a mano y cada
+                # área se rellena hasta la anterior del mismo nivel
+                stack = stack + np.nan_to_num(y)
+                traces.append(go.Scattergl(
+                    x=x, y=stack.copy(), mode='lines', line=dict(color=color, width=1),
+                    fill='tozeroy' if i == 0 else 'tonexty',
+                    customdata=y,
+                    hovertemplate='%{customdata:,.2f}<extra>' + name + '</extra>',
+                    **common))
+
+    fig = go.Figure()
+    fig.add_traces(traces)
+    first = cube.start.astype('datetime64[ms]').astype(np.int64)
+    last = (cube.start + max(cube.orders.shape[0], 1)).astype('datetime64[ms]').astype(np.int64)
+    fig.update_layout(
+        title=title,
+        barmode='stack',
+        xaxis=dict(type='date', title=labels.get('period', 'Periodo')),
+        yaxis_title=labels.get(measure, measure),
+        legend_title=labels.get(by, by) if by else None,
+        meta={'zoom': {
+            'levels': list(levels),
+            'days': [PERIOD_DAYS[level] for level in levels],
+            'max_points': max_points,
+            'initial': initial,
+            'range': [int(first), int(last)],
+        }},
+        )
+    return fig
+
+
+def write_chart(fig, path, title=None):
+    """`olist_report.write_report` con el cambio de frecuencia al hacer zoom."""
+    from olist_report import write_report
+
+    return write_report(fig, path, title=title, post_script=ZOOM_SCRIPT)
+
+
+def write_charts(figs, path, title='Oilst'):
+    """`olist_report.write_dashboard` con el cambio de frecuencia al hacer zoom."""
+    from olist_report import write_dashboard
+
+    return write_dashboard(figs, path, title=title, post_script=ZOOM_SCRIPT)
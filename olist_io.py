@@ -0,0 +1,233 @@
+"""
+Rutas y lectura del archivo consolidado compartidas por los módulos `olist_*`.
+
+Los notebooks definen `DATA_PATH` a mano; los módulos que se ejecutan como
+programas la toman de la variable de entorno `OLIST_DATA_PATH` (por defecto,
+el directorio actual).
+
+Además de `oilst_processed.csv`, la consolidación publica la misma tabla en
+`oilst_processed.arrow` (Arrow IPC / Feather v2 sin compresión). Ese archivo
+se abre con `mmap`: las columnas son vistas de solo lectura sobre el archivo
+(sin interpretar texto ni copiar), así que varios procesos que lo leen a la
+vez comparten las mismas páginas del caché del sistema operativo y la
+lectura solo toca las columnas que se usan. Para que la conversión a pandas
+no copie, las fechas y los reales se guardan sin máscara de nulos (NaT y
+NaN quedan como valores) y los periodos como enteros de `olist_periods.py`.
+Los dos caminos regresan los mismos tipos, los de leer el CSV: fechas en
+`datetime64[us]`, enteros en `int64`, códigos postales como texto ('01001',
+no 1001) y las columnas categóricas, como `delay_status`, como su texto.
+`load_processed` usa el archivo Arrow si salió del CSV actual (según el
+manifiesto de `olist_manifest.py`, o si no hay manifiesto, si no es más
+viejo que el CSV); si no, lee el CSV.
+
+Ejemplo:
+
+    from olist_io import load_processed, write_arrow
+
+    write_arrow(load_processed(DATA_PATH), DATA_PATH)
+    oilst = load_processed(DATA_PATH, columns=['delay_status', 'total_sales'])
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from olist_periods import PERIOD_COLUMNS, as_month_index, format_period_columns
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.environ.get('OLIST_DATA_PATH', '.')
+
+FILE_CONSOLIDATED_DATA = 'oilst_processed.csv'
+FILE_CONSOLIDATED_ARROW = 'oilst_processed.arrow'
+FILE_GEODATA = 'brasil_geodata.json'
+
+# Metadato del archivo Arrow con el sha256 del CSV del que salió
+ARROW_SOURCE_KEY = 'olist_source_sha256'
+FILE_REGIONS = 'brasil_regions.csv'
+
+COLUMNS_DATES = [
+    'order_purchase_timestamp',
+    'order_approved_at',
+    'order_delivered_carrier_date',
+    'order_delivered_customer_date',
+    'order_estimated_delivery_date'
+    ]
+
+DATE_DTYPE = 'datetime64[us]'
+
+# Columnas que se leen como texto aunque parezcan números
+COLUMNS_TEXT = [
+    'customer_zip_code_prefix',
+    'geolocation_zip_code_prefix',
+    ]
+
+
+def _as_csv_read(values):
+    """`values` con el tipo que tiene la columna al leerla del CSV."""
+    dtype = values.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        # El texto de la categoría, no sus códigos
+        return values.astype(dtype.categories.dtype)
+    if values.name in COLUMNS_TEXT:
+        return values.astype('str')
+    if isinstance(dtype, np.dtype):
+        if dtype.kind == 'M':
+            return values.astype(DATE_DTYPE)
+        if dtype.kind in 'iu':
+            return values.astype(np.int64)
+        if dtype.kind == 'f':
+            return values.astype(np.float64)
+    return values
+
+
+def as_loaded(frame):
+    """
+    Copia de `frame` (por ejemplo `results` de la consolidación) con los
+    tipos que regresa `load_processed`.
+    """
+    columns = {}
+    for column in frame.columns:
+        values = frame[column]
+        if column in PERIOD_COLUMNS:
+            columns[column] = as_month_index(values, PERIOD_COLUMNS[column])
+        else:
+            columns[column] = _as_csv_read(values)
+    return pd.DataFrame(columns, index=frame.index)
+
+
+def _arrow_array(values):
+    """Columna de Arrow que se vuelve a convertir a pandas sin copiar."""
+    import pyarrow as pa
+
+    if isinstance(values.dtype, np.dtype) and values.dtype.kind in 'iufbmM':
+        # Sin máscara de nulos: NaN y NaT se guardan como valores
+        data = np.ascontiguousarray(values.to_numpy())
+        return pa.Array.from_buffers(
+            pa.from_numpy_dtype(data.dtype), len(data), [None, pa.py_buffer(data)])
+    return pa.array(values, from_pandas=True)
+
+
+def write_arrow(frame, data_path=None, source_sha256=None):
+    """
+    Escribe `frame` en `oilst_processed.arrow` (sin compresión); regresa la
+    ruta. Se escribe en un archivo temporal y se renombra, así los procesos
+    que tienen abierto el archivo anterior lo siguen leyendo completo.
+
+    `source_sha256` (el del CSV en `olist_manifest.py`) se guarda en los
+    metadatos del archivo para saber de qué CSV salió.
+    """
+    import pyarrow as pa
+    import pyarrow.feather as feather
+
+    path = os.path.join(data_path or DATA_PATH, FILE_CONSOLIDATED_ARROW)
+    loaded = as_loaded(frame)
+    columns = {column: _arrow_array(loaded[column]) for column in loaded.columns}
+    temporary = f'{path}.{os.getpid()}.tmp'
+    # Un solo lote de filas: con varios, pandas tendría que concatenarlos
+    table = pa.table(columns).combine_chunks()
+    if source_sha256 is not None:
+        table = table.replace_schema_metadata({ARROW_SOURCE_KEY: source_sha256})
+    feather.write_feather(
+        table, temporary,
+        compression='uncompressed', chunksize=max(len(frame), 1))
+    os.replace(temporary, path)
+    return path
+
+
+def arrow_source(path):
+    """sha256 del CSV del que salió el archivo Arrow `path` (None si no se guardó)."""
+    import pyarrow as pa
+    import pyarrow.ipc as ipc
+
+    with pa.memory_map(path) as source:
+        metadata = ipc.open_file(source).schema.metadata or {}
+    source = metadata.get(ARROW_SOURCE_KEY.encode())
+    return source.decode() if source else None
+
+
+def _arrow_path(data_path):
+    """
+    Ruta del archivo Arrow si existe y está al día: si el manifiesto
+    (`olist_manifest.py`) describe el CSV actual, el Arrow debe venir de ese
+    CSV; si no, no debe ser más viejo que el CSV.
+    """
+    arrow = os.path.join(data_path, FILE_CONSOLIDATED_ARROW)
+    csv = os.path.join(data_path, FILE_CONSOLIDATED_DATA)
+    if not os.path.exists(arrow):
+        return None
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return None
+    from olist_manifest import manifest_digest
+
+    digest = manifest_digest(csv)
+    source = arrow_source(arrow)
+    if digest is not None and source is not None:
+        return arrow if source == digest else None
+    if os.path.exists(csv) and os.path.getmtime(csv) > os.path.getmtime(arrow):
+        return None
+    return arrow
+
+
+def load_arrow(path, columns=None):
+    """Dataframe con vistas (solo lectura) sobre el archivo Arrow `path`."""
+    import pyarrow.feather as feather
+
+    table = feather.read_table(path, columns=columns, memory_map=True)
+    return table.to_pandas(split_blocks=True)
+
+
+def load_processed(data_path=None, columns=None, period_text=False):
+    """
+    Lee la tabla consolidada (solo `columns`, si se indican), del archivo
+    Arrow si está al día o de `oilst_processed.csv`. `quarter` y `year_month`
+    quedan como meses desde 1970 (`olist_periods.py`) o, con `period_text`,
+    como el texto del CSV ('2017Q2', '2017-05').
+    """
+    data_path = data_path or DATA_PATH
+    arrow = _arrow_path(data_path)
+    if arrow is not None:
+        oilst = load_arrow(arrow, columns)
+        return format_period_columns(oilst) if period_text else oilst
+
+    path = os.path.join(data_path, FILE_CONSOLIDATED_DATA)
+    dates = [
+        column for column in COLUMNS_DATES
+        if columns is None or column in columns
+        ]
+    text = {
+        column: 'str' for column in COLUMNS_TEXT
+        if columns is None or column in columns
+        }
+    oilst = pd.read_csv(path, usecols=columns, parse_dates=dates, dtype=text)
+    if columns is not None:
+        # En el orden pedido, como el archivo Arrow (no en el del CSV)
+        oilst = oilst[list(columns)]
+    for column in dates:
+        oilst[column] = oilst[column].astype(DATE_DTYPE)
+    for column, freq in PERIOD_COLUMNS.items():
+        if column in oilst:
+            oilst[column] = as_month_index(oilst[column], freq)
+    return format_period_columns(oilst) if period_text else oilst
+
+
+if __name__ == '__main__':
+    import tempfile
+
+    from olist_export import export_csv
+    from olist_synthetic import generate_processed
+
+    # El CSV y el archivo Arrow regresan el mismo dataframe
+    results = generate_processed(n_orders=20_000, seed=1)
+    with tempfile.TemporaryDirectory() as folder:
+        export_csv(format_period_columns(results),
+                   os.path.join(folder, FILE_CONSOLIDATED_DATA))
+        subset = ['delay_status', 'customer_zip_code_prefix', 'order_approved_at',
+                  'year_month']
+        from_csv = [load_processed(folder), load_processed(folder, subset, True)]
+        write_arrow(results, folder)
+        from_arrow = [load_processed(folder), load_processed(folder, subset, True)]
+        for csv_frame, arrow_frame in zip(from_csv, from_arrow):
+            pd.testing.assert_frame_equal(csv_frame, arrow_frame)
+    print('load_processed: CSV y Arrow con los mismos tipos')
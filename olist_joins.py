@@ -0,0 +1,107 @@
+"""
+Uniones con la cardinalidad declarada y verificada antes de unir.
+
+Un `merge(..., how='left')` contra una tabla cuya llave está repetida
+multiplica en silencio las filas de la izquierda: la tabla crece en memoria
+y cada `total_sales` repetido se suma dos veces en las tablas dinámicas.
+`checked_merge` recibe la relación esperada entre las tablas:
+
+* `'1:1'`: la llave no se repite en ninguna de las dos tablas,
+* `'m:1'`: la llave no se repite en la tabla derecha (cada fila de la
+  izquierda encuentra a lo más una),
+* `'1:m'`: la llave no se repite en la tabla izquierda,
+* `'m:m'`: sin restricción,
+
+y antes de unir revisa con un `factorize` de la llave (una tabla hash, sin
+construir el resultado ni recorrerlo con `duplicated()`) que el lado que
+debe ser único lo sea. Si no, lanza `JoinCardinalityError` con las llaves
+repetidas y cuántas veces aparecen, sin haber reservado la tabla unida.
+
+Ejemplo:
+
+    from olist_joins import checked_merge
+
+    results = checked_merge(
+        orders_totals, customers_geolocation_estado, 'm:1',
+        on='customer_id', how='left')
+"""
+import numpy as np
+import pandas as pd
+
+RELATIONSHIPS = ('1:1', 'm:1', '1:m', 'm:m')
+
+# Llaves repetidas que se muestran en el error
+SAMPLE_SIZE = 5
+
+
+class JoinCardinalityError(ValueError):
+    """La llave de un lado de la unión se repite; `duplicates` las cuenta."""
+
+    def __init__(self, side, on, duplicates):
+        self.side = side
+        self.on = on
+        self.duplicates = duplicates
+        sample = ', '.join(
+            f'{key!r} ({count})'
+            for key, count in duplicates.head(SAMPLE_SIZE).items())
+        super().__init__(
+            f"{len(duplicates):,} llaves repetidas en la tabla {side} "
+            f"({', '.join(on)}): {sample}")
+
+
+def _as_list(columns):
+    return [columns] if isinstance(columns, str) else list(columns)
+
+
+def key_counts(frame, on):
+    """
+    Llaves de `frame` (columnas `on`) que aparecen más de una vez y cuántas
+    veces, como `Series`; los nulos cuentan como llave, igual que en `merge`.
+    """
+    on = _as_list(on)
+    codes, uniques = pd.factorize(frame[on[0]], use_na_sentinel=False)
+    if len(on) > 1:
+        # Combina los códigos de cada columna en uno solo por fila
+        for column in on[1:]:
+            column_codes, _ = pd.factorize(frame[column], use_na_sentinel=False)
+            codes, _ = pd.factorize(
+                codes.astype(np.int64) * (column_codes.max(initial=0) + 1)
+                + column_codes)
+    counts = np.bincount(codes)
+    if len(counts) == len(codes):
+        # Tantas llaves distintas como filas: ninguna se repite
+        return pd.Series([], dtype=np.int64, name='count')
+    repeated = np.flatnonzero(counts > 1)
+    if len(on) == 1:
+        index = pd.Index(np.asarray(uniques)[repeated], name=on[0])
+    else:
+        # Primera fila de cada llave repetida
+        first = np.unique(codes, return_index=True)[1][repeated]
+        index = pd.MultiIndex.from_frame(frame[on].iloc[first])
+    return pd.Series(counts[repeated], index=index, name='count') \
+        .sort_values(ascending=False)
+
+
+def check_unique(frame, on, side='derecha'):
+    """Lanza `JoinCardinalityError` si la llave `on` se repite en `frame`."""
+    duplicates = key_counts(frame, on)
+    if len(duplicates):
+        raise JoinCardinalityError(side, _as_list(on), duplicates)
+
+
+def checked_merge(left, right, relationship='m:1', on=None, left_on=None,
+                  right_on=None, **kwargs):
+    """
+    `left.merge(right, ...)` verificando antes la relación `relationship`
+    ('1:1', 'm:1', '1:m' o 'm:m') entre las llaves de ambas tablas.
+    """
+    if relationship not in RELATIONSHIPS:
+        raise ValueError(
+            f"relación desconocida {relationship!r}; opciones: {', '.join(RELATIONSHIPS)}")
+    left_keys = left_on if on is None else on
+    right_keys = right_on if on is None else on
+    if relationship in ('1:1', 'm:1'):
+        check_unique(right, right_keys, 'derecha')
+    if relationship in ('1:1', '1:m'):
+        check_unique(left, left_keys, 'izquierda')
+    return left.merge(right, on=on, left_on=left_on, right_on=right_on, **kwargs)
@@ -0,0 +1,257 @@
+"""
+Manifiesto de la tabla consolidada: particiones, checksums y entradas.
+
+Para saber si `oilst_processed.csv` cambió o se corrompió había que volver
+a leerlo completo (la huella sha256 del pipeline) y nada registraba de qué
+archivos de Olist salió. Al consolidar se escribe junto al CSV
+`oilst_processed.manifest.json` con:
+
+* `inputs`: tamaño y sha256 de cada archivo de Olist que se leyó,
+* `outputs`: por archivo escrito, su tamaño, filas, sha256, el rango de
+  `order_purchase_timestamp` y sus particiones: los bloques de filas que
+  escribe `olist_export.py`, cada uno con su posición en el archivo
+  (`offset`, `bytes`), filas, sha256 y rango de fechas.
+
+El manifiesto no guarda fechas de ejecución ni rutas absolutas: las mismas
+entradas producen el mismo archivo. Quien lo lee confía en él solo si el
+archivo descrito tiene el tamaño registrado y no es más nuevo que el
+manifiesto (`manifest_digest`); así:
+
+* el pipeline usa el sha256 registrado en lugar de volver a leer el CSV,
+* `load_processed` usa el archivo Arrow solo si se generó a partir de ese
+  mismo CSV (`olist_io.py`),
+* `verify_manifest` revisa tamaños y vuelve a calcular el sha256 solo de
+  las particiones de los archivos modificados después del manifiesto (o de
+  todas, con `full=True`), e indica cuáles ya no coinciden,
+* `changed_partitions` compara dos manifiestos y regresa las particiones
+  que cambiaron; la etapa `export` del pipeline solo vuelve a comprimir
+  esas.
+
+Ejemplo:
+
+    from olist_manifest import verify_manifest
+
+    report = verify_manifest(DATA_PATH)
+    report[report['status'] != 'ok']
+
+o desde la terminal:
+
+    python olist_manifest.py [--data-path RUTA] [--full]
+"""
+import argparse
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from olist_io import DATA_PATH, FILE_CONSOLIDATED_DATA
+
+FILE_MANIFEST = 'oilst_processed.manifest.json'
+MANIFEST_VERSION = 1
+
+# Columna cuyo rango se registra por archivo y por partición
+RANGE_COLUMN = 'order_purchase_timestamp'
+
+REPORT_COLUMNS = ['file', 'partition', 'status', 'detail']
+
+
+def file_sha256(path, offset=0, length=None):
+    """sha256 de `length` bytes de `path` desde `offset` (todo, por defecto)."""
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        remaining = float('inf') if length is None else length
+        while remaining > 0:
+            block = f.read(int(min(1 << 20, remaining)))
+            if not block:
+                break
+            sha.update(block)
+            remaining -= len(block)
+    return sha.hexdigest()
+
+
+def _date_range(values):
+    """`[mínimo, máximo]` de una columna de fechas como texto ISO."""
+    values = values.dropna()
+    if not len(values):
+        return [None, None]
+    return [values.min().isoformat(), values.max().isoformat()]
+
+
+def output_entry(path, frame, partitions):
+    """
+    Entrada de `outputs` para el archivo `path`, escrito desde `frame` con
+    `export_csv(..., partitions=partitions)`.
+    """
+    entry = {
+        'bytes': os.path.getsize(path),
+        'rows': len(frame),
+        'sha256': file_sha256(path),
+        'partitions': [],
+    }
+    dates = frame[RANGE_COLUMN] if RANGE_COLUMN in frame else None
+    if dates is not None:
+        entry[RANGE_COLUMN] = _date_range(dates)
+    start = 0
+    for partition in partitions:
+        partition = dict(partition)
+        if dates is not None:
+            partition[RANGE_COLUMN] = _date_range(
+                dates.iloc[start:start + partition['rows']])
+        start += partition['rows']
+        entry['partitions'].append(partition)
+    return entry
+
+
+def input_entries(paths):
+    """Tamaño y sha256 de los archivos de entrada `paths` que existen."""
+    entries = {}
+    for path in sorted(paths):
+        if os.path.exists(path):
+            entries[os.path.basename(path)] = {
+                'bytes': os.path.getsize(path), 'sha256': file_sha256(path)}
+    return entries
+
+
+def write_manifest(path, frame, partitions, inputs):
+    """
+    Escribe junto a `path` (escrito desde `frame` con
+    `export_csv(..., partitions=partitions)`) su manifiesto, con los
+    archivos de entrada `inputs`; regresa el manifiesto.
+    """
+    folder, filename = os.path.split(path)
+    manifest = {
+        'version': MANIFEST_VERSION,
+        'inputs': input_entries(inputs),
+        'outputs': {filename: output_entry(path, frame, partitions)},
+    }
+    target = os.path.join(folder, FILE_MANIFEST)
+    temporary = f'{target}.{os.getpid()}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+        f.write('\n')
+    # Se escribe después de `path`: su fecha no es anterior a la del CSV
+    os.replace(temporary, target)
+    return manifest
+
+
+def read_manifest(data_path=None):
+    """Manifiesto de `data_path` (None si no existe o no se puede leer)."""
+    path = os.path.join(data_path or DATA_PATH, FILE_MANIFEST)
+    try:
+        with open(path, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+    return manifest if manifest.get('version') == MANIFEST_VERSION else None
+
+
+def _modified_after(path, manifest_path):
+    return os.stat(path).st_mtime_ns > os.stat(manifest_path).st_mtime_ns
+
+
+def manifest_digest(path):
+    """
+    sha256 de `path` según el manifiesto de su carpeta, sin leer el archivo;
+    None si no aparece, si su tamaño no coincide o si se modificó después de
+    escribir el manifiesto.
+    """
+    folder, filename = os.path.split(os.path.abspath(path))
+    manifest = read_manifest(folder)
+    entry = manifest and manifest['outputs'].get(filename)
+    if not entry:
+        return None
+    try:
+        if os.path.getsize(path) != entry['bytes'] \
+                or _modified_after(path, os.path.join(folder, FILE_MANIFEST)):
+            return None
+    except FileNotFoundError:
+        return None
+    return entry['sha256']
+
+
+def changed_partitions(previous, current, filename=FILE_CONSOLIDATED_DATA):
+    """
+    Índices de las particiones de `filename` en `current` cuyo sha256 no
+    está en la misma posición de `previous` (todas, si no hay manifiesto
+    anterior).
+    """
+    partitions = current['outputs'][filename]['partitions']
+    before = (previous or {}).get('outputs', {}).get(filename, {}).get('partitions', [])
+    return [
+        index for index, partition in enumerate(partitions)
+        if index >= len(before) or before[index]['sha256'] != partition['sha256']
+        ]
+
+
+def verify_manifest(data_path=None, full=False):
+    """
+    Reporte (`file`, `partition`, `status`, `detail`) de los archivos del
+    manifiesto: `ok`, `falta`, `tamaño distinto`, `checksum distinto` (por
+    partición) o, para las entradas, `cambió` (la tabla está desactualizada).
+
+    Solo se vuelven a leer los archivos modificados después del manifiesto,
+    o todos con `full`.
+    """
+    data_path = data_path or DATA_PATH
+    manifest = read_manifest(data_path)
+    if manifest is None:
+        raise FileNotFoundError(
+            f'{os.path.join(data_path, FILE_MANIFEST)}: no existe o no es válido')
+    manifest_path = os.path.join(data_path, FILE_MANIFEST)
+    rows = []
+
+    def row(filename, partition, status, detail=''):
+        rows.append({'file': filename, 'partition': partition,
+                     'status': status, 'detail': detail})
+
+    for filename, entry in manifest['inputs'].items():
+        path = os.path.join(data_path, filename)
+        if not os.path.exists(path):
+            row(filename, None, 'falta')
+        elif os.path.getsize(path) != entry['bytes'] or (
+                (full or _modified_after(path, manifest_path))
+                and file_sha256(path) != entry['sha256']):
+            row(filename, None, 'cambió', 'la tabla consolidada está desactualizada')
+        else:
+            row(filename, None, 'ok')
+
+    for filename, entry in manifest['outputs'].items():
+        path = os.path.join(data_path, filename)
+        if not os.path.exists(path):
+            row(filename, None, 'falta')
+            continue
+        size = os.path.getsize(path)
+        if size != entry['bytes']:
+            row(filename, None, 'tamaño distinto',
+                f"{size:,} bytes, se esperaban {entry['bytes']:,}")
+        elif not (full or _modified_after(path, manifest_path)):
+            row(filename, None, 'ok', 'sin cambios desde el manifiesto')
+            continue
+        for index, partition in enumerate(entry['partitions']):
+            if file_sha256(path, partition['offset'], partition['bytes']) \
+                    == partition['sha256']:
+                row(filename, index, 'ok')
+            else:
+                row(filename, index, 'checksum distinto',
+                    f"bytes {partition['offset']:,} a "
+                    f"{partition['offset'] + partition['bytes']:,}")
+    return pd.DataFrame(rows, columns=REPORT_COLUMNS).astype({'partition': 'Int64'})
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--data-path', default=DATA_PATH)
+    parser.add_argument('--full', action='store_true',
+                        help='vuelve a calcular el sha256 de todas las particiones')
+    args = parser.parse_args(argv)
+
+    report = verify_manifest(args.data_path, args.full)
+    print(report.to_string(index=False))
+    if (report['status'] != 'ok').any():
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+"""
+Periodos (mes y trimestre) como enteros pequeños: meses desde enero de 1970.
+
+`.dt.to_period('M')` y `.dt.to_period('Q')` crean columnas de objetos
+`Period` que al escribirse en CSV se vuelven texto ('2017-05', '2017Q2'), y
+cada lectura las trae como texto que hay que volver a convertir
+(`.astype(str)`, `pd.Period(...)`). Aquí un periodo es el número de meses
+desde enero de 1970 de su primer mes, en `int16`:
+
+* `year_month` de mayo de 2017 -> 568, `quarter` 2017Q2 -> 567 (abril),
+* los `groupby` por periodo son `groupby` por enteros,
+* el texto se genera solo para mostrar o exportar (`format_months`), con
+  operaciones vectorizadas sobre los periodos distintos.
+
+Ejemplo:
+
+    from olist_periods import month_index, quarter_index, format_months
+
+    orders['year_month'] = month_index(orders['order_purchase_timestamp'])
+    orders['quarter'] = quarter_index(orders['order_purchase_timestamp'])
+    sales = orders.groupby('quarter')['total_sales'].sum()
+    sales.index = format_months(sales.index, 'Q')
+"""
+import numpy as np
+import pandas as pd
+
+# Columnas de periodos del archivo consolidado y su frecuencia
+PERIOD_COLUMNS = {'quarter': 'Q', 'year_month': 'M'}
+
+# Meses por periodo de cada frecuencia
+_MONTHS = {'M': 1, 'Q': 3}
+
+
+def _as_series(result, values):
+    if isinstance(values, pd.Series):
+        return pd.Series(result, index=values.index, name=values.name)
+    return result
+
+
+def _from_months(months, missing):
+    """Arreglo int16 (o Int16 de pandas si hay nulos) de meses desde 1970."""
+    months = np.where(missing, 0, months)
+    info = np.iinfo(np.int16)
+    if len(months) and (months.min() < info.min or months.max() > info.max):
+        raise ValueError('meses fuera del rango de int16')
+    months = months.astype(np.int16)
+    if not missing.any():
+        return months
+    result = pd.array(months, dtype='Int16')
+    result[missing] = pd.NA
+    return result
+
+
+def month_index(dates, freq='M'):
+    """
+    Mes (desde enero de 1970) en que empieza el periodo `freq` ('M' o 'Q')
+    de cada fecha; las fechas nulas quedan como nulos.
+    """
+    days = np.asarray(dates, dtype='datetime64[ns]')
+    missing = np.isnat(days)
+    months = days.astype('datetime64[M]').astype(np.int64)
+    months -= months % _MONTHS[freq]
+    return _as_series(_from_months(months, missing), dates)
+
+
+def quarter_index(dates):
+    """Mes (desde enero de 1970) en que empieza el trimestre de cada fecha."""
+    return month_index(dates, 'Q')
+
+
+def as_month_index(values, freq='M'):
+    """
+    Índice de meses de una columna de periodos en cualquiera de sus formas:
+    enteros (sin cambios), fechas, objetos `Period` o su texto ('2017-05',
+    '2017Q2'). El texto se interpreta una vez por valor distinto.
+    """
+    series = values if isinstance(values, pd.Series) else pd.Series(values)
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return values
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        return month_index(values, freq)
+    if isinstance(series.dtype, pd.PeriodDtype):
+        periods = pd.PeriodIndex(series.array)
+    else:
+        codes, uniques = pd.factorize(series)
+        parsed = pd.PeriodIndex(pd.Series(uniques, dtype=object), freq=freq)
+        periods = parsed.take(codes, allow_fill=True, fill_value=pd.NaT)
+    missing = np.asarray(periods.isna())
+    months = periods.asfreq('M', how='start').asi8
+    return _as_series(_from_months(months, missing), values)
+
+
+def format_months(months, freq='M'):
+    """
+    Texto de cada periodo, como lo escribe pandas para `Period`: '2017-05'
+    con `freq='M'` y '2017Q2' con `freq='Q'`. Los nulos quedan como NaN.
+    """
+    series = months if isinstance(months, pd.Series) else pd.Series(months)
+    codes, uniques = pd.factorize(series)
+    uniques = np.asarray(uniques, dtype=np.int64)
+    years = (1970 + uniques // 12).astype(str)
+    month = uniques % 12
+    if freq == 'Q':
+        labels = np.char.add(np.char.add(years, 'Q'), (month // 3 + 1).astype(str))
+    else:
+        labels = np.char.add(np.char.add(years, '-'), np.char.zfill((month + 1).astype(str), 2))
+    labels = np.append(labels.astype(object), np.nan)
+    result = labels[codes]
+    if isinstance(months, pd.Series):
+        return pd.Series(result, index=months.index, name=months.name)
+    if isinstance(months, pd.Index):
+        return pd.Index(result, name=months.name)
+    return result
+
+
+def to_period(months, freq='M'):
+    """`PeriodIndex` de frecuencia `freq` para los meses `months`."""
+    series = months if isinstance(months, pd.Series) else pd.Series(months)
+    missing = series.isna().to_numpy()
+    ordinals = series.fillna(0).to_numpy(dtype=np.int64)
+    periods = pd.PeriodIndex.from_ordinals(ordinals, freq='M').asfreq(freq)
+    return periods.where(~missing)
+
+
+def format_period_columns(frame, columns=None):
+    """
+    `frame` con las columnas de periodos (enteros) como texto; las demás
+    columnas no se copian.
+    """
+    columns = PERIOD_COLUMNS if columns is None else columns
+    return frame.assign(**{
+        column: format_months(frame[column], freq)
+        for column, freq in columns.items()
+        if column in frame and pd.api.types.is_integer_dtype(frame[column].dtype)
+        })
@@ -0,0 +1,608 @@
+"""
+Ejecución de las etapas del proyecto como un grafo de dependencias.
+
+Los scripts se ejecutaban a mano y en orden (`1_1` genera el archivo
+consolidado; `1_2`, `1_3`, `1_4` y `3_a`–`3_e` lo consumen). Aquí cada etapa
+declara los archivos que lee y los que escribe:
+
+    ingest         archivos de Olist -> .cache/pipeline/sources.pkl
+    consolidate    sources.pkl -> oilst_processed.csv y su manifiesto
+                   (particiones, sha256 y entradas, `olist_manifest.py`)
+    publish        oilst_processed.csv -> oilst_processed.arrow (Arrow IPC
+                   que los consumidores abren con mmap, `olist_io.py`)
+    distinct       oilst_processed.csv -> olist_distinct_customers.npz
+                   (sketches HyperLogLog de clientes, `olist_hll.py`)
+    daily          oilst_processed.csv -> olist_daily_metrics.npz (series
+                   diarias de retrasos; agrega solo los días nuevos,
+                   `olist_timeseries.py`)
+    export         oilst_processed.csv -> oilst_processed.csv.gz para
+                   entregar (`olist_export.py`, por bloques en paralelo;
+                   solo comprime las particiones que cambiaron según el
+                   manifiesto)
+    aggregate      oilst_processed.csv -> .cache/pipeline/order_cube.npz
+    compact        oilst_processed.csv -> .cache/pipeline/oilst_compact.pkl
+                   y el reporte de memoria por columna (`olist_compact.py`)
+    risk           oilst_processed.csv -> modelo de riesgo de `long_delay`
+                   y la calificación de las órdenes abiertas
+                   (`olist_risk.py`, solo con scikit-learn)
+    table:<nombre>     oilst_processed.csv -> tabla .csv (`olist_tables.py`)
+    figure:<nombre>    oilst_processed.csv -> figura PNG/HTML (`olist_render.py`)
+
+Las dependencias salen de esas declaraciones: una etapa depende de la que
+escribe alguno de sus archivos de entrada. El código de cada etapa (sus
+módulos `olist_*.py`) también cuenta como entrada.
+
+Como `make`, pero por contenido: `.cache/pipeline/state.json` guarda la
+huella sha256 de las entradas y salidas de cada etapa. Una etapa se vuelve
+a ejecutar solo si cambió alguna entrada o falta o cambió alguna salida; si
+una etapa produce exactamente el mismo archivo, las siguientes no se
+ejecutan. Las etapas independientes corren en paralelo y el archivo
+consolidado se lee una sola vez por ejecución.
+
+Uso:
+
+    python olist_pipeline.py [--data-path RUTA] [--jobs N] [--force]
+                             [--dry-run] [--profile CARPETA [--cprofile]
+                             [--memory]] [etapa ...]
+
+Con `--profile`, cada etapa (y los pasos internos de la consolidación) se
+mide con `olist_profile.py` y la traza se escribe en CARPETA.
+"""
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from olist_io import (
+    BASE_PATH, DATA_PATH, FILE_CONSOLIDATED_ARROW, FILE_CONSOLIDATED_DATA, FILE_GEODATA)
+from olist_manifest import manifest_digest
+from olist_profile import stage as profile_stage
+
+PIPELINE_PATH = os.path.join(BASE_PATH, '.cache', 'pipeline')
+FILE_SOURCES = 'sources.pkl'
+FILE_CUBE = 'order_cube.npz'
+FILE_COMPACT = 'oilst_compact.pkl'
+FILE_COMPACT_REPORT = 'compact_report.csv'
+FILE_STATE = 'state.json'
+# Manifiesto y miembros comprimidos de la última exportación
+FILE_EXPORT_STATE = 'export_partitions.json'
+
+# Copia comprimida del archivo consolidado para entregar (`olist_export.py`)
+FILE_EXPORT = FILE_CONSOLIDATED_DATA + '.gz'
+EXPORT_COMPRESSION = 'gzip'
+
+CUBE_COLUMNS = [
+    'order_status',
+    'order_purchase_timestamp',
+    'geolocation_state',
+    'delay_status',
+    'total_sales',
+    'delta_days',
+    ]
+
+
+def _code(*modules):
+    return [os.path.join(BASE_PATH, f'{module}.py') for module in modules]
+
+
+CONSOLIDATE_CODE = _code(
+    'olist_consolidate', 'olist_classify', 'olist_export', 'olist_io', 'olist_joins',
+    'olist_manifest', 'olist_periods')
+FIGURE_CODE = _code(
+    'olist_render', 'olist_boxplot', 'olist_classify', 'olist_cube', 'olist_geo',
+    'olist_interactive', 'olist_report')
+
+
+class Stage:
+    """Etapa: archivos que lee (`inputs`), que escribe (`outputs`) y cómo."""
+
+    def __init__(self, name, inputs, outputs, run, columns=None):
+        self.name = name
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.run = run
+        # Columnas del archivo consolidado que usa la etapa
+        self.columns = columns
+
+
+class Context:
+    """Rutas de la ejecución y lectura compartida del archivo consolidado."""
+
+    def __init__(self, data_path, output_path, pipeline_path, columns):
+        self.data_path = data_path
+        self.output_path = output_path
+        self.pipeline_path = pipeline_path
+        self.columns = columns
+        self._processed = None
+        self._lock = threading.Lock()
+
+    def processed(self):
+        """`oilst_processed.csv` con las columnas de todas las etapas (una lectura)."""
+        from olist_io import load_processed
+
+        with self._lock:
+            if self._processed is None:
+                self._processed = load_processed(self.data_path, columns=self.columns)
+            return self._processed
+
+    def invalidate(self):
+        with self._lock:
+            self._processed = None
+
+
+# ---------------------------------------------------------------------------
+# Acciones de cada etapa
+
+def _ingest(context, stage):
+    import pickle
+
+    from olist_consolidate import read_sources
+
+    with open(stage.outputs[0], 'wb') as f:
+        pickle.dump(read_sources(context.data_path), f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _consolidate(context, stage):
+    import pandas as pd
+
+    from olist_consolidate import consolidate, source_paths
+    from olist_export import export_csv
+    from olist_manifest import write_manifest
+    from olist_periods import format_period_columns
+
+    results = consolidate(**pd.read_pickle(stage.inputs[0]))
+    partitions = []
+    with profile_stage('to_csv', results):
+        export_csv(format_period_columns(results), stage.outputs[0], partitions=partitions)
+    with profile_stage('manifest'):
+        write_manifest(stage.outputs[0], results, partitions,
+                       source_paths(context.data_path))
+    context.invalidate()
+
+
+def _aggregate(context, stage):
+    from olist_cube import OrderCube
+
+    oilst = context.processed()
+    OrderCube.from_frame(oilst.query("order_status == 'delivered'")).save(stage.outputs[0])
+
+
+def _publish(context, stage):
+    from olist_io import load_processed, write_arrow
+
+    # El Arrow guarda el sha256 del CSV del que sale (olist_manifest)
+    write_arrow(load_processed(context.data_path), context.data_path,
+                manifest_digest(stage.inputs[0]))
+
+
+def _distinct(context, stage):
+    from olist_hll import DistinctCounter
+
+    DistinctCounter.from_frame(context.processed()).save(stage.outputs[0])
+
+
+def _daily(context, stage):
+    from olist_timeseries import update_daily_metrics
+
+    oilst = context.processed()
+    update_daily_metrics(oilst[oilst['order_status'] == 'delivered'], stage.outputs[0])
+
+
+def _export(context, stage):
+    from olist_export import compress_partitions, export_csv
+    from olist_io import load_processed
+    from olist_manifest import changed_partitions, read_manifest
+
+    output = stage.outputs[0]
+    manifest = read_manifest(context.data_path)
+    if manifest is None or manifest_digest(stage.inputs[0]) is None:
+        # Sin un manifiesto que describa el CSV actual no se conocen sus
+        # particiones: se vuelve a formatear la tabla completa
+        export_csv(load_processed(context.data_path, period_text=True), output,
+                   compression=EXPORT_COMPRESSION)
+        return
+
+    state_path = os.path.join(context.pipeline_path, FILE_EXPORT_STATE)
+    try:
+        with open(state_path, encoding='utf-8') as f:
+            previous = json.load(f)
+        stat = os.stat(output)
+        # Los miembros guardados solo sirven si `output` es el que se escribió
+        if [stat.st_mtime_ns, stat.st_size] != previous['output']:
+            previous = None
+    except (FileNotFoundError, ValueError, KeyError):
+        previous = None
+
+    partitions = manifest['outputs'][FILE_CONSOLIDATED_DATA]['partitions']
+    reuse = {}
+    if previous is not None:
+        changed = set(changed_partitions(previous['manifest'], manifest))
+        reuse = {
+            index: previous['members'][index]
+            for index in range(len(partitions)) if index not in changed
+            }
+    members = compress_partitions(
+        stage.inputs[0], partitions, output, EXPORT_COMPRESSION, reuse=reuse)
+    stat = os.stat(output)
+    os.makedirs(context.pipeline_path, exist_ok=True)
+    temporary = f'{state_path}.{os.getpid()}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump({'manifest': manifest, 'members': members,
+                   'output': [stat.st_mtime_ns, stat.st_size]}, f)
+    os.replace(temporary, state_path)
+
+
+def _risk(context, stage):
+    from olist_risk import DelayRiskModel, open_orders, score_frame
+
+    oilst = context.processed()
+    model = DelayRiskModel.fit(oilst)
+    model.save(stage.outputs[0])
+    score_frame(model, open_orders(oilst)).to_csv(
+        stage.outputs[1], index=False, float_format='%.6f')
+
+
+def _compact(context, stage):
+    from olist_compact import compact
+    from olist_io import load_processed
+
+    # Todas las columnas (no solo las de las demás etapas)
+    compacted, report = compact(load_processed(context.data_path))
+    compacted.to_pickle(stage.outputs[0])
+    report.to_csv(stage.outputs[1])
+
+
+def _table(name):
+    def run(context, stage):
+        from olist_tables import TABLES
+
+        TABLES[name][2](context.processed()).to_csv(stage.outputs[0])
+    return run
+
+
+def _figure(name):
+    def run(context, stage):
+        from olist_render import render_figures
+
+        render_figures(
+            context.processed(), [name], context.output_path, jobs=1,
+            data_path=context.data_path)
+    return run
+
+
+def build_stages(data_path=None, output_path='.', pipeline_path=PIPELINE_PATH):
+    """Etapas del proyecto, en orden topológico."""
+    from olist_consolidate import source_paths
+    from olist_hll import COLUMNS as HLL_COLUMNS, FILE_DISTINCT_CUSTOMERS
+    from olist_render import COLUMNS as FIGURE_COLUMNS, FIGURES
+    from olist_risk import COLUMNS as RISK_COLUMNS, FILE_MODEL, FILE_SCORES
+    from olist_tables import TABLES
+    from olist_timeseries import COLUMNS as DAILY_COLUMNS, FILE_DAILY_METRICS
+
+    data_path = data_path or DATA_PATH
+    sources = os.path.join(pipeline_path, FILE_SOURCES)
+    processed = os.path.join(data_path, FILE_CONSOLIDATED_DATA)
+
+    stages = [
+        Stage('ingest',
+              source_paths(data_path) + _code('olist_consolidate', 'olist_schema'),
+              [sources], _ingest),
+        # El manifiesto (olist_manifest) no es una salida declarada: si falta,
+        # quien lo usa vuelve a calcular las huellas; sin los archivos de Olist
+        # basta `oilst_processed.csv` para que la etapa sea una fuente
+        Stage('consolidate', [sources] + CONSOLIDATE_CODE, [processed], _consolidate),
+        Stage('publish', [processed] + _code('olist_io', 'olist_manifest', 'olist_periods'),
+              [os.path.join(data_path, FILE_CONSOLIDATED_ARROW)], _publish),
+        Stage('distinct', [processed] + _code('olist_hll', 'olist_io', 'olist_periods'),
+              [os.path.join(data_path, FILE_DISTINCT_CUSTOMERS)], _distinct, HLL_COLUMNS),
+        Stage('daily', [processed] + _code('olist_timeseries', 'olist_io', 'olist_periods'),
+              [os.path.join(data_path, FILE_DAILY_METRICS)], _daily, DAILY_COLUMNS),
+        Stage('export', [processed] + _code('olist_export', 'olist_io', 'olist_manifest',
+                                            'olist_periods'),
+              [os.path.join(output_path, FILE_EXPORT)], _export),
+        Stage('aggregate', [processed] + _code('olist_cube', 'olist_classify'),
+              [os.path.join(pipeline_path, FILE_CUBE)], _aggregate, CUBE_COLUMNS),
+        Stage('compact', [processed] + _code('olist_compact', 'olist_periods'),
+              [os.path.join(pipeline_path, FILE_COMPACT),
+               os.path.join(pipeline_path, FILE_COMPACT_REPORT)], _compact),
+        ]
+    if importlib.util.find_spec('sklearn') is not None:
+        # Etapa opcional: solo si scikit-learn está instalado
+        stages.append(Stage(
+            'risk', [processed] + _code('olist_risk', 'olist_io', 'olist_periods'),
+            [os.path.join(pipeline_path, FILE_MODEL),
+             os.path.join(output_path, FILE_SCORES)], _risk, RISK_COLUMNS))
+    for name, (filename, columns, _) in TABLES.items():
+        stages.append(Stage(
+            f'table:{name}', [processed] + _code('olist_tables', 'olist_periods'),
+            [os.path.join(output_path, filename)], _table(name), columns))
+    for name, (filename, _, _) in FIGURES.items():
+        inputs = [processed] + FIGURE_CODE
+        if filename.endswith('.html'):
+            # El mapa lee la geometría
+            inputs.append(os.path.join(data_path, FILE_GEODATA))
+        stages.append(Stage(
+            f'figure:{name}', inputs, [os.path.join(output_path, filename)],
+            _figure(name), FIGURE_COLUMNS))
+    return stages
+
+
+def dependencies(stages):
+    """Diccionario etapa -> etapas que escriben alguna de sus entradas."""
+    producers = {
+        os.path.abspath(output): stage.name
+        for stage in stages for output in stage.outputs
+        }
+    return {
+        stage.name: sorted({
+            producers[os.path.abspath(path)] for path in stage.inputs
+            if os.path.abspath(path) in producers
+            })
+        for stage in stages
+        }
+
+
+def plan(stages, targets=None):
+    """
+    Etapas necesarias para `targets` (por defecto, las etapas finales) y
+    cuáles de ellas son fuentes.
+
+    Una etapa cuyas entradas no existen ni las produce otra etapa, pero cuyas
+    salidas ya existen, es una fuente: no se ejecuta y tampoco lo que está
+    antes (p. ej. `consolidate` cuando solo se tiene `oilst_processed.csv`).
+    """
+    names = [stage.name for stage in stages]
+    unknown = set(targets or ()) - set(names)
+    if unknown:
+        raise ValueError(f"etapas desconocidas: {', '.join(sorted(unknown))}")
+    producers = {
+        os.path.abspath(output): stage.name
+        for stage in stages for output in stage.outputs
+        }
+    # `stages` está en orden topológico
+    # Archivos que faltan (directa o indirectamente) para ejecutar cada etapa
+    missing = {}
+    for stage in stages:
+        missing[stage.name] = []
+        for path in stage.inputs:
+            if os.path.exists(path):
+                continue
+            producer = producers.get(os.path.abspath(path))
+            missing[stage.name].extend(
+                [path] if producer is None else missing[producer])
+    buildable = {name: not paths for name, paths in missing.items()}
+    sources = {
+        stage.name for stage in stages
+        if not buildable[stage.name] and all(map(os.path.exists, stage.outputs))
+        }
+
+    depends = dependencies(stages)
+    if not targets:
+        # Por defecto, las etapas finales (de las que no depende ninguna otra)
+        used = {name for names in depends.values() for name in names}
+        targets = [name for name in names if name not in used]
+    required = set()
+    pending = list(targets)
+    while pending:
+        name = pending.pop()
+        if name in required:
+            continue
+        required.add(name)
+        if name in sources:
+            continue
+        if not buildable[name]:
+            raise FileNotFoundError(
+                f"{name}: faltan {', '.join(dict.fromkeys(missing[name]))}")
+        pending.extend(depends[name])
+    return [stage for stage in stages if stage.name in required], sources
+
+
+# ---------------------------------------------------------------------------
+# Huellas y estado
+
+class State:
+    """Huellas de archivos y de las entradas/salidas de cada etapa."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, encoding='utf-8') as f:
+                stored = json.load(f)
+        except (FileNotFoundError, ValueError):
+            stored = {}
+        self.files = stored.get('files', {})
+        self.stages = stored.get('stages', {})
+
+    def file_digest(self, path):
+        """sha256 de `path` (None si no existe); reutiliza el de la última vez
+        si no cambiaron el tamaño ni la fecha de modificación."""
+        path = os.path.abspath(path)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            known = self.files.get(path)
+        if known and known[0] == stat.st_mtime_ns and known[1] == stat.st_size:
+            return known[2]
+        # El archivo consolidado trae su sha256 en el manifiesto
+        digest = manifest_digest(path)
+        if digest is not None:
+            with self._lock:
+                self.files[path] = [stat.st_mtime_ns, stat.st_size, digest]
+            return digest
+        sha = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                sha.update(block)
+        with self._lock:
+            self.files[path] = [stat.st_mtime_ns, stat.st_size, sha.hexdigest()]
+        return sha.hexdigest()
+
+    def digests(self, paths):
+        return {os.path.abspath(path): self.file_digest(path) for path in paths}
+
+    def is_fresh(self, stage):
+        stored = self.stages.get(stage.name)
+        return (
+            stored is not None
+            and stored['inputs'] == self.digests(stage.inputs)
+            and stored['outputs'] == self.digests(stage.outputs)
+            and None not in stored['outputs'].values()
+            )
+
+    def record(self, stage, inputs):
+        outputs = self.digests(stage.outputs)
+        with self._lock:
+            self.stages[stage.name] = {'inputs': inputs, 'outputs': outputs}
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        temporary = f'{self.path}.{os.getpid()}.tmp'
+        with self._lock, open(temporary, 'w', encoding='utf-8') as f:
+            json.dump({'files': self.files, 'stages': self.stages}, f)
+        os.replace(temporary, self.path)
+
+
+# ---------------------------------------------------------------------------
+# Ejecución
+
+def run_pipeline(targets=None, data_path=None, output_path='.', jobs=None,
+                 force=False, dry_run=False, pipeline_path=PIPELINE_PATH):
+    """
+    Ejecuta las etapas `targets` (todas por defecto) y sus dependencias.
+
+    Regresa un dataframe con el estado de cada etapa (`ran`, `fresh`,
+    `source` (ver `plan`) o `stale` con `dry_run`) y su tiempo.
+    """
+    import pandas as pd
+
+    stages, sources = plan(build_stages(data_path, output_path, pipeline_path), targets)
+    depends = {
+        name: [] if name in sources else names
+        for name, names in dependencies(stages).items()
+        }
+    state = State(os.path.join(pipeline_path, FILE_STATE))
+    columns = sorted({
+        column for stage in stages if stage.columns for column in stage.columns})
+    context = Context(data_path or DATA_PATH, output_path, pipeline_path, columns)
+    for stage in stages:
+        for output in stage.outputs:
+            os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+
+    report = {stage.name: {'status': None, 'seconds': 0.0} for stage in stages}
+    by_name = {stage.name: stage for stage in stages}
+
+    def execute(stage):
+        """Revisa y, si hace falta, ejecuta la etapa; regresa su estado."""
+        start = time.perf_counter()
+        if stage.name in sources:
+            return 'source', time.perf_counter() - start
+        inputs = state.digests(stage.inputs)
+        if not force and state.is_fresh(stage):
+            return 'fresh', time.perf_counter() - start
+        if dry_run:
+            return 'stale', time.perf_counter() - start
+        with profile_stage(stage.name):
+            stage.run(context, stage)
+        state.record(stage, inputs)
+        return 'ran', time.perf_counter() - start
+
+    done = set()
+    running = {}
+    try:
+        with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+            while len(done) < len(stages):
+                for stage in stages:
+                    if (stage.name not in done and stage.name not in running.values()
+                            and all(name in done for name in depends[stage.name])):
+                        # Con --dry-run, lo que sigue de una etapa desactualizada
+                        # también lo está
+                        if dry_run and any(
+                                report[name]['status'] == 'stale'
+                                for name in depends[stage.name]):
+                            report[stage.name]['status'] = 'stale'
+                            done.add(stage.name)
+                            continue
+                        running[pool.submit(execute, stage)] = stage.name
+                if not running:
+                    continue
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    status, seconds = future.result()
+                    report[name] = {'status': status, 'seconds': seconds}
+                    done.add(name)
+    finally:
+        if not dry_run:
+            state.save()
+
+    frame = pd.DataFrame.from_dict(report, orient='index')
+    frame['depends_on'] = [', '.join(depends[name]) for name in frame.index]
+    frame['outputs'] = [
+        ', '.join(os.path.relpath(path) for path in by_name[name].outputs)
+        for name in frame.index]
+    return frame
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('stages', nargs='*',
+                        help='etapas a ejecutar con sus dependencias (todas por defecto)')
+    parser.add_argument('--data-path', default=None,
+                        help='carpeta con los archivos de Olist y oilst_processed.csv')
+    parser.add_argument('--output-path', default='.',
+                        help='carpeta donde se guardan tablas y figuras')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='número de etapas en paralelo')
+    parser.add_argument('--force', action='store_true',
+                        help='ejecuta las etapas aunque estén al día')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='solo indica qué etapas están desactualizadas')
+    parser.add_argument('--list', action='store_true',
+                        help='muestra las etapas y sus dependencias')
+    parser.add_argument('--profile', default=None, metavar='CARPETA',
+                        help='escribe la traza de tiempos de cada etapa en CARPETA')
+    parser.add_argument('--cprofile', action='store_true',
+                        help='con --profile, guarda un perfil de cProfile por etapa')
+    parser.add_argument('--memory', action='store_true',
+                        help='con --profile, mide el pico de memoria de cada etapa')
+    args = parser.parse_args(argv)
+
+    if args.list:
+        stages = build_stages(args.data_path, args.output_path)
+        for name, depends in dependencies(stages).items():
+            print(f"{name}: {', '.join(depends) or '-'}")
+        return
+
+    profiler = None
+    if args.profile:
+        from olist_profile import enable
+        profiler = enable(
+            args.profile, cprofile=args.cprofile, memory=args.memory,
+            write_at_exit=False)
+
+    start = time.perf_counter()
+    try:
+        report = run_pipeline(
+            args.stages, args.data_path, args.output_path, args.jobs,
+            args.force, args.dry_run)
+    except (ValueError, FileNotFoundError) as error:
+        parser.error(str(error))
+    elapsed = time.perf_counter() - start
+    print(report.round(3).to_string())
+    counts = report['status'].value_counts()
+    print(', '.join(f'{status}: {count}' for status, count in counts.items()))
+    print(f"Tiempo total: {elapsed:.2f} s "
+          f"(suma de etapas: {report['seconds'].sum():.2f} s)")
+    if profiler is not None:
+        print(f"Traza: {', '.join(profiler.write())}")
+
+
+if __name__ == '__main__':
+    main()
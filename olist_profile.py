@@ -0,0 +1,280 @@
+"""
+Instrumentación por etapas: tiempos, memoria, filas y perfiles de cProfile.
+
+Los módulos marcan sus pasos con `stage(nombre, frame)`. Sin un perfilador
+activo, `stage` no hace nada (el costo es una llamada a función); al
+activarlo, cada etapa registra:
+
+* tiempo de reloj y de CPU (`time.perf_counter`, `time.thread_time`),
+* filas de entrada (`frame`) y de salida (`record.output(resultado)`),
+* con `memory=True`, el pico de memoria asignada durante la etapa
+  (`tracemalloc`, sin contar la memoria que ya estaba asignada al empezar),
+* con `cprofile=True`, un archivo `<etapa>.prof` de cProfile por cada etapa
+  de primer nivel (se abre con `pstats`, snakeviz, etc.).
+
+Las etapas se pueden anidar. Al terminar se escriben en la carpeta de salida:
+
+* `trace.json`: las etapas (`stages`) y los mismos datos como eventos de
+  Chrome (`traceEvents`), que se abren en chrome://tracing o Perfetto,
+* `stages.folded`: tiempo propio de cada etapa en formato de pilas plegadas
+  (`padre;hija microsegundos`), para `flamegraph.pl` o speedscope.
+
+Para activarlo sin editar código, se definen variables de entorno antes de
+ejecutar un programa que use `olist_profile`:
+
+    OLIST_PROFILE=perfil OLIST_PROFILE_MODE=cprofile,memory \\
+        python olist_cli.py consolidate
+
+Ejemplo en código:
+
+    from olist_profile import enable, stage
+
+    profiler = enable('perfil', memory=True)
+    with stage('merge_orders', orders) as record:
+        results = orders.merge(items_agg, on='order_id', how='left')
+        record.output(results)
+    profiler.write()
+
+Los tiempos por hilo son correctos; el pico de memoria de `tracemalloc` es
+del proceso, así que con etapas en paralelo conviene usar un solo hilo.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+PROFILE_ENV = 'OLIST_PROFILE'
+PROFILE_MODE_ENV = 'OLIST_PROFILE_MODE'
+
+
+def _rows(frame):
+    return None if frame is None else len(frame)
+
+
+class StageRecord:
+    """Mediciones de una etapa."""
+
+    def __init__(self, name, path, rows_in=None):
+        self.name = name
+        self.path = path
+        self.thread = threading.get_ident()
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.start = 0.0
+        self.wall_seconds = 0.0
+        self.cpu_seconds = 0.0
+        self.child_seconds = 0.0
+        self.peak_bytes = None
+        self.profile = None
+        # Memoria asignada al empezar y pico absoluto (tracemalloc)
+        self._base = 0
+        self._peak = 0
+
+    def output(self, frame):
+        """Registra las filas de salida; regresa `frame` sin cambios."""
+        self.rows_out = _rows(frame)
+        return frame
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'path': self.path,
+            'thread': self.thread,
+            'start': round(self.start, 6),
+            'wall_seconds': round(self.wall_seconds, 6),
+            'cpu_seconds': round(self.cpu_seconds, 6),
+            'self_seconds': round(self.wall_seconds - self.child_seconds, 6),
+            'peak_bytes': self.peak_bytes,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'profile': self.profile,
+        }
+
+
+class _NullRecord:
+    def output(self, frame):
+        return frame
+
+
+_NULL_RECORD = _NullRecord()
+
+
+class Profiler:
+    """Registro de etapas de una ejecución."""
+
+    def __init__(self, path='profile', cprofile=False, memory=False):
+        self.path = path
+        self.cprofile = cprofile
+        self.memory = memory
+        self.records = []
+        self._origin = time.perf_counter()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        if memory:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    def _stack(self):
+        if not hasattr(self._local, 'stack'):
+            self._local.stack = []
+        return self._local.stack
+
+    def _update_peaks(self):
+        """Lleva el pico de memoria a las etapas abiertas y lo reinicia."""
+        import tracemalloc
+
+        current, peak = tracemalloc.get_traced_memory()
+        for record in self._stack():
+            record._peak = max(record._peak, peak)
+        tracemalloc.reset_peak()
+        return current
+
+    @contextmanager
+    def stage(self, name, frame=None):
+        stack = self._stack()
+        path = ';'.join([record.name for record in stack] + [name])
+        record = StageRecord(name, path, _rows(frame))
+        if self.memory:
+            record._base = record._peak = self._update_peaks()
+        profile = None
+        if self.cprofile and not stack:
+            import cProfile
+            profile = cProfile.Profile()
+
+        stack.append(record)
+        record.start = time.perf_counter() - self._origin
+        cpu = time.thread_time()
+        if profile is not None:
+            profile.enable()
+        try:
+            yield record
+        finally:
+            if profile is not None:
+                profile.disable()
+            record.cpu_seconds = time.thread_time() - cpu
+            record.wall_seconds = time.perf_counter() - self._origin - record.start
+            if self.memory:
+                self._update_peaks()
+                record.peak_bytes = record._peak - record._base
+            stack.pop()
+            if stack:
+                stack[-1].child_seconds += record.wall_seconds
+            if profile is not None:
+                os.makedirs(self.path, exist_ok=True)
+                record.profile = os.path.join(
+                    self.path, f"{name.replace(':', '_')}.prof")
+                profile.dump_stats(record.profile)
+            with self._lock:
+                self.records.append(record)
+
+    def summary(self):
+        """Dataframe con una fila por etapa, en orden de inicio."""
+        import pandas as pd
+
+        with self._lock:
+            records = sorted(self.records, key=lambda record: record.start)
+        return pd.DataFrame(
+            [record.to_dict() for record in records]).set_index('path')
+
+    def trace_events(self):
+        """Eventos completos ('X') del formato de trazas de Chrome."""
+        pid = os.getpid()
+        with self._lock:
+            records = list(self.records)
+        return [{
+            'name': record.name,
+            'cat': 'stage',
+            'ph': 'X',
+            'ts': round(record.start * 1e6),
+            'dur': round(record.wall_seconds * 1e6),
+            'pid': pid,
+            'tid': record.thread,
+            'args': {
+                key: value for key, value in record.to_dict().items()
+                if key in ('cpu_seconds', 'peak_bytes', 'rows_in', 'rows_out')
+                and value is not None
+                },
+        } for record in records]
+
+    def folded(self):
+        """Líneas `pila tiempo_propio_us` (pilas plegadas para flamegraphs)."""
+        totals = {}
+        with self._lock:
+            for record in self.records:
+                own = max(record.wall_seconds - record.child_seconds, 0.0)
+                totals[record.path] = totals.get(record.path, 0) + round(own * 1e6)
+        return [f'{path} {value}' for path, value in totals.items() if value > 0]
+
+    def write(self, path=None):
+        """Escribe `trace.json` y `stages.folded` en `path`; regresa sus rutas."""
+        path = path or self.path
+        os.makedirs(path, exist_ok=True)
+        trace = os.path.join(path, 'trace.json')
+        with self._lock:
+            stages = [record.to_dict() for record in self.records]
+        with open(trace, 'w', encoding='utf-8') as f:
+            json.dump({
+                'stages': sorted(stages, key=lambda stage: stage['start']),
+                'traceEvents': self.trace_events(),
+                'displayTimeUnit': 'ms',
+            }, f, indent=1)
+        folded = os.path.join(path, 'stages.folded')
+        with open(folded, 'w', encoding='utf-8') as f:
+            f.write('\n'.join(self.folded()) + '\n')
+        return trace, folded
+
+
+_active = None
+
+
+def enable(path='profile', cprofile=False, memory=False, write_at_exit=True):
+    """Activa el registro de etapas (para todo el proceso)."""
+    global _active
+    _active = Profiler(path, cprofile=cprofile, memory=memory)
+    if write_at_exit:
+        atexit.register(_active.write)
+    return _active
+
+
+def disable():
+    """Desactiva el registro; regresa el perfilador que estaba activo."""
+    global _active
+    profiler, _active = _active, None
+    return profiler
+
+
+def active():
+    return _active
+
+
+def stage(name, frame=None):
+    """
+    Contexto que mide la etapa `name` si hay un perfilador activo; `frame`
+    son los datos de entrada (para contar filas).
+    """
+    if _active is None:
+        return _null_stage()
+    return _active.stage(name, frame)
+
+
+@contextmanager
+def _null_stage():
+    yield _NULL_RECORD
+
+
+def enable_from_env():
+    """Activa el registro si está definida la variable `OLIST_PROFILE`."""
+    path = os.environ.get(PROFILE_ENV)
+    if not path or _active is not None:
+        return _active
+    mode = {
+        option.strip()
+        for option in os.environ.get(PROFILE_MODE_ENV, '').split(',')
+        }
+    return enable(path, cprofile='cprofile' in mode, memory='memory' in mode)
+
+
+enable_from_env()
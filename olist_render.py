@@ -0,0 +1,405 @@
+"""
+Generación en lote de las figuras entregables (PNG y HTML).
+
+Cada entregable se producía exportando un notebook completo: se vuelven
+a leer los datos, se dibujan todas las figuras exploratorias y se llama a
+`plt.show()`. Este programa:
+
+1. lee una sola vez el archivo consolidado,
+2. calcula para cada figura solo los agregados que necesita (histogramas,
+   matriz de correlación, cuartiles por grupo, conteos por estado),
+3. busca cada figura en la caché de `olist_figcache.py` por la huella de
+   esos agregados y de los parámetros del dibujo; si ya existe, copia el
+   archivo guardado,
+4. dibuja las figuras restantes en paralelo, cada una en un proceso con el
+   backend `Agg` (sin ventanas), y
+5. reporta el tiempo de cada figura.
+
+Uso:
+
+    python olist_render.py [--data-path RUTA] [--jobs N] [--force]
+                           [--cache-size MB] [figura ...]
+"""
+import argparse
+import hashlib
+import multiprocessing
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from olist_boxplot import box_stats, draw_boxplot
+from olist_classify import DELAY_STATUS
+from olist_cube import OrderCube
+from olist_figcache import FigureCache
+from olist_geo import DEFAULT_PRECISION, DEFAULT_TOLERANCE
+from olist_io import DATA_PATH, FILE_GEODATA, load_processed
+
+# Se incrementa cuando cambia el código de algún dibujo, para no reutilizar
+# figuras guardadas con la versión anterior
+FIGURES_VERSION = 3
+
+COLUMNS = [
+    'order_status',
+    'delay_status',
+    'delta_days',
+    'total_sales',
+    'total_products',
+    'distance_distribution_center',
+    'geolocation_state',
+    'state_name',
+    'order_purchase_timestamp',
+    ]
+
+CORRELATION_COLUMNS = [
+    'total_sales',
+    'total_products',
+    'delta_days',
+    'distance_distribution_center'
+    ]
+
+
+# ---------------------------------------------------------------------------
+# Agregados de entrada de cada figura (se calculan en el proceso principal)
+
+def _histogram_delta_days(oilst, delivered):
+    counts, edges = np.histogram(delivered['delta_days'].dropna(), bins=100)
+    return {
+        'counts': counts,
+        'edges': edges,
+        'mean': oilst['delta_days'].mean(),
+        'std': oilst['delta_days'].std(),
+        'delivered_mean': delivered['delta_days'].mean(),
+    }
+
+
+def _histogram_sales(oilst, delivered):
+    inputs = {}
+    for status in ('short_delay', 'long_delay'):
+        sales = delivered.loc[delivered['delay_status'] == status, 'total_sales']
+        counts, edges = np.histogram(sales.dropna(), bins=100)
+        inputs[f'{status}_counts'] = counts
+        inputs[f'{status}_edges'] = edges
+    return inputs
+
+
+def _correlation_long_delay(oilst, delivered):
+    matrix = delivered.loc[
+        delivered['delay_status'] == 'long_delay', CORRELATION_COLUMNS].corr()
+    return {'matrix': matrix}
+
+
+def _boxplot_by_state(oilst, delivered):
+    return {
+        'stats': box_stats(
+            delivered, ['geolocation_state', 'delay_status'], 'delta_days',
+            max_outliers=0),
+        'order': delivered['geolocation_state'].value_counts().index.to_numpy(),
+    }
+
+
+def _long_delays_by_month(oilst, delivered):
+    long_delay = delivered[delivered['delay_status'] == 'long_delay']
+    return {'cube': OrderCube.from_frame(long_delay)}
+
+
+def _long_delays_by_state(oilst, delivered):
+    long_delay = delivered[delivered['delay_status'] == 'long_delay']
+    return {
+        'counts': long_delay.groupby(['state_name', 'geolocation_state'])
+        ['delay_status'].count().reset_index(),
+    }
+
+
+# ---------------------------------------------------------------------------
+# Dibujo de cada figura (se ejecuta en los procesos de trabajo)
+
+def _draw_histogram_delta_days(inputs, path):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(10, 5))
+    ax.stairs(inputs['counts'], inputs['edges'], fill=True)
+    ax.set_title('Fig.2 Histograma de frequencias de delta_days y regla empírica débil')
+    ax.set_xlabel('Diferencia entre el tiempo estimado y tiempo real de entrega')
+    ax.set_ylabel('# Ocurrencias')
+
+    mean, std = inputs['mean'], inputs['std']
+    ax.axvline(mean, color='r', linestyle='dashed', linewidth=3)
+    ax.axvline(mean + 3 * std, color='y', linestyle='dashed', linewidth=2)
+    ax.axvline(mean - 3 * std, color='y', linestyle='dashed', linewidth=2)
+    min_ylim, max_ylim = ax.get_ylim()
+    ax.text(
+        inputs['delivered_mean'] * 1.1,
+        max_ylim * 0.9,
+        'Promedio: {:.2f}'.format(mean)
+        )
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def _draw_histogram_sales(inputs, path):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(15, 6))
+    for status, label, color in (
+            ('short_delay', 'Short Delay', 'blue'),
+            ('long_delay', 'Long Delay', 'red')):
+        ax.stairs(
+            inputs[f'{status}_counts'], inputs[f'{status}_edges'],
+            fill=True, alpha=0.5, label=label, color=color
+            )
+    ax.set_xlabel('Total_sales')
+    ax.set_ylabel('Count')
+    ax.set_title('Fig 4. Histograma de ventas totales entregadas por retrasos moderados y prolongados')
+    ax.legend()
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def _draw_correlation(inputs, path):
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
+    fig, ax = plt.subplots()
+    sns.heatmap(inputs['matrix'], cmap='coolwarm', annot=True, ax=ax).set(
+        title='Fig. 10 Matriz de correlación de las órdenes completadas'
+        )
+    fig.savefig(path, bbox_inches='tight')
+    plt.close(fig)
+
+
+def _draw_boxplot_by_state(inputs, path):
+    import matplotlib.pyplot as plt
+
+    fig, ax = plt.subplots(figsize=(12, 8))
+    draw_boxplot(
+        ax, inputs['stats'], x='geolocation_state', hue='delay_status',
+        order=inputs['order'], hue_order=DELAY_STATUS
+        )
+    ax.tick_params(axis='x', labelrotation=90)
+    ax.set_xlabel('Estado de Brasil')
+    ax.set_ylabel('Delta Days')
+    ax.set_title('Diagrama de Caja de Delta Days por Estado y Delay Status')
+    ax.legend(title='Delay Status')
+    fig.tight_layout()
+    fig.savefig(path)
+    plt.close(fig)
+
+
+def _draw_long_delays_by_month(inputs, path):
+    from olist_interactive import time_series, write_chart
+
+    fig = time_series(
+        inputs['cube'],
+        'orders',
+        by='geolocation_state',
+        kind='bar',
+        title='Órdenas con Retraso prolongado por cada mes, año y región',
+        labels={'period': 'Mes y Año', 'orders': 'Cantidad de Órdenes'}
+        )
+    fig.update_layout(
+        barmode='stack',
+        xaxis_title='Mes y año',
+        yaxis_title='Cantidad de órdenes',
+        legend_title='Estado',
+        showlegend=True,
+        xaxis_tickangle=-45
+        )
+    write_chart(fig, path)
+
+
+def _draw_long_delays_map(inputs, path):
+    import plotly.express as px
+    from olist_geo import load_geojson
+    from olist_report import write_report
+
+    geojson = load_geojson(inputs['geojson_path'])
+    fig = px.choropleth(
+        data_frame=inputs['counts'],
+        geojson=geojson,
+        featureidkey='properties.UF',
+        locations='geolocation_state',
+        color='delay_status',
+        color_continuous_scale="bluyl",
+        scope='south america',
+        labels={'delay_status': 'Cantidad de pedidos retrasados'},
+        title="Mapa de la cantidad de órdenes con entregas de restraso prolongado a nivel estatal"
+        )
+    fig.update_geos(
+        showcountries=False,
+        showcoastlines=True,
+        showland=True,
+        fitbounds='locations',
+        visible=True
+        )
+    fig.update_layout(
+        margin=dict(l=20, r=20, t=66, b=20),
+        width=800,
+        height=800,
+        )
+    write_report(fig, path)
+
+
+# nombre -> (archivo de salida, cálculo de entradas, dibujo)
+FIGURES = {
+    'histogram_sales_long_delay': (
+        'histogram_sales_long_delay.png',
+        _histogram_delta_days,
+        _draw_histogram_delta_days),
+    '3_a_histogram_sales_short_long_delays': (
+        '3_a_histogram_sales_short_long_delays.png',
+        _histogram_sales,
+        _draw_histogram_sales),
+    '3_b_correlation_matrix_complete_orders': (
+        '3_b_correlation_matrix_complete_orders.png',
+        _correlation_long_delay,
+        _draw_correlation),
+    '3_c_boxplot_delta_day_by_state_and_delay_type': (
+        '3_c_boxplot_delta_day_by_state_and_delay_type.png',
+        _boxplot_by_state,
+        _draw_boxplot_by_state),
+    '3_d_evolution_delayed_orders_by_region': (
+        '3_d_evolution_delayed_orders_by_region.html',
+        _long_delays_by_month,
+        _draw_long_delays_by_month),
+    '3_e_map_long_delays_by_state': (
+        '3_e_map_long_delays_by_state.html',
+        _long_delays_by_state,
+        _draw_long_delays_map),
+}
+
+
+def _file_digest(path):
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def _spec(name, geojson_path):
+    """Parámetros del dibujo que forman parte de la llave en la caché."""
+    filename, _, draw = FIGURES[name]
+    spec = {
+        'figure': name,
+        'file': filename,
+        'draw': draw.__name__,
+        'version': FIGURES_VERSION,
+    }
+    if filename.endswith('.html'):
+        import plotly
+        spec['plotly'] = plotly.__version__
+    if draw is _draw_long_delays_map:
+        spec['geojson'] = _file_digest(geojson_path)
+        spec['tolerance'] = DEFAULT_TOLERANCE
+        spec['precision'] = DEFAULT_PRECISION
+    return spec
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+def _render(name, inputs, path):
+    start = time.perf_counter()
+    FIGURES[name][2](inputs, path)
+    return time.perf_counter() - start
+
+
+def render_figures(oilst, names=None, output_path='.', jobs=None, force=False,
+                   data_path=None, cache=None):
+    """
+    Dibuja las figuras `names` (todas por defecto) a partir de `oilst`.
+
+    Regresa un dataframe con el estado (`rendered`/`cached`) y los tiempos
+    de cálculo de entradas y de dibujo de cada figura.
+    """
+    names = list(names or FIGURES)
+    cache = cache or FigureCache()
+    delivered = oilst.query("order_status == 'delivered'")
+    geojson_path = os.path.join(data_path or DATA_PATH, FILE_GEODATA)
+    os.makedirs(output_path, exist_ok=True)
+
+    report = {}
+    pending = []
+    for name in names:
+        filename, compute, draw = FIGURES[name]
+        start = time.perf_counter()
+        inputs = compute(oilst, delivered)
+        key = cache.key(inputs, _spec(name, geojson_path))
+        if draw is _draw_long_delays_map:
+            inputs['geojson_path'] = geojson_path
+        path = os.path.join(output_path, filename)
+        report[name] = {
+            'file': filename,
+            'status': 'cached',
+            'inputs_seconds': time.perf_counter() - start,
+            'render_seconds': 0.0,
+        }
+        suffix = os.path.splitext(filename)[1]
+        cached = None if force else cache.get(key, suffix)
+        if cached is not None:
+            start = time.perf_counter()
+            shutil.copyfile(cached, path)
+            if suffix == '.html':
+                from olist_report import write_plotlyjs
+                write_plotlyjs(output_path)
+            report[name]['render_seconds'] = time.perf_counter() - start
+            continue
+        pending.append((name, inputs, path, key))
+
+    if pending:
+        # `spawn` y no `fork`: `olist_pipeline.py` llama a esta función desde
+        # varios hilos, y un proceso creado con `fork` puede heredar un
+        # candado de importación tomado por otro hilo y quedarse bloqueado
+        with ProcessPoolExecutor(
+                max_workers=jobs, initializer=_init_worker,
+                mp_context=multiprocessing.get_context('spawn')) as pool:
+            futures = {
+                name: (pool.submit(_render, name, inputs, path), path, key)
+                for name, inputs, path, key in pending
+                }
+            for name, (future, path, key) in futures.items():
+                report[name]['render_seconds'] = future.result()
+                report[name]['status'] = 'rendered'
+                cache.put(key, path)
+
+    return pd.DataFrame.from_dict(report, orient='index')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('figures', nargs='*',
+                        help='figuras a generar (todas por defecto): '
+                        + ', '.join(FIGURES))
+    parser.add_argument('--data-path', default=None,
+                        help='carpeta con oilst_processed.csv y brasil_geodata.json')
+    parser.add_argument('--output-path', default='.',
+                        help='carpeta donde se guardan las figuras')
+    parser.add_argument('--jobs', type=int, default=None,
+                        help='número de procesos')
+    parser.add_argument('--force', action='store_true',
+                        help='dibuja aunque la figura ya esté en la caché')
+    parser.add_argument('--cache-size', type=int, default=None,
+                        help='tamaño máximo de la caché de figuras, en MB')
+    args = parser.parse_args(argv)
+    unknown = set(args.figures) - set(FIGURES)
+    if unknown:
+        parser.error(f"figuras desconocidas: {', '.join(sorted(unknown))}")
+
+    start = time.perf_counter()
+    oilst = load_processed(args.data_path, columns=COLUMNS)
+    print(f"Lectura de datos: {time.perf_counter() - start:.2f} s")
+
+    cache = FigureCache()
+    if args.cache_size is not None:
+        cache.max_bytes = args.cache_size * 1024 * 1024
+    report = render_figures(
+        oilst, args.figures, args.output_path, args.jobs, args.force,
+        data_path=args.data_path, cache=cache)
+    print(report.round(3).to_string())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+"""
+Exportación de figuras de Plotly a HTML con un solo `plotly.min.js` compartido.
+
+`fig.write_html(...)` incrusta la librería plotly.js completa (~3.5 MB) en
+cada reporte. Aquí cada HTML solo contiene los datos de la figura y hace
+referencia a un archivo `plotly.min.js` que se escribe una sola vez junto a
+los reportes. Además:
+
+* los arreglos numéricos se guardan como arreglos tipados en base64
+  (`{'dtype': 'f8', 'bdata': ...}`) en lugar de listas JSON de números
+  (plotly.js >= 2.28, incluido desde plotly 5.19),
+* `write_dashboard` junta varias figuras en una sola página.
+
+Ejemplo:
+
+    from olist_report import write_report, write_dashboard
+
+    write_report(fig, '3_e_map_long_delays_by_state.html')
+    write_dashboard([fig_1, fig_2], 'olist_dashboard.html', title='Oilst')
+"""
+import base64
+import html
+import os
+
+import numpy as np
+
+PLOTLYJS = 'plotly.min.js'
+
+# Los arreglos más cortos se dejan como listas JSON: en base64 no ahorran
+MIN_TYPED_ARRAY = 8
+
+# Tipos que plotly.js entiende como arreglos tipados
+TYPED_ARRAY_DTYPES = {
+    np.dtype('float64'): 'f8',
+    np.dtype('float32'): 'f4',
+    np.dtype('int8'): 'i1',
+    np.dtype('int16'): 'i2',
+    np.dtype('int32'): 'i4',
+    np.dtype('uint8'): 'u1',
+    np.dtype('uint16'): 'u2',
+    np.dtype('uint32'): 'u4',
+}
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<script src="{plotlyjs}"></script>
+</head>
+<body>
+{divs}
+<script>
+{scripts}
+</script>
+{post_script}
+</body>
+</html>
+"""
+
+
+def write_plotlyjs(directory):
+    """Escribe `plotly.min.js` en `directory` si no existe o cambió."""
+    from plotly.offline import get_plotlyjs
+
+    content = get_plotlyjs().encode('utf-8')
+    path = os.path.join(directory, PLOTLYJS)
+    if os.path.exists(path) and os.path.getsize(path) == len(content):
+        with open(path, 'rb') as f:
+            if f.read() == content:
+                return path
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+
+def _typed_array(values):
+    """Arreglo numérico -> especificación de arreglo tipado de plotly.js."""
+    array = np.asarray(values)
+    if array.dtype.kind in 'iu' and array.dtype.itemsize == 8:
+        # plotly.js no tiene arreglos tipados de 64 bits enteros
+        if array.size and np.iinfo(np.int32).min <= array.min() \
+                and array.max() <= np.iinfo(np.int32).max:
+            array = array.astype(np.int32)
+        else:
+            array = array.astype(np.float64)
+    dtype = TYPED_ARRAY_DTYPES.get(array.dtype)
+    if dtype is None:
+        return None
+    encoded = {
+        'dtype': dtype,
+        'bdata': base64.b64encode(np.ascontiguousarray(array).tobytes()).decode('ascii'),
+    }
+    if array.ndim > 1:
+        encoded['shape'] = ','.join(str(size) for size in array.shape)
+    return encoded
+
+
+def encode_typed_arrays(obj):
+    """Convierte (recursivamente) los arreglos numéricos a arreglos tipados."""
+    if isinstance(obj, dict):
+        return {key: encode_typed_arrays(value) for key, value in obj.items()}
+    if isinstance(obj, np.ndarray) and obj.dtype.kind in 'iuf' \
+            and obj.size >= MIN_TYPED_ARRAY:
+        encoded = _typed_array(obj)
+        if encoded is not None:
+            return encoded
+    if isinstance(obj, (list, tuple)):
+        if len(obj) >= MIN_TYPED_ARRAY and all(
+                isinstance(value, (int, float, np.integer, np.floating))
+                and not isinstance(value, bool) for value in obj):
+            encoded = _typed_array(obj)
+            if encoded is not None:
+                return encoded
+        return [encode_typed_arrays(value) for value in obj]
+    return obj
+
+
+def figure_json(fig, typed_arrays=True):
+    """Textos JSON (datos, diseño) de la figura, con arreglos tipados."""
+    from plotly.io.json import to_json_plotly
+
+    figure = fig.to_plotly_json()
+    data = figure.get('data', [])
+    if typed_arrays:
+        data = encode_typed_arrays(data)
+    return to_json_plotly(data), to_json_plotly(figure.get('layout', {}))
+
+
+def _render_page(figs, path, title, typed_arrays, post_script):
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    write_plotlyjs(directory)
+
+    divs, scripts = [], []
+    for i, fig in enumerate(figs):
+        data, layout = figure_json(fig, typed_arrays)
+        height = fig.layout.height or 500
+        divs.append(
+            f'<div id="figure-{i}" style="width:100%;height:{height}px;"></div>')
+        scripts.append(
+            f"Plotly.newPlot('figure-{i}', {data}, {layout}, "
+            "{\"responsive\": true});")
+
+    page = PAGE_TEMPLATE.format(
+        title=html.escape(title),
+        plotlyjs=PLOTLYJS,
+        divs='\n'.join(divs),
+        scripts='\n'.join(scripts),
+        post_script=f'<script>\n{post_script}\n</script>' if post_script else '',
+        )
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(page)
+    return path
+
+
+def write_report(fig, path, title=None, typed_arrays=True, post_script=None):
+    """Escribe una figura en `path` usando el `plotly.min.js` compartido."""
+    if title is None:
+        title = fig.layout.title.text or os.path.basename(path)
+    return _render_page([fig], path, title, typed_arrays, post_script)
+
+
+def write_dashboard(figs, path, title='Oilst', typed_arrays=True,
+                    post_script=None):
+    """Escribe varias figuras, una debajo de otra, en una sola página."""
+    return _render_page(list(figs), path, title, typed_arrays, post_script)
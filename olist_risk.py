@@ -0,0 +1,310 @@
+"""
+Riesgo de `long_delay` por orden: modelo ajustado con las órdenes entregadas
+y aplicado por lotes a las órdenes abiertas.
+
+Los notebooks `1_2` y `1_3` concluyen que `total_sales`, `total_products` y
+`distance_distribution_center` se relacionan débilmente con `delta_days`,
+pero ese análisis no se aplicaba a las órdenes que siguen en camino. Aquí
+`DelayRiskModel` ajusta un clasificador de scikit-learn (solo CPU) que
+predice si una orden termina en `long_delay` a partir de:
+
+* la orden: días prometidos de entrega, horas hasta la aprobación y días
+  hasta la entrega al transportista (NaN si aún no ocurre),
+* la canasta: `total_sales`, `total_products`,
+* la geografía: `distance_distribution_center`, latitud, longitud y el
+  estado del cliente (una columna por estado),
+* el periodo: mes del año, día de la semana y `year_month`.
+
+Los modelos de `MODELS` son una regresión logística estandarizada o árboles
+con gradient boosting (`HistGradientBoostingClassifier`). Las métricas
+(AUC y precisión promedio) se miden con el último `HOLDOUT` de las órdenes
+por fecha de compra; después el modelo se vuelve a ajustar con todas.
+
+La matriz de variables se arma con numpy por lotes de `BATCH_ROWS` filas
+(`float32`, sin dataframes intermedios) y los lotes se califican en hilos,
+así la memoria no crece con el número de órdenes.
+
+Ejemplo:
+
+    from olist_risk import DelayRiskModel, open_orders
+
+    model = DelayRiskModel.fit(oilst, 'hgb')
+    model.metrics
+    scores = model.score(open_orders(oilst))
+    model.save('delay_risk_model.pkl')
+
+o desde la terminal (ajusta, califica las órdenes abiertas y mide cuántas
+órdenes por segundo califica):
+
+    python olist_risk.py [--data-path RUTA] [--model logistic|hgb]
+                         [--bench-rows 1000000]
+"""
+import argparse
+import os
+import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from olist_io import DATA_PATH, load_processed
+
+FILE_MODEL = 'delay_risk_model.pkl'
+FILE_SCORES = 'delay_risk_scores.csv'
+
+TARGET_STATUS = 'long_delay'
+
+# Estatus de las órdenes que ya no se van a entregar
+CLOSED_STATUSES = ('delivered', 'canceled', 'unavailable')
+
+# Variables numéricas; después van las columnas de los estados
+NUMERIC_FEATURES = (
+    'promised_days',
+    'approval_hours',
+    'carrier_days',
+    'total_sales',
+    'total_products',
+    'distance_distribution_center',
+    'geolocation_lat',
+    'geolocation_lng',
+    'purchase_month',
+    'purchase_weekday',
+    'year_month',
+    )
+
+# Columnas del archivo consolidado que se usan
+COLUMNS = [
+    'order_id',
+    'order_status',
+    'order_purchase_timestamp',
+    'order_approved_at',
+    'order_delivered_carrier_date',
+    'order_delivered_customer_date',
+    'order_estimated_delivery_date',
+    'total_sales',
+    'total_products',
+    'distance_distribution_center',
+    'geolocation_lat',
+    'geolocation_lng',
+    'customer_state',
+    'year_month',
+    'delay_status',
+    ]
+
+# Proporción más reciente (por fecha de compra) para medir el modelo
+HOLDOUT = 0.2
+
+BATCH_ROWS = 1 << 17
+
+_SECONDS_PER_DAY = 86_400
+
+
+def _logistic(seed):
+    from sklearn.impute import SimpleImputer
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.pipeline import make_pipeline
+    from sklearn.preprocessing import StandardScaler
+
+    return make_pipeline(
+        SimpleImputer(strategy='median'), StandardScaler(),
+        LogisticRegression(max_iter=1000, random_state=seed))
+
+
+def _hgb(seed):
+    from sklearn.ensemble import HistGradientBoostingClassifier
+
+    # Admite NaN directamente (carrier_days de las órdenes sin transportista)
+    return HistGradientBoostingClassifier(
+        max_iter=200, learning_rate=0.1, early_stopping=True, random_state=seed)
+
+
+# nombre -> (descripción, constructor del estimador)
+MODELS = {
+    'logistic': ('regresión logística estandarizada', _logistic),
+    'hgb': ('árboles con gradient boosting (HistGradientBoosting)', _hgb),
+}
+
+
+def _days(later, earlier):
+    """Días entre dos columnas de fechas (NaN si falta alguna)."""
+    later = later.to_numpy(dtype='datetime64[s]')
+    earlier = earlier.to_numpy(dtype='datetime64[s]')
+    delta = (later - earlier).astype(np.float64)
+    delta[np.isnat(later) | np.isnat(earlier)] = np.nan
+    return delta / _SECONDS_PER_DAY
+
+
+def feature_matrix(frame, states):
+    """
+    Matriz `float32` (filas de `frame`, `NUMERIC_FEATURES` + un indicador
+    por estado de `states`) con las variables de cada orden.
+    """
+    n_rows = len(frame)
+    matrix = np.zeros((n_rows, len(NUMERIC_FEATURES) + len(states)), dtype=np.float32)
+    purchase = frame['order_purchase_timestamp']
+    days = purchase.to_numpy(dtype='datetime64[D]')
+    columns = {
+        'promised_days': _days(frame['order_estimated_delivery_date'], purchase),
+        'approval_hours': _days(frame['order_approved_at'], purchase) * 24,
+        'carrier_days': _days(frame['order_delivered_carrier_date'], purchase),
+        'purchase_month': days.astype('datetime64[M]').astype(np.int64) % 12 + 1,
+        # 1970-01-01 fue jueves: lunes = 0
+        'purchase_weekday': (days.astype(np.int64) + 3) % 7,
+        }
+    for index, name in enumerate(NUMERIC_FEATURES):
+        values = columns.get(name)
+        if values is None:
+            values = frame[name].to_numpy(dtype=np.float64, na_value=np.nan)
+        matrix[:, index] = values
+    codes = pd.Categorical(frame['customer_state'], categories=states).codes
+    known = codes >= 0
+    matrix[np.flatnonzero(known), len(NUMERIC_FEATURES) + codes[known]] = 1
+    return matrix
+
+
+def labeled_orders(frame):
+    """Órdenes con `delay_status` conocido (las entregadas)."""
+    return frame[frame['delay_status'].notna()]
+
+
+def open_orders(frame):
+    """Órdenes sin entregar que todavía pueden llegar."""
+    status = frame['order_status'].to_numpy(dtype=object)
+    return frame[
+        frame['order_delivered_customer_date'].isna().to_numpy()
+        & ~np.isin(status, CLOSED_STATUSES)]
+
+
+class DelayRiskModel:
+    """Clasificador de `long_delay` con la lista de estados que espera."""
+
+    def __init__(self, name, estimator, states, metrics=None):
+        self.name = name
+        self.estimator = estimator
+        self.states = tuple(states)
+        self.metrics = metrics or {}
+
+    @classmethod
+    def fit(cls, frame, name='logistic', holdout=HOLDOUT, seed=0):
+        """
+        Ajusta el modelo `name` (ver `MODELS`) con las órdenes entregadas de
+        `frame`; `metrics` tiene el AUC y la precisión promedio sobre el
+        último `holdout` de las órdenes por fecha de compra.
+        """
+        from sklearn.metrics import average_precision_score, roc_auc_score
+
+        if name not in MODELS:
+            raise ValueError(
+                f"modelo desconocido {name!r}; opciones: {', '.join(MODELS)}")
+        labeled = labeled_orders(frame)
+        states = np.sort(labeled['customer_state'].dropna().unique().astype(str))
+        features = feature_matrix(labeled, states)
+        target = (labeled['delay_status'] == TARGET_STATUS).to_numpy()
+        if target.all() or not target.any():
+            raise ValueError(f'se necesitan órdenes con y sin {TARGET_STATUS}')
+
+        # Las órdenes más recientes quedan fuera del ajuste para medirlo
+        order = np.argsort(
+            labeled['order_purchase_timestamp'].to_numpy(), kind='stable')
+        split = int(len(order) * (1 - holdout))
+        train, test = order[:split], order[split:]
+        metrics = {'rows': len(labeled), 'positive_rate': float(target.mean())}
+        if holdout and len(np.unique(target[test])) == 2:
+            estimator = MODELS[name][1](seed).fit(features[train], target[train])
+            probability = estimator.predict_proba(features[test])[:, 1]
+            metrics.update(
+                holdout_rows=len(test),
+                roc_auc=float(roc_auc_score(target[test], probability)),
+                average_precision=float(
+                    average_precision_score(target[test], probability)))
+        estimator = MODELS[name][1](seed).fit(features, target)
+        return cls(name, estimator, states, metrics)
+
+    def _score_batch(self, frame):
+        features = feature_matrix(frame, self.states)
+        return self.estimator.predict_proba(features)[:, 1].astype(np.float32)
+
+    def score(self, frame, batch_rows=BATCH_ROWS, jobs=None):
+        """Probabilidad de `long_delay` de cada orden de `frame` (por lotes)."""
+        starts = range(0, len(frame), batch_rows)
+        with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as pool:
+            batches = list(pool.map(
+                lambda start: self._score_batch(frame.iloc[start:start + batch_rows]),
+                starts))
+        scores = np.concatenate(batches) if batches else np.empty(0, dtype=np.float32)
+        return pd.Series(scores, index=frame.index, name='delay_risk')
+
+    def save(self, path):
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as f:
+            pickle.dump(
+                {'name': self.name, 'estimator': self.estimator,
+                 'states': self.states, 'metrics': self.metrics},
+                f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            stored = pickle.load(f)
+        return cls(stored['name'], stored['estimator'], stored['states'],
+                   stored['metrics'])
+
+
+def score_frame(model, frame, **kwargs):
+    """`order_id`, `order_status` y `delay_risk` de las órdenes de `frame`."""
+    return pd.DataFrame({
+        'order_id': frame['order_id'],
+        'order_status': frame['order_status'],
+        'delay_risk': model.score(frame, **kwargs),
+        })
+
+
+def benchmark(model, frame, rows=1_000_000, batch_rows=BATCH_ROWS, jobs=None):
+    """
+    Califica `rows` órdenes (las de `frame` repetidas) y regresa el tiempo y
+    las órdenes por segundo, incluida la construcción de las variables.
+    """
+    orders = frame.iloc[np.resize(np.arange(len(frame)), rows)]
+    start = time.perf_counter()
+    model.score(orders, batch_rows=batch_rows, jobs=jobs)
+    seconds = time.perf_counter() - start
+    return {'rows': rows, 'seconds': seconds, 'orders_per_second': rows / seconds}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--data-path', default=DATA_PATH,
+                        help='carpeta con oilst_processed.csv')
+    parser.add_argument('--output-path', default='.')
+    parser.add_argument('--model', choices=list(MODELS), default='logistic')
+    parser.add_argument('--batch-rows', type=int, default=BATCH_ROWS)
+    parser.add_argument('--jobs', type=int, default=None)
+    parser.add_argument('--bench-rows', type=int, default=0,
+                        help='órdenes a calificar para medir el rendimiento')
+    args = parser.parse_args(argv)
+
+    oilst = load_processed(args.data_path, columns=COLUMNS)
+    start = time.perf_counter()
+    model = DelayRiskModel.fit(oilst, args.model)
+    print(f"{MODELS[args.model][0]}: ajuste en {time.perf_counter() - start:.2f} s")
+    for name, value in model.metrics.items():
+        print(f"  {name}: {value:,}" if isinstance(value, int) else f"  {name}: {value:.4f}")
+    model.save(os.path.join(args.output_path, FILE_MODEL))
+
+    pending = open_orders(oilst)
+    scores = score_frame(model, pending, batch_rows=args.batch_rows, jobs=args.jobs)
+    scores.to_csv(os.path.join(args.output_path, FILE_SCORES), index=False,
+                  float_format='%.6f')
+    print(f"{len(scores):,} órdenes abiertas calificadas -> {FILE_SCORES}")
+
+    if args.bench_rows:
+        result = benchmark(model, pending if len(pending) else oilst, args.bench_rows,
+                           args.batch_rows, args.jobs)
+        print(f"{result['rows']:,} órdenes en {result['seconds']:.2f} s: "
+              f"{result['orders_per_second']:,.0f} órdenes/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+"""
+Diagramas de dispersión acotados: muestreo estratificado y densidades 2D.
+
+`sns.relplot` y `sns.pairplot` dibujan un punto por orden entregada: con
+cientos de miles de órdenes tardan minutos y los puntos se enciman hasta no
+distinguirse. Este módulo ofrece dos alternativas cuyo tiempo de dibujo no
+depende del tamaño de los datos:
+
+* `stratified_sample`: una muestra de a lo más `budget` filas, estratificada
+  por `delay_status` (cada grupo recibe al menos una parte mínima, así los
+  retrasos prolongados no desaparecen, y el resto se reparte en proporción al
+  tamaño de cada grupo). Dentro de cada grupo el muestreo es uniforme, por lo
+  que se conserva la forma de la nube de puntos. Antes de muestrear se
+  conservan el mínimo y el máximo de cada columna por grupo y los valores
+  atípicos (fuera de los bigotes de `whis` IQR en alguna columna, por grupo),
+  empezando por los más extremos.
+* `draw_density` / `draw_pair_density`: histogramas 2D calculados con
+  `np.histogram2d` sobre todas las filas y dibujados con `pcolormesh` en escala
+  logarítmica (una celda por bin en lugar de un punto por orden).
+
+Ejemplo:
+
+    from olist_scatter import stratified_sample, draw_density
+
+    sample = stratified_sample(delivered, columns=['delta_days', 'total_sales'])
+    sns.relplot(data=sample, x='delta_days', y='total_sales', hue='delay_status')
+
+    fig, ax = plt.subplots()
+    draw_density(ax, delivered, 'delta_days', 'total_sales')
+"""
+import numpy as np
+import pandas as pd
+
+POINT_BUDGET = 20_000
+
+# Fracción del presupuesto reservada para los valores atípicos y parte
+# mínima de cada grupo (respecto al presupuesto restante entre el número de
+# grupos)
+OUTLIER_SHARE = 0.1
+MIN_GROUP_SHARE = 0.25
+
+
+def _outlier_score(frame, columns, by, whis):
+    """Distancia (en IQR) más allá de los bigotes, la mayor entre `columns`."""
+    values = frame[columns].to_numpy(dtype=np.float64)
+    if by is None:
+        q1 = np.nanquantile(values, 0.25, axis=0)[None, :]
+        q3 = np.nanquantile(values, 0.75, axis=0)[None, :]
+    else:
+        grouped = frame.groupby(by, observed=True)[columns]
+        q1 = grouped.quantile(0.25).reindex(frame[by]).to_numpy()
+        q3 = grouped.quantile(0.75).reindex(frame[by]).to_numpy()
+    iqr = q3 - q1
+    excess = np.maximum(q1 - whis * iqr - values, values - q3 - whis * iqr)
+    excess = excess / np.where(iqr > 0, iqr, 1.0)
+    # Los NaN no cuentan como atípicos
+    excess = np.where(np.isnan(excess), 0.0, np.maximum(excess, 0.0))
+    return excess.max(axis=1)
+
+
+def _extremes(frame, columns, by):
+    """Posiciones de los mínimos y máximos de cada columna (por grupo)."""
+    positions = frame[columns].reset_index(drop=True)
+    if by is None:
+        extremes = [positions.idxmin(), positions.idxmax()]
+    else:
+        grouped = positions.groupby(frame[by].to_numpy(), observed=True)
+        extremes = [grouped.idxmin(), grouped.idxmax()]
+    extremes = np.concatenate([
+        np.asarray(values, dtype=np.float64).ravel() for values in extremes])
+    return extremes[~np.isnan(extremes)].astype(np.int64)
+
+
+def _allocate(sizes, budget):
+    """Reparte `budget` entre grupos: una parte mínima y el resto proporcional."""
+    floor = int(budget * MIN_GROUP_SHARE) // max(len(sizes), 1)
+    base = np.minimum(sizes, floor)
+    spare = sizes - base
+    leftover = budget - base.sum()
+    if spare.sum() == 0 or leftover <= 0:
+        return base
+    return base + np.minimum(spare, leftover * spare // spare.sum())
+
+
+def stratified_sample(frame, by='delay_status', budget=POINT_BUDGET,
+                      columns=None, max_outliers=None, whis=1.5, seed=0):
+    """
+    Muestra de a lo más `budget` filas de `frame`, estratificada por `by`,
+    que conserva hasta `max_outliers` valores atípicos de `columns`.
+    """
+    if len(frame) <= budget:
+        return frame
+    if columns is None:
+        columns = frame.select_dtypes('number').columns.to_list()
+    if max_outliers is None:
+        max_outliers = int(budget * OUTLIER_SHARE)
+    rng = np.random.default_rng(seed)
+
+    # Atípicos: los mínimos y máximos de cada grupo y después los más extremos
+    score = _outlier_score(frame, columns, by, whis)
+    outliers = np.flatnonzero(score > 0)
+    if len(outliers) > max_outliers:
+        outliers = outliers[np.argpartition(-score[outliers], max_outliers)[:max_outliers]]
+    selected = np.zeros(len(frame), dtype=bool)
+    selected[outliers] = True
+    selected[_extremes(frame, columns, by)] = True
+
+    # Resto: muestreo uniforme dentro de cada grupo
+    codes = np.zeros(len(frame), dtype=np.int64) if by is None \
+        else pd.factorize(frame[by])[0]
+    rest = np.flatnonzero(~selected & (codes >= 0))
+    rest_codes = codes[rest]
+    sizes = np.bincount(rest_codes, minlength=codes.max() + 1)
+    quota = _allocate(sizes, budget - selected.sum())
+
+    order = np.lexsort((rng.random(len(rest)), rest_codes))
+    starts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    sorted_codes = rest_codes[order]
+    rank = np.arange(len(rest)) - starts[sorted_codes]
+    selected[rest[order[rank < quota[sorted_codes]]]] = True
+
+    return frame.iloc[np.flatnonzero(selected)]
+
+
+def _edges(values, bins, quantiles):
+    values = values[np.isfinite(values)]
+    low, high = np.quantile(values, quantiles) if len(values) else (0.0, 1.0)
+    if low == high:
+        low, high = low - 0.5, high + 0.5
+    return np.linspace(low, high, bins + 1)
+
+
+def histogram_2d(frame, x, y, bins=100, by=None, quantiles=(0, 1)):
+    """
+    Conteos 2D de (`x`, `y`) con `np.histogram2d`, por grupo de `by`.
+
+    Todos los grupos comparten los bordes de los bins, que abarcan los
+    `quantiles` de cada variable. Regresa `(counts, x_edges, y_edges)`, donde
+    `counts` es un diccionario grupo -> matriz si se indica `by`.
+    """
+    values_x = frame[x].to_numpy(dtype=np.float64)
+    values_y = frame[y].to_numpy(dtype=np.float64)
+    x_edges = _edges(values_x, bins, quantiles)
+    y_edges = _edges(values_y, bins, quantiles)
+    if by is None:
+        counts, _, _ = np.histogram2d(values_x, values_y, bins=(x_edges, y_edges))
+        return counts, x_edges, y_edges
+
+    codes, groups = pd.factorize(frame[by], sort=True)
+    counts = {}
+    for code, group in enumerate(groups):
+        mask = codes == code
+        counts[group], _, _ = np.histogram2d(
+            values_x[mask], values_y[mask], bins=(x_edges, y_edges))
+    return counts, x_edges, y_edges
+
+
+def _draw_counts(ax, counts, x_edges, y_edges, cmap, log):
+    from matplotlib.colors import LogNorm
+
+    masked = np.ma.masked_equal(counts.T, 0)
+    norm = LogNorm(vmin=1, vmax=max(counts.max(), 1)) if log else None
+    return ax.pcolormesh(x_edges, y_edges, masked, cmap=cmap, norm=norm)
+
+
+def draw_density(ax, frame, x, y, bins=100, cmap='viridis', log=True,
+                 quantiles=(0, 1), colorbar=True):
+    """Histograma 2D de (`x`, `y`) en `ax`, en lugar de un punto por fila."""
+    counts, x_edges, y_edges = histogram_2d(frame, x, y, bins, quantiles=quantiles)
+    mesh = _draw_counts(ax, counts, x_edges, y_edges, cmap, log)
+    if colorbar:
+        ax.figure.colorbar(mesh, ax=ax, label='# Órdenes')
+    ax.set_xlabel(x)
+    ax.set_ylabel(y)
+    return mesh
+
+
+def draw_pair_density(frame, columns, hue=None, bins=50, cmap='viridis',
+                      quantiles=(0, 1), height=2.5):
+    """
+    Equivalente a `sns.pairplot` con densidades: histogramas 2D de todas las
+    filas fuera de la diagonal e histogramas por `hue` en la diagonal.
+    """
+    import matplotlib.pyplot as plt
+
+    n = len(columns)
+    fig, axes = plt.subplots(
+        n, n, figsize=(height * n, height * n), squeeze=False,
+        sharex='col', constrained_layout=True)
+    edges = {
+        column: _edges(frame[column].to_numpy(dtype=np.float64), bins, quantiles)
+        for column in columns
+        }
+    if hue is None:
+        codes, groups = np.zeros(len(frame), dtype=np.int64), [None]
+    else:
+        codes, groups = pd.factorize(frame[hue], sort=True)
+    colors = plt.get_cmap('tab10').colors
+
+    for i, row in enumerate(columns):
+        values_y = frame[row].to_numpy(dtype=np.float64)
+        for j, column in enumerate(columns):
+            ax = axes[i, j]
+            values_x = frame[column].to_numpy(dtype=np.float64)
+            if i == j:
+                for code, group in enumerate(groups):
+                    counts, _ = np.histogram(values_x[codes == code], bins=edges[column])
+                    ax.stairs(counts, edges[column], color=colors[code % len(colors)],
+                              label=group)
+                # La escala vertical de la diagonal son conteos, no `row`
+                ax.set_yticks([])
+            else:
+                counts, _, _ = np.histogram2d(
+                    values_x, values_y, bins=(edges[column], edges[row]))
+                _draw_counts(ax, counts, edges[column], edges[row], cmap, True)
+            if i == n - 1:
+                ax.set_xlabel(column)
+            if j == 0:
+                ax.set_ylabel(row)
+    if hue is not None:
+        handles, labels = axes[0, 0].get_legend_handles_labels()
+        fig.legend(handles, labels, title=hue, loc='outside right center')
+    return fig
@@ -0,0 +1,278 @@
+"""
+Contrato de los archivos de entrada de Olist y su validación al leerlos.
+
+Los tipos de cada archivo (códigos postales como texto, las cinco fechas de
+las órdenes, etc.) solo estaban descritos en el notebook
+`1_1_olist_processed.py`; un archivo con otro formato fallaba tarde, dentro
+de un `merge`, o producía NaN sin aviso por `errors='coerce'`. Aquí cada
+archivo declara sus columnas en `SCHEMAS` (columna -> (tipo, admite
+nulos)), su llave única en `KEYS` y las referencias entre archivos en
+`REFERENCES`. Los tipos son:
+
+* `str`: texto,
+* `zip`: código postal de 5 dígitos guardado como texto (si se lee como
+  número se pierden los ceros a la izquierda),
+* `int` y `float`: números (el texto que no es número es una violación),
+* `datetime`: fecha; la columna se regresa ya convertida, así la lectura no
+  vuelve a interpretar las fechas.
+
+Las validaciones son operaciones vectorizadas sobre cada columna (una pasada
+por archivo) y el reporte indica, por archivo, columna y regla, cuántos
+valores la violan y una muestra de ellos.
+
+Ejemplo:
+
+    from olist_schema import validate_sources
+
+    sources, report = validate_sources(read_sources(DATA_PATH, validate=False))
+    report[['file', 'column', 'check', 'violations', 'sample']]
+
+o desde la terminal:
+
+    python olist_schema.py --data-path RUTA
+"""
+import argparse
+import os
+
+import pandas as pd
+
+# archivo -> {columna: (tipo, admite nulos)}
+SCHEMAS = {
+    'customers': {
+        'customer_id': ('str', False),
+        'customer_unique_id': ('str', False),
+        'customer_zip_code_prefix': ('zip', False),
+        'customer_city': ('str', True),
+        'customer_state': ('str', True),
+    },
+    'geolocations': {
+        'geolocation_zip_code_prefix': ('zip', False),
+        'geolocation_lat': ('float', False),
+        'geolocation_lng': ('float', False),
+        'geolocation_city': ('str', True),
+        'geolocation_state': ('str', True),
+    },
+    'items': {
+        'order_id': ('str', False),
+        'order_item_id': ('int', False),
+        'price': ('float', False),
+    },
+    'payments': {
+        'order_id': ('str', False),
+        'payment_sequential': ('int', False),
+        'payment_type': ('str', True),
+        'payment_installments': ('int', True),
+        'payment_value': ('float', False),
+    },
+    'orders': {
+        'order_id': ('str', False),
+        'customer_id': ('str', False),
+        'order_status': ('str', False),
+        'order_purchase_timestamp': ('datetime', False),
+        'order_approved_at': ('datetime', True),
+        'order_delivered_carrier_date': ('datetime', True),
+        'order_delivered_customer_date': ('datetime', True),
+        'order_estimated_delivery_date': ('datetime', False),
+        'distance_distribution_center': ('float', True),
+    },
+    'states_abbreviations': {
+        'state_name': ('str', False),
+        'abbreviation': ('str', False),
+    },
+}
+
+# archivo -> columna que identifica una fila
+KEYS = {
+    'orders': 'order_id',
+    'customers': 'customer_id',
+}
+
+# (archivo, columna) -> (archivo, columna) a la que debe existir
+REFERENCES = [
+    (('orders', 'customer_id'), ('customers', 'customer_id')),
+    (('items', 'order_id'), ('orders', 'order_id')),
+    (('payments', 'order_id'), ('orders', 'order_id')),
+]
+
+FILE_PAYMENTS = 'olist_order_payments_dataset.csv'
+
+# Valores de ejemplo por violación
+SAMPLE_SIZE = 5
+
+REPORT_COLUMNS = ['file', 'column', 'check', 'violations', 'sample']
+
+
+class SchemaError(ValueError):
+    """Los archivos de entrada no cumplen el contrato; `report` lo detalla."""
+
+    def __init__(self, report):
+        self.report = report
+        super().__init__(
+            f'{int(report["violations"].sum()):,} valores no cumplen el esquema '
+            f'de entrada:\n{report.to_string(index=False)}')
+
+
+def _violation(file, column, check, mask, values):
+    """Fila del reporte con los valores de `values` marcados en `mask`."""
+    count = int(mask.sum())
+    if not count:
+        return None
+    return {
+        'file': file,
+        'column': column,
+        'check': check,
+        'violations': count,
+        'sample': values[mask].head(SAMPLE_SIZE).tolist(),
+    }
+
+
+def _is_text(values):
+    return pd.api.types.is_string_dtype(values.dtype) \
+        or pd.api.types.is_object_dtype(values.dtype)
+
+
+def _check_type(file, column, kind, values, present):
+    """Valida el tipo de `values`; regresa `(valores convertidos, violación)`."""
+    if kind in ('str', 'zip'):
+        if not _is_text(values):
+            return values, _violation(
+                file, column, 'tipo: se leyó como número', present, values)
+        if kind == 'zip':
+            bad = present & ~(values.str.len().eq(5) & values.str.isdigit())
+            return values, _violation(file, column, 'zip: 5 dígitos', bad, values)
+        return values, None
+
+    if kind == 'datetime':
+        if pd.api.types.is_datetime64_any_dtype(values.dtype):
+            return values, None
+        converted = pd.to_datetime(values, errors='coerce')
+        bad = present & converted.isna()
+        return converted, _violation(file, column, 'fecha inválida', bad, values)
+
+    if not pd.api.types.is_numeric_dtype(values.dtype):
+        converted = pd.to_numeric(values, errors='coerce')
+        bad = present & converted.isna()
+        return converted, _violation(file, column, 'número inválido', bad, values)
+    if kind == 'int' and pd.api.types.is_float_dtype(values.dtype):
+        bad = present & values.ne(values.round())
+        return values, _violation(file, column, 'entero inválido', bad, values)
+    return values, None
+
+
+def validate_frame(file, frame, schema=None):
+    """
+    Valida las columnas de `frame` contra el esquema del archivo `file`.
+
+    Regresa `(frame, violaciones)`: `frame` con las fechas y los números que
+    venían como texto ya convertidos, y una lista de filas del reporte.
+    """
+    schema = SCHEMAS[file] if schema is None else schema
+    converted = {}
+    violations = []
+    for column, (kind, nullable) in schema.items():
+        if column not in frame:
+            violations.append({
+                'file': file, 'column': column, 'check': 'columna faltante',
+                'violations': len(frame), 'sample': []})
+            continue
+        values = frame[column]
+        present = values.notna()
+        if not nullable:
+            # La muestra de los nulos son las etiquetas de sus filas
+            violations.append(_violation(
+                file, column, 'nulos', ~present, frame.index.to_series()))
+        checked, violation = _check_type(file, column, kind, values, present)
+        violations.append(violation)
+        if checked is not values:
+            converted[column] = checked
+
+    if converted:
+        frame = frame.assign(**converted)
+    return frame, [violation for violation in violations if violation]
+
+
+def check_keys(sources):
+    """
+    Llaves duplicadas (`KEYS`) y valores sin referencia (`REFERENCES`) de los
+    archivos presentes en `sources`.
+
+    Por cada llave se hace un solo `factorize` de la llave seguida de las
+    columnas que la referencian: los valores de la llave reciben los primeros
+    códigos, así que hay duplicados si hay menos códigos que filas, y un valor
+    de otro archivo existe si su código es menor que el número de llaves
+    distintas. Es una pasada por columna, sin el `isin` sobre texto (lento con
+    las cadenas de pyarrow) ni un `duplicated` aparte.
+    """
+    violations = []
+    for parent, key in KEYS.items():
+        if parent not in sources or key not in sources[parent]:
+            continue
+        keys = sources[parent][key]
+        children = [
+            (file, column) for (file, column), target in REFERENCES
+            if target == (parent, key) and file in sources and column in sources[file]
+            ]
+        codes, _ = pd.factorize(pd.concat(
+            [keys] + [sources[file][column] for file, column in children],
+            ignore_index=True))
+        known = codes[:len(keys)].max(initial=-1) + 1
+        if known < keys.notna().sum():
+            violations.append(_violation(
+                parent, key, 'llave duplicada', keys.duplicated() & keys.notna(), keys))
+
+        start = len(keys)
+        for file, column in children:
+            values = sources[file][column]
+            found = codes[start:start + len(values)]
+            start += len(values)
+            missing = (found < 0) | (found >= known)
+            violations.append(_violation(
+                file, column, f'sin referencia en {parent}.{key}',
+                pd.Series(missing, index=values.index) & values.notna(), values))
+    return [violation for violation in violations if violation]
+
+
+def report_frame(violations):
+    """Dataframe del reporte (vacío, con sus columnas, si no hay violaciones)."""
+    return pd.DataFrame(violations, columns=REPORT_COLUMNS)
+
+
+def validate_sources(sources):
+    """
+    Valida cada archivo de `sources` (nombre -> dataframe), sus llaves y las
+    referencias entre ellos; regresa `(sources, reporte)` con los archivos
+    convertidos.
+    """
+    validated = {}
+    violations = []
+    for file, frame in sources.items():
+        if file in SCHEMAS:
+            frame, found = validate_frame(file, frame)
+            violations.extend(found)
+        validated[file] = frame
+    violations.extend(check_keys(validated))
+    return validated, report_frame(violations)
+
+
+def main(argv=None):
+    from olist_consolidate import read_sources
+    from olist_io import DATA_PATH
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--data-path', default=DATA_PATH)
+    args = parser.parse_args(argv)
+
+    sources = read_sources(args.data_path, validate=False)
+    payments = os.path.join(args.data_path, FILE_PAYMENTS)
+    if os.path.exists(payments):
+        sources['payments'] = pd.read_csv(payments)
+    _, report = validate_sources(sources)
+    if report.empty:
+        print(f"Sin violaciones en: {', '.join(sources)}")
+        return
+    print(report.to_string(index=False))
+    raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
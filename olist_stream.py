@@ -0,0 +1,581 @@
+"""
+Clasificación en línea de `delay_status` para las órdenes en camino.
+
+`delta_days` y `delay_status` solo se calculan cuando existe
+`order_delivered_customer_date`; mientras tanto la orden queda con
+`delta_days` NaN. `DelayStream` consume eventos de órdenes, uno por uno:
+
+    purchased    compra, con la fecha estimada de entrega
+    approved     aprobación del pago
+    carrier      entrega al transportista
+    delivered    entrega al cliente
+    canceled     cancelación (`order_status` 'canceled')
+    unavailable  producto no disponible (`order_status` 'unavailable')
+
+y emite una `Transition` cada vez que cambia el estado de una orden:
+
+* provisional: con la hora de los eventos (la mayor vista, `watermark`), una
+  orden en camino es `on_time` hasta su fecha estimada, `short_delay` al
+  pasarla y `long_delay` tres días después (los umbrales de
+  `olist_classify.py`). Cada orden agenda en un heap la hora en que cruza su
+  siguiente umbral; avanzar el reloj solo revisa las órdenes que vencen.
+* final: al llegar `delivered`, con el mismo criterio que `classify_delay`
+  (comparando nanosegundos enteros, así el resultado es idéntico); la orden
+  sale del almacén.
+* cierre: al llegar `canceled` o `unavailable`, la orden sale del almacén
+  con una transición final sin `delay_status` ni `delta_days` (None); ya
+  no se entregará, así que deja de pasar a `long_delay`.
+
+Los eventos de una orden que llegan antes de su `purchased` (sin fecha
+estimada aún) se guardan aparte y se aplican al llegar la compra; si la
+compra no llega en `EARLY_HORIZON_DAYS` días de `watermark`, se descartan
+(`expired`). Los eventos de órdenes ya entregadas o cerradas (un `delivered`
+repetido, un `carrier` tardío) se ignoran (`ignored`): se recuerdan las
+últimas `FINALIZED_MEMORY` órdenes finalizadas. Los eventos sin fecha no se aplican
+(`rejected`).
+
+El almacén de órdenes abiertas (`OrderStore`) es un diccionario
+`order_id -> posición` y arreglos de numpy (fecha estimada, etapa, estado)
+cuyas posiciones libres se reutilizan, así la memoria depende de las
+órdenes en camino y no de las ya entregadas.
+
+Los eventos llegan de una `queue.Queue` local (`consume`) o de un archivo de
+líneas JSON que se sigue leyendo conforme crece (`tail_events`), como
+`tail -f`:
+
+    {"order_id": "...", "event": "purchased", "timestamp": "2017-10-02 10:56:33",
+     "estimated_delivery": "2017-10-18 00:00:00"}
+
+Ejemplo:
+
+    from olist_stream import DelayStream, events_from_frame
+
+    stream = DelayStream()
+    for event in events_from_frame(oilst):
+        for transition in stream.process(*event):
+            ...
+
+o desde la terminal, para medir el rendimiento y la latencia con eventos
+generados a partir del archivo consolidado a 10 mil eventos por segundo:
+
+    python olist_stream.py --data-path RUTA --rate 10000 [--events 200000]
+
+o para clasificar un archivo de eventos que sigue creciendo:
+
+    python olist_stream.py --follow eventos.jsonl
+"""
+import argparse
+import heapq
+import json
+import queue
+import sys
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+import pandas as pd
+
+from olist_classify import DELAY_STATUS, DELAY_THRESHOLDS, classify_delay
+from olist_io import DATA_PATH, load_processed
+
+EVENTS = ('purchased', 'approved', 'carrier', 'delivered', 'canceled', 'unavailable')
+PURCHASED, APPROVED, CARRIER, DELIVERED, CANCELED, UNAVAILABLE = range(len(EVENTS))
+
+# Eventos que cierran una orden sin entregarla
+CLOSING_EVENTS = (CANCELED, UNAVAILABLE)
+
+# Columna de la fecha de cada evento en el archivo consolidado
+EVENT_COLUMNS = {
+    'purchased': 'order_purchase_timestamp',
+    'approved': 'order_approved_at',
+    'carrier': 'order_delivered_carrier_date',
+    'delivered': 'order_delivered_customer_date',
+}
+
+COLUMNS = ['order_id', 'order_status', 'order_estimated_delivery_date',
+           *EVENT_COLUMNS.values(), 'delta_days']
+
+DEFAULT_RATE = 10_000
+
+# Capacidad inicial del almacén (se duplica al llenarse)
+INITIAL_CAPACITY = 1 << 12
+
+# Días que se esperan los eventos previos a la compra antes de descartarlos
+EARLY_HORIZON_DAYS = 90
+
+# Órdenes entregadas que se recuerdan para ignorar sus eventos tardíos
+FINALIZED_MEMORY = 1 << 16
+
+_NS_PER_DAY = 86_400 * 10**9
+
+Transition = namedtuple(
+    'Transition', ['order_id', 'delay_status', 'final', 'timestamp', 'delta_days'])
+
+
+class OrderStore:
+    """Órdenes abiertas: `order_id -> posición` en arreglos de numpy."""
+
+    def __init__(self, capacity=INITIAL_CAPACITY):
+        self.slots = {}
+        # order_id de cada posición (None si está libre)
+        self.keys = []
+        self.estimated = np.zeros(capacity, dtype=np.int64)
+        self.stage = np.zeros(capacity, dtype=np.int8)
+        self.status = np.full(capacity, -1, dtype=np.int8)
+        # Generación de cada posición: invalida lo agendado al reutilizarla
+        self.generation = np.zeros(capacity, dtype=np.int32)
+        self._free = []
+        self._used = 0
+
+    def __len__(self):
+        return len(self.slots)
+
+    def _grow(self):
+        capacity = 2 * len(self.estimated)
+        for name in ('estimated', 'stage', 'status', 'generation'):
+            old = getattr(self, name)
+            new = np.full(capacity, -1 if name == 'status' else 0, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def add(self, order_id, estimated):
+        """Posición de `order_id` (nueva si no estaba)."""
+        slot = self.slots.get(order_id)
+        if slot is not None:
+            return slot
+        if self._free:
+            slot = self._free.pop()
+        else:
+            if self._used == len(self.estimated):
+                self._grow()
+            slot = self._used
+            self._used += 1
+            self.keys.append(None)
+        self.slots[order_id] = slot
+        self.keys[slot] = order_id
+        self.estimated[slot] = estimated
+        self.stage[slot] = PURCHASED
+        self.status[slot] = -1
+        return slot
+
+    def remove(self, order_id):
+        slot = self.slots.pop(order_id)
+        self.keys[slot] = None
+        self.generation[slot] += 1
+        self._free.append(slot)
+
+    def nbytes(self):
+        """Bytes de los arreglos (sin el diccionario de llaves)."""
+        return sum(
+            values.nbytes
+            for values in (self.estimated, self.stage, self.status, self.generation))
+
+
+def _parse_time(value):
+    """
+    Nanosegundos desde 1970 de una fecha (entero, texto o `Timestamp`);
+    None si no hay fecha.
+    """
+    if value is None:
+        return None
+    if isinstance(value, (int, np.integer)):
+        return int(value)
+    value = pd.Timestamp(value)
+    return None if pd.isna(value) else value.as_unit('ns').value
+
+
+class DelayStream:
+    """Estado por orden y transiciones de `delay_status` a partir de eventos."""
+
+    def __init__(self, thresholds=DELAY_THRESHOLDS, labels=DELAY_STATUS,
+                 early_horizon_days=EARLY_HORIZON_DAYS,
+                 finalized_memory=FINALIZED_MEMORY):
+        if len(labels) != len(thresholds) + 1:
+            raise ValueError(
+                f"Se esperaban {len(thresholds) + 1} etiquetas para "
+                f"{len(thresholds)} umbrales, se recibieron {len(labels)}")
+        # Umbrales en nanosegundos enteros: sin redondeo en los límites
+        self.thresholds = [int(round(days * _NS_PER_DAY)) for days in thresholds]
+        if any(b <= a for a, b in zip(self.thresholds, self.thresholds[1:])):
+            raise ValueError(f"Los umbrales deben ser crecientes: {list(thresholds)}")
+        self.labels = tuple(labels)
+        self.store = OrderStore()
+        self.watermark = None
+        # Compras sin fecha estimada (no se pueden clasificar)
+        self.unmatched = 0
+        # Eventos sin fecha, de órdenes ya finalizadas y previos a una compra
+        # que no llegó
+        self.rejected = 0
+        self.ignored = 0
+        self.expired = 0
+        self._deadlines = []
+        # order_id -> {evento: timestamp} de los eventos previos a la compra
+        self._early = {}
+        # (primer timestamp, order_id) de `_early`, para descartarlos
+        self._early_deadlines = []
+        self.early_horizon = int(round(early_horizon_days * _NS_PER_DAY))
+        # Últimas órdenes entregadas o cerradas (order_id -> None, de la más vieja)
+        self._finalized = OrderedDict()
+        self.finalized_memory = finalized_memory
+
+    def _level(self, delta):
+        # Número de umbrales menores que `delta`, como `classify_delay`
+        return bisect_left(self.thresholds, delta)
+
+    def _schedule(self, slot, level):
+        """Agenda el cruce del siguiente umbral de la orden en `slot`."""
+        if level < len(self.thresholds):
+            deadline = int(self.store.estimated[slot]) + self.thresholds[level]
+            heapq.heappush(
+                self._deadlines, (deadline, slot, int(self.store.generation[slot])))
+
+    def _finalize(self, order_id):
+        self._finalized[order_id] = None
+        if len(self._finalized) > self.finalized_memory:
+            self._finalized.popitem(last=False)
+
+    def _expire_early(self, timestamp):
+        """Descarta los eventos previos a compras que no llegaron a tiempo."""
+        limit = timestamp - self.early_horizon
+        while self._early_deadlines and self._early_deadlines[0][0] < limit:
+            _, order_id = heapq.heappop(self._early_deadlines)
+            early = self._early.get(order_id)
+            # Puede ser una entrada posterior con el mismo order_id
+            if early is not None and min(early.values()) < limit:
+                del self._early[order_id]
+                self.expired += 1
+
+    def _close(self, order_id, timestamp):
+        """Transición final de una orden cerrada sin entregar."""
+        self._finalize(order_id)
+        return Transition(order_id, None, True, timestamp, None)
+
+    def _transition(self, order_id, slot, level, timestamp, final):
+        delta = timestamp - int(self.store.estimated[slot])
+        return Transition(
+            order_id, self.labels[level], final, timestamp, delta / _NS_PER_DAY)
+
+    def advance(self, timestamp):
+        """
+        Avanza el reloj a `timestamp` (ns) y regresa las transiciones
+        provisionales de las órdenes que pasaron un umbral.
+        """
+        if self.watermark is not None and timestamp <= self.watermark:
+            return []
+        self.watermark = timestamp
+        self._expire_early(timestamp)
+        transitions = []
+        store = self.store
+        while self._deadlines and self._deadlines[0][0] < timestamp:
+            deadline, slot, generation = heapq.heappop(self._deadlines)
+            if store.generation[slot] != generation:
+                # La orden ya se entregó (y la posición pudo reutilizarse)
+                continue
+            level = self._level(timestamp - int(store.estimated[slot]))
+            store.status[slot] = level
+            self._schedule(slot, level)
+            transitions.append(self._transition(
+                store.keys[slot], slot, level, timestamp, False))
+        return transitions
+
+    def process(self, order_id, event, timestamp, estimated_delivery=None):
+        """
+        Aplica un evento (`event` en `EVENTS` o su índice); regresa la lista
+        de transiciones que produce, provisionales y finales. Los eventos sin
+        fecha o de órdenes ya finalizadas no producen transiciones.
+        """
+        kind = EVENTS.index(event) if isinstance(event, str) else event
+        timestamp = _parse_time(timestamp)
+        if timestamp is None:
+            self.rejected += 1
+            return []
+        transitions = self.advance(timestamp)
+        store = self.store
+        slot = store.slots.get(order_id)
+        if slot is None and order_id in self._finalized:
+            self.ignored += 1
+            return transitions
+
+        if kind == PURCHASED:
+            estimated = _parse_time(estimated_delivery)
+            if estimated is None:
+                self.unmatched += 1
+                return transitions
+            early = self._early.pop(order_id, {})
+            if DELIVERED in early:
+                # Ya se había entregado: solo el estado final
+                delta = early[DELIVERED] - estimated
+                transitions.append(Transition(
+                    order_id, self.labels[self._level(delta)], True, early[DELIVERED],
+                    delta / _NS_PER_DAY))
+                self._finalize(order_id)
+                return transitions
+            closing = [kind for kind in CLOSING_EVENTS if kind in early]
+            if closing:
+                # Ya se había cancelado: se cierra sin abrirla
+                transitions.append(self._close(order_id, early[closing[0]]))
+                return transitions
+            if slot is not None:
+                # Compra repetida: lo agendado con la fecha anterior ya no vale
+                store.generation[slot] += 1
+            slot = store.add(order_id, estimated)
+            store.estimated[slot] = estimated
+            store.stage[slot] = max(early, default=PURCHASED)
+            level = self._level(max(timestamp, self.watermark) - estimated)
+            store.status[slot] = level
+            self._schedule(slot, level)
+            transitions.append(self._transition(
+                order_id, slot, level, timestamp, False))
+        elif slot is None:
+            # Llegó antes que `purchased` (sin fecha estimada todavía): se
+            # guarda hasta la compra
+            early = self._early.setdefault(order_id, {})
+            if not early:
+                heapq.heappush(self._early_deadlines, (timestamp, order_id))
+            early[kind] = timestamp
+        elif kind == DELIVERED:
+            level = self._level(timestamp - int(store.estimated[slot]))
+            transitions.append(self._transition(order_id, slot, level, timestamp, True))
+            store.remove(order_id)
+            self._finalize(order_id)
+        elif kind in CLOSING_EVENTS:
+            transitions.append(self._close(order_id, timestamp))
+            store.remove(order_id)
+        else:
+            store.stage[slot] = max(int(store.stage[slot]), kind)
+        return transitions
+
+    def open_orders(self):
+        """Órdenes en camino con su etapa y su estado provisional."""
+        ids = list(self.store.slots)
+        slots = np.fromiter(self.store.slots.values(), dtype=np.int64, count=len(ids))
+        return pd.DataFrame({
+            'order_id': ids,
+            'stage': pd.Categorical.from_codes(self.store.stage[slots], EVENTS),
+            'delay_status': pd.Categorical.from_codes(
+                self.store.status[slots], self.labels),
+            'estimated_delivery': pd.to_datetime(self.store.estimated[slots]),
+            })
+
+
+def events_from_frame(frame):
+    """
+    Eventos `(order_id, evento, timestamp, estimated_delivery)` de las
+    órdenes de `frame`, ordenados por fecha (en ns); cada orden aporta un
+    evento por fecha que tenga.
+
+    El archivo consolidado no tiene fecha de cancelación: las órdenes con
+    `order_status` 'canceled' o 'unavailable' aportan además ese evento con
+    su última fecha, después de sus demás eventos.
+    """
+    order_ids = frame['order_id'].to_numpy(dtype=object)
+    estimated = frame['order_estimated_delivery_date'].to_numpy(dtype='datetime64[ns]')
+    parts = []
+    latest = np.full(len(frame), np.iinfo(np.int64).min, dtype=np.int64)
+    for kind, column in enumerate(EVENT_COLUMNS.values()):
+        times = frame[column].to_numpy(dtype='datetime64[ns]')
+        valid = ~np.isnat(times)
+        if kind == PURCHASED:
+            valid &= ~np.isnat(estimated)
+        rows = np.flatnonzero(valid)
+        parts.append((rows, np.full(len(rows), kind, dtype=np.int8),
+                      times[rows].view(np.int64)))
+        latest[rows] = np.maximum(latest[rows], times[rows].view(np.int64))
+    if 'order_status' in frame:
+        status = frame['order_status'].to_numpy(dtype=object)
+        for kind in CLOSING_EVENTS:
+            rows = np.flatnonzero(
+                (status == EVENTS[kind]) & (latest > np.iinfo(np.int64).min))
+            parts.append((rows, np.full(len(rows), kind, dtype=np.int8), latest[rows]))
+    rows = np.concatenate([part[0] for part in parts])
+    kinds = np.concatenate([part[1] for part in parts])
+    times = np.concatenate([part[2] for part in parts])
+    # Por fecha y, en empates, en el orden de los eventos de una orden
+    order = np.lexsort((kinds, times))
+    rows, kinds, times = rows[order], kinds[order], times[order]
+    estimated_ns = estimated.view(np.int64)[rows]
+    return list(zip(
+        order_ids[rows].tolist(), kinds.tolist(), times.tolist(),
+        np.where(kinds == PURCHASED, estimated_ns, 0).tolist()))
+
+
+def _event_from_json(line):
+    record = json.loads(line)
+    return (record['order_id'], record['event'], record['timestamp'],
+            record.get('estimated_delivery'))
+
+
+def tail_events(path, follow=True, poll_seconds=0.05, stop=None):
+    """
+    Eventos de un archivo de líneas JSON; con `follow`, espera las líneas
+    nuevas (como `tail -f`) hasta que `stop` (un `threading.Event`) se active.
+    """
+    with open(path, encoding='utf-8') as f:
+        pending = ''
+        while True:
+            line = f.readline()
+            if line:
+                pending += line
+                if pending.endswith('\n'):
+                    if pending.strip():
+                        yield _event_from_json(pending)
+                    pending = ''
+                continue
+            if not follow or (stop is not None and stop.is_set()):
+                return
+            time.sleep(poll_seconds)
+
+
+def consume(stream, events, on_transition, stop_value=None):
+    """
+    Procesa los eventos de la cola `events` hasta recibir `stop_value`;
+    llama `on_transition(transición, n)` por cada transición, con `n` el
+    número del evento que la produjo (desde 0, en el orden de la cola).
+    """
+    index = 0
+    while True:
+        event = events.get()
+        if event is stop_value:
+            return
+        for transition in stream.process(*event):
+            on_transition(transition, index)
+        index += 1
+
+
+def _percentiles(values):
+    values = np.asarray(values, dtype=np.float64)
+    if not len(values):
+        return {}
+    p50, p99, p999 = np.percentile(values, [50, 99, 99.9])
+    return {'p50_ms': p50, 'p99_ms': p99, 'p999_ms': p999, 'max_ms': values.max()}
+
+
+def benchmark(events, rate=DEFAULT_RATE):
+    """
+    Mide el clasificador con `events` (`events_from_frame`):
+
+    * `throughput`: eventos por segundo procesando la lista sin pausas,
+    * latencia: un hilo pone los eventos en una cola a `rate` eventos por
+      segundo y se mide, por transición, el tiempo desde que su evento entró
+      a la cola hasta que se emitió.
+
+    Regresa un diccionario con ambas mediciones y la memoria del almacén.
+    """
+    stream = DelayStream()
+    start = time.perf_counter()
+    transitions = 0
+    peak_open = 0
+    for event in events:
+        transitions += len(stream.process(*event))
+        peak_open = max(peak_open, len(stream.store))
+    seconds = time.perf_counter() - start
+    result = {
+        'events': len(events),
+        'transitions': transitions,
+        'seconds': seconds,
+        'throughput': len(events) / seconds,
+        'peak_open_orders': peak_open,
+        'store_bytes': stream.store.nbytes(),
+    }
+
+    stream = DelayStream()
+    channel = queue.Queue()
+    # Hora en que entró a la cola cada evento (un solo productor: mismo orden)
+    sent = []
+    latencies = []
+
+    def produce():
+        interval = 1 / rate
+        begin = time.perf_counter()
+        for index, event in enumerate(events):
+            # `sleep` suelta el GIL; una espera activa retrasaría al consumidor
+            delay = begin + index * interval - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            sent.append(time.perf_counter())
+            channel.put(event)
+        channel.put(None)
+
+    def on_transition(transition, index):
+        latencies.append((time.perf_counter() - sent[index]) * 1000)
+
+    producer = threading.Thread(target=produce, daemon=True)
+    begin = time.perf_counter()
+    producer.start()
+    consume(stream, channel, on_transition)
+    producer.join()
+    elapsed = time.perf_counter() - begin
+    result.update(rate=rate, achieved_rate=len(events) / elapsed,
+                  **_percentiles(latencies))
+    return result, stream
+
+
+def check_final(frame, events):
+    """
+    Número de órdenes cuyo estado final difiere de `classify_delay` sobre
+    `delta_days` (debe ser 0).
+    """
+    stream = DelayStream()
+    final = {}
+    for event in events:
+        for transition in stream.process(*event):
+            if transition.final:
+                final[transition.order_id] = transition.delay_status
+    delivered = frame[frame['delta_days'].notna()]
+    expected = np.asarray(classify_delay(delivered['delta_days']), dtype=object)
+    streamed = np.array(
+        [final.get(order_id) for order_id in delivered['order_id'].tolist()],
+        dtype=object)
+    return int((streamed != expected).sum())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--data-path', default=DATA_PATH,
+                        help='carpeta con oilst_processed.csv (para medir)')
+    parser.add_argument('--follow', default=None,
+                        help='archivo de eventos (líneas JSON) a seguir; "-" lee stdin')
+    parser.add_argument('--no-wait', action='store_true',
+                        help='con --follow, termina al llegar al final del archivo')
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE,
+                        help='eventos por segundo al medir la latencia')
+    parser.add_argument('--events', type=int, default=200_000,
+                        help='eventos a usar al medir (los primeros por fecha)')
+    args = parser.parse_args(argv)
+
+    if args.follow:
+        stream = DelayStream()
+        source = (
+            (_event_from_json(line) for line in sys.stdin if line.strip())
+            if args.follow == '-' else tail_events(args.follow, not args.no_wait))
+        for event in source:
+            for transition in stream.process(*event):
+                record = transition._asdict()
+                record['timestamp'] = pd.Timestamp(transition.timestamp).isoformat()
+                print(json.dumps(record), flush=True)
+        return
+
+    oilst = load_processed(args.data_path, columns=COLUMNS)
+    start = time.perf_counter()
+    events = events_from_frame(oilst)
+    print(f"{len(events):,} eventos de {len(oilst):,} órdenes en "
+          f"{time.perf_counter() - start:.2f} s")
+    mismatches = check_final(oilst, events)
+    print(f"Estados finales distintos de classify_delay: {mismatches}")
+    result, stream = benchmark(events[:args.events], args.rate)
+    print(f"Rendimiento: {result['throughput']:,.0f} eventos/s "
+          f"({result['events']:,} eventos, {result['transitions']:,} transiciones, "
+          f"máximo {result['peak_open_orders']:,} órdenes abiertas, "
+          f"{result['store_bytes'] / 1024:.0f} KiB)")
+    print(f"A {result['rate']:,.0f} eventos/s (logrado {result['achieved_rate']:,.0f}): "
+          f"latencia p50 {result.get('p50_ms', 0):.3f} ms, "
+          f"p99 {result.get('p99_ms', 0):.3f} ms, p99.9 {result.get('p999_ms', 0):.3f} ms, "
+          f"máx {result.get('max_ms', 0):.3f} ms")
+    if mismatches:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+"""
+Generador de datos sintéticos con la estructura de `oilst_processed.csv`.
+
+Sirve para probar los módulos del proyecto sin tener a la mano los datos de
+Olist y para medirlos con más órdenes de las que tiene el dataset original.
+Las distribuciones son aproximadas (fechas entre 2016 y 2018, ~92% de las
+órdenes a tiempo, clientes que repiten compras, etc.), no una réplica fiel.
+
+Ejemplo:
+
+    from olist_synthetic import generate_processed
+
+    oilst = generate_processed(n_orders=1_000_000, seed=7)
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from olist_classify import classify_delay
+from olist_periods import month_index, quarter_index
+
+BASE_PATH = os.path.dirname(os.path.abspath(__file__))
+FILE_REGIONS = 'brasil_regions.csv'
+
+START_DATE = pd.Timestamp('2016-09-01')
+END_DATE = pd.Timestamp('2018-09-01')
+
+ORDER_STATUS = ['delivered', 'shipped', 'canceled', 'invoiced', 'processing']
+ORDER_STATUS_PROBS = [0.97, 0.011, 0.007, 0.006, 0.006]
+
+
+def _hex_ids(rng, n):
+    """Identificadores hexadecimales de 32 caracteres, como los de Olist."""
+    high = rng.integers(0, 2**63, size=n, dtype=np.int64)
+    low = rng.integers(0, 2**63, size=n, dtype=np.int64)
+    return np.char.add(np.char.mod('%016x', high), np.char.mod('%016x', low))
+
+
+def generate_processed(n_orders=100_000, n_customers=None, seed=0):
+    """
+    Dataframe sintético con las columnas del archivo consolidado.
+
+    `n_customers` es el número de clientes distintos (`customer_unique_id`);
+    por defecto 95% de `n_orders`, de modo que algunos clientes repiten.
+    """
+    rng = np.random.default_rng(seed)
+    if n_customers is None:
+        n_customers = max(1, int(n_orders * 0.95))
+
+    regions = pd.read_csv(
+        os.path.join(BASE_PATH, FILE_REGIONS),
+        encoding='utf-8-sig'
+        )
+    # Los estados del sureste concentran la mayoría de las órdenes
+    state_weights = np.where(
+        regions['region'] == 'southeast', 8.0,
+        np.where(regions['region'] == 'south', 3.0, 1.0)
+        )
+    state = rng.choice(
+        len(regions), size=n_orders, p=state_weights / state_weights.sum()
+        )
+
+    # Como hay menos clientes que órdenes, algunos clientes repiten compra
+    customer = rng.integers(0, n_customers, n_orders)
+    customer_unique_ids = _hex_ids(rng, n_customers)
+
+    span_seconds = int((END_DATE - START_DATE).total_seconds())
+    purchase = START_DATE + pd.to_timedelta(
+        rng.integers(0, span_seconds, n_orders), unit='s'
+        )
+    approved = (purchase + pd.to_timedelta(
+        rng.exponential(10, n_orders), unit='h')).floor('s')
+    carrier = (approved + pd.to_timedelta(
+        rng.gamma(2.0, 1.5, n_orders), unit='D')).floor('s')
+    estimated = (purchase + pd.to_timedelta(
+        rng.integers(10, 40, n_orders), unit='D')).normalize()
+    delivered_date = estimated + pd.to_timedelta(
+        rng.normal(-12.5, 8.5, n_orders), unit='D'
+        ).floor('s')
+
+    order_status = rng.choice(ORDER_STATUS, size=n_orders, p=ORDER_STATUS_PROBS)
+    not_delivered = order_status != 'delivered'
+    delivered_date = delivered_date.where(~not_delivered)
+
+    total_products = np.minimum(rng.geometric(0.85, n_orders), 21)
+    total_sales = np.round(
+        rng.lognormal(4.3, 0.85, n_orders) * total_products, 2
+        )
+
+    lat = -15.0 + rng.normal(0, 6, n_orders)
+    lng = -48.0 + rng.normal(0, 6, n_orders)
+    zip_prefix = np.char.zfill(
+        rng.integers(1000, 99990, n_orders).astype(str), 5
+        )
+
+    orders = pd.DataFrame({
+        'order_id': _hex_ids(rng, n_orders),
+        'customer_id': _hex_ids(rng, n_orders),
+        'order_status': order_status,
+        'order_purchase_timestamp': purchase,
+        'order_approved_at': approved,
+        'order_delivered_carrier_date': carrier.where(
+            order_status != 'canceled'),
+        'order_delivered_customer_date': delivered_date,
+        'order_estimated_delivery_date': estimated,
+        'distance_distribution_center': np.round(
+            rng.gamma(2.0, 150.0, n_orders), 2),
+        'total_products': total_products.astype(float),
+        'total_sales': total_sales,
+        'customer_unique_id': customer_unique_ids[customer],
+        'customer_zip_code_prefix': zip_prefix,
+        'customer_city': 'city_' + pd.Series(state).astype(str),
+        'customer_state': regions['abbreviation'].to_numpy()[state],
+        'geolocation_zip_code_prefix': zip_prefix,
+        'geolocation_lat': lat,
+        'geolocation_lng': lng,
+        'geolocation_city': 'city_' + pd.Series(state).astype(str),
+        'geolocation_state': regions['abbreviation'].to_numpy()[state],
+        'abbreviation': regions['abbreviation'].to_numpy()[state],
+        'state_name': regions['state_name'].to_numpy()[state],
+    })
+
+    orders['year'] = orders['order_purchase_timestamp'].dt.year
+    orders['month'] = orders['order_purchase_timestamp'].dt.month
+    orders['quarter'] = quarter_index(orders['order_purchase_timestamp'])
+    orders['year_month'] = month_index(orders['order_purchase_timestamp'])
+
+    orders['delta_days'] = (
+        orders['order_delivered_customer_date'] -
+        orders['order_estimated_delivery_date']
+        ).dt.total_seconds() / 60 / 60 / 24
+
+    orders['delay_status'] = classify_delay(orders['delta_days'])
+
+    return orders
@@ -0,0 +1,94 @@
+"""
+Tablas entregables del Tema 2 (archivos `.csv`), sin gráficas.
+
+Cada tabla se calcula con pandas a partir del archivo consolidado y se
+registra en `TABLES` con el nombre de su archivo y las columnas que
+necesita, para leer solo esas columnas. El módulo no importa matplotlib,
+seaborn, plotly ni scipy.
+
+Ejemplo:
+
+    from olist_tables import write_tables
+
+    write_tables(oilst)
+"""
+import os
+
+import pandas as pd
+
+from olist_periods import as_month_index, format_months
+
+# Los `np.where` originales dejaban en `short_delay` las órdenes sin fecha de
+# entrega (`delta_days` NaN); `classify_delay` las deja como NaN. Las tablas
+# entregables conservan el conteo original para seguir siendo comparables
+# con los `.csv` ya publicados.
+MISSING_DELAY_STATUS = 'short_delay'
+
+
+def _delay_status(oilst):
+    """`delay_status` como texto, con las órdenes sin entrega en `MISSING_DELAY_STATUS`."""
+    return oilst['delay_status'].astype(object).fillna(MISSING_DELAY_STATUS)
+
+
+def prop_sales_by_quarter(oilst):
+    """
+    Ventas de las órdenes entregadas por `delay_status` y trimestre; agrupa
+    por el entero del trimestre y solo formatea las columnas del resultado.
+    """
+    delivered = oilst.query("order_status == 'delivered'")
+    table = delivered.assign(
+        delay_status=_delay_status(delivered),
+        quarter=as_month_index(delivered['quarter'], 'Q')
+        ).pivot_table(
+            index='delay_status',
+            columns='quarter',
+            values='total_sales',
+            aggfunc='sum',
+            fill_value=0
+            )
+    table.columns = format_months(table.columns, 'Q')
+    return table
+
+
+def count_orders_basket_size(oilst):
+    """Órdenes por número de productos y `delay_status` (las 10 con más retrasos)."""
+    return pd.crosstab(
+        oilst['total_products'],
+        _delay_status(oilst),
+        margins=True
+        ).sort_values(['long_delay']).tail(10)
+
+
+# nombre -> (archivo, columnas, función)
+TABLES = {
+    'prop_sales_delay_status_by_quarte': (
+        'prop_sales_delay_status_by_quarte.csv',
+        ['order_status', 'delay_status', 'quarter', 'total_sales'],
+        prop_sales_by_quarter,
+        ),
+    'count_orders_basket_size_by_delay_status': (
+        'count_orders_basket_size_by_delay_status.csv',
+        ['total_products', 'delay_status'],
+        count_orders_basket_size,
+        ),
+}
+
+
+def table_columns(names=None):
+    """Columnas del archivo consolidado que necesitan las tablas `names`."""
+    columns = []
+    for name in names or TABLES:
+        columns.extend(
+            column for column in TABLES[name][1] if column not in columns)
+    return columns
+
+
+def write_tables(oilst, names=None, output_path='.'):
+    """Escribe las tablas `names` (todas por defecto); regresa sus rutas."""
+    os.makedirs(output_path, exist_ok=True)
+    paths = {}
+    for name in names or TABLES:
+        filename, _, build = TABLES[name]
+        paths[name] = os.path.join(output_path, filename)
+        build(oilst).to_csv(paths[name])
+    return paths
@@ -0,0 +1,282 @@
+"""
+Métricas diarias de retrasos en series basadas en arreglos.
+
+En lugar de recalcular con `groupby` los conteos mensuales cada vez que se
+grafica, se mantienen series diarias (una posición por día desde la primera
+compra) con:
+
+* número de órdenes por `delay_status`,
+* número total de órdenes,
+* suma y conteo de `delta_days` (para el promedio).
+
+A partir de ellas se obtienen ventanas móviles de 7/30/90 días restando sumas
+acumuladas y los conteos mensuales que usan las gráficas de barras y líneas.
+Las órdenes nuevas se agregan con `append` sin recalcular los días previos.
+
+Las series se guardan en `olist_daily_metrics.npz` junto con la última
+fecha de compra que incluyen y una huella de las órdenes sumadas (fecha,
+`delay_status` y `delta_days`); `update_daily_metrics` las abre y agrega
+solo las órdenes posteriores a esa fecha. Si la huella de las órdenes
+anteriores ya no coincide (por ejemplo, una orden que iba en camino ya se
+entregó), las series se recalculan completas.
+
+Ejemplo:
+
+    from olist_timeseries import DailyDelayMetrics, update_daily_metrics
+
+    metrics = update_daily_metrics(delivered, 'olist_daily_metrics.npz')
+    metrics.rolling(30).tail()
+    metrics.monthly()
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from olist_classify import DELAY_STATUS
+
+FILE_DAILY_METRICS = 'olist_daily_metrics.npz'
+
+ROLLING_WINDOWS = (7, 30, 90)
+
+# Columnas del archivo consolidado que se usan
+COLUMNS = ['order_status', 'order_purchase_timestamp', 'delay_status', 'delta_days']
+
+
+def fingerprint(frame, date='order_purchase_timestamp', status='delay_status',
+                delta='delta_days'):
+    """
+    Huella de las órdenes de `frame`: suma (módulo 2**64) del hash de la
+    fecha, `delay_status` y `delta_days` de cada una. No depende del orden
+    de las filas y la huella de dos lotes es la suma de sus huellas.
+    """
+    hashes = pd.util.hash_pandas_object(pd.DataFrame({
+        'date': frame[date].to_numpy(dtype='datetime64[ns]').view(np.int64),
+        'status': frame[status].astype('str').to_numpy(dtype=object),
+        'delta': frame[delta].to_numpy(dtype=np.float64),
+        }), index=False).to_numpy()
+    return int(hashes.sum(dtype=np.uint64))
+
+
+class DailyDelayMetrics:
+    """Conteos diarios de órdenes, retrasos y `delta_days`."""
+
+    def __init__(self, start, counts, orders, delta_sum, delta_count,
+                 categories=DELAY_STATUS, through=None, fingerprint=0):
+        self.start = np.datetime64(start, 'D')
+        self.counts = counts
+        self.orders = orders
+        self.delta_sum = delta_sum
+        self.delta_count = delta_count
+        self.categories = tuple(categories)
+        # Última fecha de compra incluida (NaT si no hay órdenes)
+        self.through = np.datetime64('NaT', 'ns') if through is None \
+            else np.datetime64(through, 'ns')
+        # Huella de las órdenes sumadas (ver `fingerprint`)
+        self.fingerprint = int(fingerprint)
+
+    @classmethod
+    def empty(cls, start, categories=DELAY_STATUS):
+        return cls(
+            start,
+            np.zeros((0, len(categories)), dtype=np.int64),
+            np.zeros(0, dtype=np.int64),
+            np.zeros(0, dtype=np.float64),
+            np.zeros(0, dtype=np.int64),
+            categories
+            )
+
+    @classmethod
+    def from_frame(cls, frame, date='order_purchase_timestamp',
+                   status='delay_status', delta='delta_days',
+                   categories=DELAY_STATUS):
+        # `append` fija el primer día con la primera compra
+        metrics = cls.empty(np.datetime64('NaT', 'D'), categories)
+        metrics.append(frame, date, status, delta)
+        return metrics
+
+    @property
+    def days(self):
+        return self.start + np.arange(len(self.orders))
+
+    def _extend(self, first, last):
+        """Amplía las series para cubrir los días [first, last]."""
+        before = max(0, int((self.start - first).astype(np.int64)))
+        length = int((last - self.start).astype(np.int64)) + before + 1
+        after = max(0, length - before - len(self.orders))
+        if before == 0 and after == 0:
+            return
+        self.counts = np.pad(self.counts, ((before, after), (0, 0)))
+        self.orders = np.pad(self.orders, (before, after))
+        self.delta_sum = np.pad(self.delta_sum, (before, after))
+        self.delta_count = np.pad(self.delta_count, (before, after))
+        self.start = self.start - before
+
+    def append(self, frame, date='order_purchase_timestamp',
+               status='delay_status', delta='delta_days'):
+        """Suma las órdenes de `frame` a los días que les corresponden."""
+        timestamps = frame[date].to_numpy(dtype='datetime64[ns]')
+        valid = ~np.isnat(timestamps)
+        if not valid.any():
+            return self
+        self.fingerprint = (self.fingerprint + fingerprint(
+            frame[valid], date, status, delta)) % 2**64
+        timestamps = timestamps[valid]
+        latest = timestamps.max()
+        self.through = latest if np.isnat(self.through) else max(self.through, latest)
+        days = timestamps.astype('datetime64[D]')
+        if not len(self.orders):
+            self.start = days.min()
+        self._extend(days.min(), days.max())
+
+        position = (days - self.start).astype(np.int64)
+        n_days = len(self.orders)
+        self.orders += np.bincount(position, minlength=n_days)
+
+        codes = pd.Categorical(
+            frame[status].to_numpy()[valid], categories=self.categories
+            ).codes.astype(np.int64)
+        known = codes >= 0
+        n_categories = len(self.categories)
+        self.counts += np.bincount(
+            position[known] * n_categories + codes[known],
+            minlength=n_days * n_categories
+            ).reshape(n_days, n_categories)
+
+        values = frame[delta].to_numpy(dtype=np.float64)[valid]
+        finite = np.isfinite(values)
+        self.delta_sum += np.bincount(
+            position[finite], weights=values[finite], minlength=n_days)
+        self.delta_count += np.bincount(position[finite], minlength=n_days)
+        return self
+
+    def daily(self):
+        """Dataframe con las series diarias."""
+        frame = pd.DataFrame(
+            self.counts, index=pd.Index(self.days, name='day'),
+            columns=list(self.categories)
+            )
+        frame['orders'] = self.orders
+        with np.errstate(invalid='ignore', divide='ignore'):
+            frame['delta_days_mean'] = self.delta_sum / self.delta_count
+        return frame
+
+    def rolling(self, window):
+        """
+        Métricas en ventanas móviles de `window` días terminando en cada día.
+
+        Se calculan como diferencias de sumas acumuladas, por lo que el costo
+        no depende del tamaño de la ventana. Los primeros días usan la parte
+        de la ventana disponible.
+        """
+        def window_sum(series):
+            cumulative = np.cumsum(series, axis=0)
+            shifted = np.zeros_like(cumulative)
+            shifted[window:] = cumulative[:-window]
+            return cumulative - shifted
+
+        orders = window_sum(self.orders)
+        counts = window_sum(self.counts)
+        delta_sum = window_sum(self.delta_sum)
+        delta_count = window_sum(self.delta_count)
+
+        long_delay = counts[:, self.categories.index('long_delay')]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return pd.DataFrame(
+                {
+                    'orders': orders,
+                    'long_delay': long_delay,
+                    'long_delay_rate': long_delay / counts.sum(axis=1),
+                    'delta_days_mean': delta_sum / delta_count,
+                },
+                index=pd.Index(self.days, name='day')
+                )
+
+    def rolling_windows(self, windows=ROLLING_WINDOWS):
+        """Métricas móviles para varias ventanas, con columnas (ventana, métrica)."""
+        return pd.concat(
+            {f'{window}d': self.rolling(window) for window in windows}, axis=1
+            )
+
+    def monthly(self, by_status=True):
+        """
+        Órdenes por mes (y por `delay_status` si `by_status`), con las mismas
+        columnas que los `groupby` por `year_month` de los Temas 3 y 4.
+        `year_month` son meses desde 1970 en `int16` (`olist_periods.py`);
+        `format_months` los convierte en texto para las gráficas.
+        """
+        months = self.days.astype('datetime64[M]').astype(np.int64)
+        boundaries = np.flatnonzero(
+            np.diff(months, prepend=np.iinfo(np.int64).min))
+        year_month = months[boundaries].astype(np.int16)
+
+        if not by_status:
+            orders = np.add.reduceat(self.orders, boundaries)
+            frame = pd.DataFrame({'year_month': year_month, 'orders': orders})
+            return frame[frame['orders'] > 0].reset_index(drop=True)
+
+        counts = np.add.reduceat(self.counts, boundaries, axis=0)
+        frame = pd.DataFrame(
+            counts, index=pd.Index(year_month, name='year_month'),
+            columns=pd.Index(self.categories, name='delay_status')
+            ).stack().rename('orders').reset_index()
+        return frame[frame['orders'] > 0].reset_index(drop=True)
+
+    def save(self, path):
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as f:
+            np.savez_compressed(
+                f,
+                start=self.start,
+                counts=self.counts,
+                orders=self.orders,
+                delta_sum=self.delta_sum,
+                delta_count=self.delta_count,
+                categories=np.array(self.categories, dtype=str),
+                through=self.through,
+                fingerprint=np.uint64(self.fingerprint)
+                )
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as stored:
+            return cls(
+                stored['start'],
+                stored['counts'],
+                stored['orders'],
+                stored['delta_sum'],
+                stored['delta_count'],
+                tuple(str(category) for category in stored['categories']),
+                stored['through'] if 'through' in stored else None,
+                stored['fingerprint'] if 'fingerprint' in stored else 0
+                )
+
+
+def update_daily_metrics(frame, path, date='order_purchase_timestamp',
+                         status='delay_status', delta='delta_days'):
+    """
+    Series diarias de `frame` guardadas en `path`: si el archivo existe se
+    agregan solo las órdenes compradas después de su última fecha; si no
+    existe, si sus categorías no son `DELAY_STATUS` o si la huella de las
+    órdenes anteriores ya no coincide, se recalculan con todas. Regresa las
+    series actualizadas.
+    """
+    timestamps = frame[date].to_numpy(dtype='datetime64[ns]')
+    new = ~np.isnat(timestamps)
+    metrics = DailyDelayMetrics.load(path) if os.path.exists(path) else None
+    if metrics is not None and metrics.categories != DELAY_STATUS:
+        metrics = None
+    if metrics is not None and not np.isnat(metrics.through):
+        stored = timestamps <= metrics.through
+        if fingerprint(frame[stored], date, status, delta) == metrics.fingerprint:
+            new &= ~stored
+        else:
+            metrics = None
+    if metrics is None:
+        metrics = DailyDelayMetrics.empty(np.datetime64('NaT', 'D'))
+    elif not new.any():
+        return metrics
+    metrics.append(frame[new], date, status, delta)
+    metrics.save(path)
+    return metrics